@@ -46,12 +46,14 @@ setup(
     include_package_data=True,
 
     python_requires='>=3.8.0',
-    install_requires=['matplotlib>=3.1.2', 'plotly>=4.5.0', 'h5py>=2.10',
-                      'pandas>=0.25.3', 'numpy>=1.17.4', 'scipy>=1.3.3', 'scikit-learn>=0.22'],
+    install_requires=['plotly>=4.5.0', 'h5py>=2.10',
+                      'pandas>=0.25.3', 'numpy>=1.17.4', 'scipy>=1.3.3'],
+    extras_require={'pod5': ['pod5>=0.1.5'], 'bam': ['pysam>=0.19'], 'zstd': ['zstandard>=0.15']},
 
     entry_points={
         'console_scripts': [
             'toulligqc=toulligqc.toulligqc:main',
+            'toulligqc-server=toulligqc.server:main',
         ],
     },
 )
@@ -0,0 +1,70 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import alignment_extractor
+import tempfile
+import unittest
+import numpy as np
+
+paf_records = ['read1\t1000\t10\t990\t+\tchr1\t50000\t100\t1090\t900\t1000\t60\ttp:A:P\tNM:i:100',
+               'read1\t1000\t0\t500\t+\tchr2\t50000\t100\t600\t500\t500\t0\ttp:A:S',
+               'read1\t1000\t0\t10\t+\tchr3\t50000\t100\t110\t10\t10\t60\ttp:A:P',
+               'read2\t2000\t0\t0\t*\t*\t0\t0\t0\t0\t0\t0',
+               'read3\t500\t0\t500\t-\tchr1\t50000\t100\t600\t495\t500\t60\ttp:A:P']
+
+
+class TestAlignmentExtractor(unittest.TestCase):
+
+    """ Test the alignment extractor """
+
+    def test_read_paf(self):
+        """Test that only the primary alignment of each read is used and the unmapped reads are counted"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'reads.paf')
+            with open(filename, 'w') as f:
+                f.write('\n'.join(paf_records) + '\n')
+
+            config = {'alignment_source': filename, 'quiet': 'True'}
+            extractor = alignment_extractor.AlignmentExtractor(config)
+            self.assertTrue(extractor.check_conf()[0])
+            extractor.init()
+
+        result_dict = {}
+        extractor.extract(result_dict)
+
+        self.assertEqual(3, result_dict['alignment.extractor.read.count'])
+        self.assertEqual(2, result_dict['alignment.extractor.mapped.read.count'])
+        self.assertEqual(1500, result_dict['alignment.extractor.mapped.read.yield'])
+        self.assertEqual(1480, result_dict['alignment.extractor.aligned.yield'])
+        self.assertAlmostEqual((0.9 + 0.99) / 2, result_dict['alignment.extractor.identity.mean'])
+        self.assertAlmostEqual(1395 / 1500, result_dict['alignment.extractor.identity.aggregate'])
+        self.assertAlmostEqual(0.9, result_dict['alignment.extractor.identity.min'])
+        self.assertAlmostEqual(0.99, result_dict['alignment.extractor.identity.max'])
+        self.assertAlmostEqual(10.0, result_dict['alignment.extractor.accuracy.qscore.min'])
+
+    def test_statistics_merge(self):
+        """Test that statistics computed by batches and merged are the statistics of all the reads"""
+
+        rng = np.random.RandomState(0)
+        mapped = rng.rand(10000) < 0.8
+        read_length = rng.randint(100, 10000, 10000)
+        columns = np.where(mapped, read_length, 0)
+        matches = np.where(mapped, (columns * rng.uniform(0.8, 1.0, 10000)).astype(np.int64), -1)
+        barcode = np.array(['barcode01', 'barcode02', ''])[rng.randint(0, 3, 10000)]
+
+        stats = alignment_extractor.AlignmentStatistics()
+        stats.update(mapped, read_length, read_length, matches, columns, barcode)
+
+        merged = alignment_extractor.AlignmentStatistics()
+        for part in np.array_split(np.arange(10000), 7):
+            batch = alignment_extractor.AlignmentStatistics()
+            batch.update(mapped[part], read_length[part], read_length[part], matches[part], columns[part],
+                         barcode[part])
+            merged.merge(batch)
+
+        self.assertEqual(int(mapped.sum()), merged.mapped_count)
+        np.testing.assert_array_equal(stats.identity_histogram, merged.identity_histogram)
+        self.assertAlmostEqual(stats.identity_statistics()['mean'], merged.identity_statistics()['mean'])
+        np.testing.assert_array_equal(stats.accuracy_histogram, merged.accuracy_histogram)
+        self.assertEqual(stats.barcode_counts, merged.barcode_counts)
+        self.assertEqual(int((barcode == '').sum()), merged.barcode_counts['unclassified'][0])
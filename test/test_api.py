@@ -0,0 +1,85 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import api
+from toulligqc.api import run_qc
+from toulligqc.common import ToulligqcError
+import plotly.graph_objs as go
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+test_data_directory = os.path.dirname(os.path.realpath(__file__)) + '/../test_data/sequencing_summary/'
+fast5_directory = os.path.dirname(os.path.realpath(__file__)) + '/../test_data/fast5/'
+
+
+class TestApi(unittest.TestCase):
+
+    """ Test the Python API """
+
+    def test_run_qc(self):
+        """Test that QCs run in the same process return their results and graphs"""
+
+        inputs = {'sequencing_summary': [test_data_directory + 'sequencing_summary_small.txt',
+                                         test_data_directory + 'barcoding_summ_pass_small.txt',
+                                         test_data_directory + 'barcoding_summ_fail_small.txt']}
+
+        result_dict, graphs = run_qc(inputs, {'barcodes': 'BC07,BC08'})
+        self.assertEqual([], graphs)
+        self.assertEqual(9999, result_dict['basecaller.sequencing.summary.1d.extractor.read.count'])
+        self.assertEqual(['barcode07', 'barcode08'], result_dict['toulligqc.info.barcode.selection'][:2])
+
+        result_dict_with_graphs, graphs = run_qc(inputs, {'barcodes': 'BC07,BC08'}, figures=True)
+        self.assertGreater(len(graphs), 0)
+        for name, figure, table, div in graphs:
+            self.assertIsInstance(figure, go.Figure)
+            self.assertIn('<div', div)
+        for key, value in result_dict.items():
+            if not key.endswith('duration') and not key.endswith('time'):
+                self.assertEqual(value, result_dict_with_graphs[key], msg=key)
+
+    def test_concurrent_run_qc(self):
+        """Test that QCs run at the same time by several threads return the results of a single QC"""
+
+        inputs = {'sequencing_summary': test_data_directory + 'Guppy-basecall-1D-DNA_sequencing_summary.txt'}
+        expected, expected_graphs = run_qc(inputs, figures=True)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(lambda i: run_qc(inputs, figures=True), range(3)))
+
+        for result_dict, graphs in results:
+            self.assertEqual([name for name, _, _, _ in expected_graphs], [name for name, _, _, _ in graphs])
+            for name, figure, table, div in graphs:
+                self.assertIsInstance(figure, go.Figure)
+            for key, value in expected.items():
+                if not key.endswith('duration') and not key.endswith('time'):
+                    self.assertEqual(value, result_dict[key], msg=key)
+
+    def test_run_qc_raw_data_only(self):
+        """Test that the reads of the raw data files are scanned when no basecalled read is provided"""
+
+        result_dict, graphs = run_qc({'fast5': fast5_directory}, figures=True)
+
+        self.assertEqual(['toulligqc.info.extractor', 'fast5.extractor'], result_dict['toulligqc.info.extractors'])
+        self.assertEqual(3, result_dict['fast5.extractor.read.count'])
+        self.assertEqual('FAF04250', result_dict['sequencing.telemetry.extractor.flowcell.id'])
+        self.assertEqual(2, len(graphs))
+        self.assertTrue(all(isinstance(figure, go.Figure) for _, figure, _, _ in graphs))
+
+        # The POD5 extractor is the primary extractor of a POD5 only run
+        config_dictionary = {'pod5_source': fast5_directory, 'report_name': 'test'}
+        api.check_configuration(config_dictionary)
+        extractors_list = api.create_extractor_list(config_dictionary)
+        self.assertEqual(['toulligqc.info.extractor', 'pod5.extractor'],
+                         [e.get_report_data_file_id() for e in extractors_list])
+        self.assertTrue(extractors_list[1].deep_scan)
+
+    def test_errors(self):
+        """Test that invalid configurations raise exceptions"""
+
+        for inputs, options in (({}, None),
+                                ({'unknown': 'file.txt'}, None),
+                                ({'sequencing_summary': test_data_directory + 'missing.txt'}, None),
+                                ({'fastq': 'reads.fastq'}, {'max_memory': '8X'}),
+                                ({'sequencing_summary': test_data_directory + 'sequencing_summary_small.txt'},
+                                 {'barcodes': 'unknown'})):
+            with self.assertRaises(ToulligqcError):
+                run_qc(inputs, options)
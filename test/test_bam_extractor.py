@@ -0,0 +1,61 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import bam_extractor
+import tempfile
+import unittest
+import numpy as np
+
+try:
+    import pysam
+except ImportError:
+    pysam = None
+
+
+def _write_bam_fixture(path):
+    """Write a small unaligned BAM file with Dorado tags and a secondary alignment"""
+
+    header = {'HD': {'VN': '1.6', 'SO': 'unknown'}, 'SQ': [{'SN': 'chr1', 'LN': 1000}]}
+    with pysam.AlignmentFile(path, 'wb', header=header) as f:
+        for i, tags in enumerate([[('qs', 12.5), ('ch', 10), ('st', '2023-01-01T10:00:00.500+00:00'), ('du', 2.0),
+                                   ('BC', 'SQK-NBD114-24_barcode01')],
+                                  [('ch', 20), ('st', '2023-01-01T10:00:10.500+00:00'), ('du', 1.0)]]):
+            record = pysam.AlignedSegment(f.header)
+            record.query_name = 'read' + str(i)
+            record.query_sequence = 'ACGT' * (i + 1)
+            record.query_qualities = pysam.qualitystring_to_array('+' * 4 * (i + 1))
+            record.flag = 4
+            record.set_tags(tags)
+            f.write(record)
+
+        secondary = pysam.AlignedSegment(f.header)
+        secondary.query_name = 'read0'
+        secondary.query_sequence = 'ACGT'
+        secondary.flag = 256
+        secondary.reference_id = 0
+        secondary.reference_start = 10
+        secondary.cigarstring = '4M'
+        f.write(secondary)
+
+
+@unittest.skipIf(pysam is None, 'pysam package is not installed')
+class TestBamExtractor(unittest.TestCase):
+
+    """ Test the BAM extractor """
+
+    def test_read_bam_batches(self):
+        """Test the values of the tags and the mean Phred score computed when the qs tag is missing"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'reads.bam')
+            _write_bam_fixture(filename)
+            batches = list(bam_extractor.read_bam_batches(filename, thread_count=2, batch_size=1))
+
+        self.assertEqual(2, len(batches))
+        result = {k: np.concatenate([b[k] for b in batches]) for k in batches[0]}
+
+        np.testing.assert_array_equal([4, 8], result['sequence_length'])
+        np.testing.assert_allclose([12.5, 10], result['mean_qscore'])
+        np.testing.assert_array_equal([10, 20], result['channel'])
+        np.testing.assert_allclose([2.0, 1.0], result['duration'])
+        self.assertEqual(np.timedelta64(10, 's'), result['start_time'][1] - result['start_time'][0])
+        np.testing.assert_array_equal(['barcode01', ''], result['barcode_arrangement'])
@@ -0,0 +1,87 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import barcode_activity
+from toulligqc.barcode_activity import BarcodeActivity
+from toulligqc.out_of_core import PartialResults
+import numpy as np
+import pandas as pd
+import unittest
+
+
+class TestBarcodeActivity(unittest.TestCase):
+
+    """ Test the number of reads and the yield of the barcodes over time """
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.barcodes = ['barcode{:02d}'.format(i) for i in range(1, 97)] + ['unclassified', 'other barcodes']
+        self.codes = rng.integers(0, len(self.barcodes), 20000)
+        self.start_times = rng.uniform(0, 8 * 3600, 20000).astype(np.float32)
+        self.lengths = rng.integers(100, 20000, 20000).astype(np.uint32)
+
+    def test_activity(self):
+        """Test that the reads and the bases of each barcode are counted in the time bins of their start time"""
+
+        activity = BarcodeActivity(self.barcodes, bin_duration=1800)
+        activity.update(self.codes, self.start_times, self.lengths)
+
+        self.assertEqual(16, activity.bin_count)
+        self.assertEqual((len(self.barcodes), 16), activity.read_counts.shape)
+
+        bins = (self.start_times // 1800).astype(int)
+        for code, time_bin in ((0, 0), (42, 7), (97, 15)):
+            reads = (self.codes == code) & (bins == time_bin)
+            self.assertEqual(np.count_nonzero(reads), activity.read_counts[code, time_bin])
+            self.assertEqual(int(self.lengths[reads].sum()), activity.bases[code, time_bin])
+
+        self.assertEqual(int(self.lengths[self.codes == 3].sum()), activity.cumulative_yield()[3, -1])
+        self.assertEqual(activity.bases[5, 2] * 2, activity.throughput()[5, 2])
+        self.assertEqual(list(range(len(self.barcodes))), activity.active_barcodes())
+
+    def test_merge(self):
+        """Test that the activities of chunks with different run durations are merged"""
+
+        default_block_size = barcode_activity.barcode_activity_block_size
+        barcode_activity.barcode_activity_block_size = 777
+        try:
+            expected = BarcodeActivity(self.barcodes)
+            expected.update(self.codes, self.start_times, self.lengths)
+        finally:
+            barcode_activity.barcode_activity_block_size = default_block_size
+
+        early = self.start_times < 3600
+        merged = BarcodeActivity(self.barcodes)
+        merged.update(self.codes[early], self.start_times[early], self.lengths[early])
+        later = BarcodeActivity(self.barcodes)
+        later.update(self.codes[~early], self.start_times[~early], self.lengths[~early])
+        later.merge(merged)
+        merged.merge(later)
+        merged.merge(BarcodeActivity(self.barcodes))
+
+        np.testing.assert_array_equal(expected.read_counts, later.read_counts)
+        np.testing.assert_array_equal(expected.bases, later.bases)
+        self.assertEqual(expected.bin_count, merged.bin_count)
+
+        with self.assertRaises(ValueError):
+            merged.merge(BarcodeActivity(self.barcodes[:10]))
+
+    def test_partial_results(self):
+        """Test that the barcodes of the reads are grouped in the barcode groups of the selection"""
+
+        dataframe = pd.DataFrame({'channel': np.ones(4, dtype=np.int16),
+                                  'start_time': np.array([10, 20, 700, 1300], dtype=np.float32),
+                                  'passes_filtering': [True, False, True, True],
+                                  'sequence_length': np.array([100, 200, 300, 400], dtype=np.uint32),
+                                  'mean_qscore': np.array([10, 8, 12, 11], dtype=np.float32),
+                                  'barcode_arrangement': pd.Categorical(['barcode01', 'barcode05', 'unclassified',
+                                                                         'barcode01'])})
+        partial_results = PartialResults(['barcode01', 'barcode02'], with_channel_activity=False)
+        partial_results.update(dataframe)
+
+        activity = partial_results.barcode_activity
+        self.assertEqual(['barcode01', 'barcode02', 'unclassified', 'other barcodes'], activity.barcodes)
+        np.testing.assert_array_equal([[100, 0, 400], [0, 0, 0], [0, 300, 0], [200, 0, 0]], activity.bases)
+        self.assertEqual([0, 2, 3], activity.active_barcodes())
+        self.assertEqual(3, partial_results.read_statistics.length.count(
+            partial_results.read_statistics.partitions('pass')))
+        self.assertIsNone(PartialResults().barcode_activity)
@@ -0,0 +1,58 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import channel_activity
+import unittest
+import numpy as np
+
+
+class TestChannelActivity(unittest.TestCase):
+
+    """ Test the aggregation of the reads by channel and time bin """
+
+    def test_channel_activity(self):
+        """Test the matrices computed by blocks, the active channels and the survival of channels and pores"""
+
+        channels = np.array([1, 1, 2, 2, 3, 1])
+        start_times = np.array([10, 650, 20, 30, 1300, 1250])
+        lengths = np.array([100, 200, 300, 400, 500, 600])
+        durations = np.array([60, 60, 30, 30, 120, 60])
+        muxes = np.array([1, 2, 1, 1, 3, 2])
+
+        block_size = channel_activity.channel_activity_block_size
+        try:
+            channel_activity.channel_activity_block_size = 4
+            activity = channel_activity.ChannelActivity(channels, start_times, lengths, durations, muxes,
+                                                        bin_duration=600)
+        finally:
+            channel_activity.channel_activity_block_size = block_size
+
+        self.assertEqual(3, activity.bin_count)
+        np.testing.assert_array_equal([[0, 0, 0], [1, 1, 1], [2, 0, 0], [0, 0, 1]], activity.read_counts)
+        np.testing.assert_array_equal([[0, 0, 0], [100, 200, 600], [700, 0, 0], [0, 0, 500]], activity.bases)
+        np.testing.assert_array_equal([2, 1, 2], activity.active_channels())
+        np.testing.assert_allclose([10, 10, 15], activity.sequencing_time_percent())
+
+        survival = activity.survival()
+        np.testing.assert_allclose([100, 200 / 3, 200 / 3], survival['All channels'])
+        np.testing.assert_allclose([100, 0, 0], survival['Pores of mux 1'])
+        np.testing.assert_allclose([100, 100, 100], survival['Pores of mux 2'])
+
+    def test_merge(self):
+        """Test that merging the activities of two sets of reads gives the activity of all the reads"""
+
+        channels = np.array([1, 1, 2, 2, 3, 1])
+        start_times = np.array([10, 650, 20, 30, 1300, 1250])
+        lengths = np.array([100, 200, 300, 400, 500, 600])
+        muxes = np.array([1, 2, 1, 1, 3, 2])
+
+        activity = channel_activity.ChannelActivity(channels, start_times, lengths, muxes=muxes, bin_duration=600)
+        merged = channel_activity.ChannelActivity(channels[:4], start_times[:4], lengths[:4], muxes=muxes[:4],
+                                                  bin_duration=600)
+        merged.merge(channel_activity.ChannelActivity(channels[4:], start_times[4:], lengths[4:], muxes=muxes[4:],
+                                                      bin_duration=600))
+
+        self.assertEqual((activity.channel_count, activity.mux_count, activity.bin_count),
+                         (merged.channel_count, merged.mux_count, merged.bin_count))
+        np.testing.assert_array_equal(activity.pore_read_counts, merged.pore_read_counts)
+        np.testing.assert_array_equal(activity.read_counts, merged.read_counts)
+        np.testing.assert_array_equal(activity.bases, merged.bases)
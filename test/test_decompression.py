@@ -0,0 +1,111 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import decompression
+import bz2
+import gzip
+import struct
+import tempfile
+import unittest
+import zlib
+
+data = b''.join(b'read' + str(i).encode() + b'\t' + str(i * 7).encode() + b'\n' for i in range(20000))
+
+# Empty BGZF block written at the end of the BGZF files
+bgzf_eof = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+
+def _bgzf_compress(data, block_size=10000):
+    """Compress data in BGZF blocks like bgzip"""
+
+    blocks = []
+    for start in range(0, len(data), block_size):
+        block = data[start:start + block_size]
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        compressed = compressor.compress(block) + compressor.flush()
+        header = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' + \
+            struct.pack('<H', len(compressed) + 25)
+        blocks.append(header + compressed + struct.pack('<II', zlib.crc32(block), len(block)))
+
+    return b''.join(blocks) + bgzf_eof
+
+
+class TestDecompression(unittest.TestCase):
+
+    """ Test the decompression of compressed files by background threads """
+
+    def setUp(self):
+        # Small chunks, so the test files are read and split in several chunks
+        self.default_chunk_size = decompression.decompression_chunk_size
+        decompression.decompression_chunk_size = 4096
+
+    def tearDown(self):
+        decompression.decompression_chunk_size = self.default_chunk_size
+
+    def _read(self, filename, compression, thread_count=1):
+        with open(filename, 'rb') as f:
+            self.assertEqual(compression, decompression.detect_compression(f.read(4)))
+        with decompression.open_decompressed(filename, compression, thread_count) as f:
+            return f.read()
+
+    def test_multi_member_files(self):
+        """Test that files made of several gzip members or bzip2 streams are decompressed entirely"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'summary')
+            with open(filename, 'wb') as f:
+                f.write(gzip.compress(data[:1000]) + gzip.compress(data[1000:]))
+            self.assertEqual(data, self._read(filename, 'gzip'))
+
+            with open(filename, 'wb') as f:
+                f.write(bz2.compress(data[:50000]) + bz2.compress(data[50000:]))
+            self.assertEqual(data, self._read(filename, 'bz2'))
+            self.assertEqual(data, self._read(filename, 'bz2', thread_count=3))
+
+    def test_bgzf_file(self):
+        """Test that the blocks of a BGZF file are decompressed in parallel in the order of the file"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'summary.gz')
+            with open(filename, 'wb') as f:
+                f.write(_bgzf_compress(data))
+
+            self.assertTrue(decompression._is_bgzf_file(filename))
+            segments = list(decompression._bgzf_segments(filename))
+            self.assertGreater(len(segments), 3)
+            self.assertEqual(os.path.getsize(filename), sum(len(segment) for segment in segments))
+
+            self.assertEqual(data, gzip.decompress(_bgzf_compress(data)))
+            self.assertEqual(data, self._read(filename, 'gzip'))
+            self.assertEqual(data, self._read(filename, 'gzip', thread_count=3))
+
+            # A BGZF file followed by a standard gzip member
+            with open(filename, 'wb') as f:
+                f.write(_bgzf_compress(data[:50000]) + gzip.compress(data[50000:]))
+            self.assertEqual(data, self._read(filename, 'gzip', thread_count=3))
+
+    def test_multi_stream_bz2_file(self):
+        """Test that the streams of a multi-stream bzip2 file are decompressed in parallel in the order of the file"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'summary.bz2')
+            with open(filename, 'wb') as f:
+                for start in range(0, len(data), 20000):
+                    f.write(bz2.compress(data[start:start + 20000]))
+
+            self.assertTrue(decompression._is_multi_stream_bz2_file(filename))
+            segments = list(decompression._bz2_segments(filename))
+            self.assertGreater(len(segments), 3)
+            self.assertEqual(data, b''.join(bz2.decompress(segment) for segment in segments))
+
+            self.assertEqual(data, self._read(filename, 'bz2', thread_count=3))
+
+    def test_truncated_file(self):
+        """Test that a truncated file raises an exception"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'summary.gz')
+            with open(filename, 'wb') as f:
+                f.write(gzip.compress(data)[:-100])
+
+            with self.assertRaises(EOFError):
+                self._read(filename, 'gzip')
@@ -0,0 +1,74 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import execution_plan
+from toulligqc.sequencing_summary_common import probe_summary_file
+from toulligqc.sequencing_summary_extractor import SequencingSummaryExtractor
+import numpy as np
+import tempfile
+import unittest
+
+test_data_directory = os.path.dirname(os.path.realpath(__file__)) + '/../test_data/sequencing_summary/'
+
+
+class TestExecutionPlan(unittest.TestCase):
+
+    """ Test the choice of the loading mode of the sequencing summary files """
+
+    def setUp(self):
+        self.info = probe_summary_file(test_data_directory + 'Guppy-basecall-1D-DNA_sequencing_summary.txt')
+
+    def test_estimate_read_count(self):
+        """Test the number of reads estimated from the first lines of the files"""
+
+        line_sample_size = execution_plan.line_sample_size
+        try:
+            execution_plan.line_sample_size = self.info.size + 1
+            self.assertEqual(3999, execution_plan.estimate_read_count(self.info))
+
+            execution_plan.line_sample_size = 50000
+            self.assertAlmostEqual(3999, execution_plan.estimate_read_count(self.info), delta=3999 * 0.05)
+        finally:
+            execution_plan.line_sample_size = line_sample_size
+
+    def test_plan_execution(self):
+        """Test the loading mode chosen under memory budgets"""
+
+        columns = ['channel', 'start_time', 'passes_filtering']
+        datatypes = {'channel': np.int16, 'start_time': np.float64, 'passes_filtering': np.bool_}
+        read_count = execution_plan.estimate_read_count(self.info)
+        memory = read_count * 11 * execution_plan.in_memory_factor
+
+        plan = execution_plan.plan_execution([self.info], columns, datatypes, memory)
+        self.assertEqual((execution_plan.in_memory_mode, read_count, memory),
+                         (plan.mode, plan.estimated_read_count, plan.estimated_memory))
+        self.assertEqual(execution_plan.chunked_mode,
+                         execution_plan.plan_execution([self.info], columns, datatypes, memory - 1).mode)
+        self.assertEqual(execution_plan.out_of_core_mode,
+                         execution_plan.plan_execution([self.info], columns, datatypes, memory, join=True).mode)
+        self.assertEqual(execution_plan.sharded_mode,
+                         execution_plan.plan_execution([self.info], columns, datatypes, memory, sharded=True).mode)
+
+        self.assertEqual(8 * 1024 ** 3, execution_plan.memory_budget('8G'))
+        self.assertGreater(execution_plan.memory_budget(), 0)
+
+    def test_chunked_extraction(self):
+        """Test that the results of the chunked mode are the results of the in-memory mode"""
+
+        results = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for max_memory in ('1G', '1K'):
+                config = {'sequencing_summary_source': self.info.filename, 'images_directory': tmp_dir + '/',
+                          'barcoding': 'False', 'quiet': 'True', 'max_memory': max_memory}
+                extractor = SequencingSummaryExtractor(config)
+                extractor.init()
+                result_dict = {}
+                extractor.extract(result_dict)
+                extractor.clean(result_dict)
+                results.append(result_dict)
+
+        prefix = 'basecaller.sequencing.summary.1d.extractor.'
+        self.assertEqual(['in-memory', 'chunked'], [r[prefix + 'execution.plan'] for r in results])
+        for key in ('read.count', 'read.pass.count', 'channel.occupancy.statistics.mean', 'run.time'):
+            self.assertEqual(results[0][prefix + key], results[1][prefix + key], msg=key)
+        self.assertAlmostEqual(results[0][prefix + 'all.read.length.std'], results[1][prefix + 'all.read.length.std'],
+                               delta=1e-9)
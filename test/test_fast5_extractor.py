@@ -0,0 +1,102 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import fast5_extractor
+from toulligqc.common import ToulligqcError
+import glob
+import numpy as np
+import tarfile
+import tempfile
+import unittest
+
+fast5_directory = os.path.dirname(os.path.realpath(__file__)) + '/../test_data/fast5/'
+
+
+class TestFast5Extractor(unittest.TestCase):
+
+    """ Test the FAST5 extractor """
+
+    def _extract(self, source, deep_scan=False):
+        """Extract the values of a FAST5 source"""
+
+        extractor = fast5_extractor.Fast5Extractor({'fast5_source': source, 'report_name': 'test',
+                                                    'fast5_deep_scan': str(deep_scan), 'quiet': 'True'})
+        self.assertEqual((True, ''), extractor.check_conf())
+        extractor.init()
+
+        result_dict = {}
+        try:
+            extractor.extract(result_dict)
+        finally:
+            extractor.clean(result_dict)
+        return result_dict
+
+    def _assert_tracking_id_values(self, result_dict):
+        """Check the tracking id values of the FAST5 files of the test data"""
+
+        prefix = 'sequencing.telemetry.extractor.'
+        self.assertEqual('FAF04250', result_dict[prefix + 'flowcell.id'])
+        self.assertEqual('1.5.5', result_dict[prefix + 'minknow.version'])
+        self.assertEqual('dnacpc14', result_dict[prefix + 'hostname'])
+        self.assertEqual('c84e1b3b351694f5ea8585eb5e8d11e136f15159', result_dict[prefix + 'run.id'])
+        self.assertEqual('1D_validation_test1', result_dict[prefix + 'sample.id'])
+        self.assertEqual('2017-03-28T15:29:28Z', result_dict[prefix + 'exp.start.time'])
+        self.assertEqual('MN17734', result_dict[prefix + 'device.id'])
+        self.assertEqual('', result_dict[prefix + 'device.type'])
+
+    def test_extract_fast5_file(self):
+        """Test the extraction of the tracking id of a FAST5 file"""
+
+        self._assert_tracking_id_values(self._extract(sorted(glob.glob(fast5_directory + '*.fast5'))[0]))
+
+    def test_scan_fast5_files(self):
+        """Test the reading of the metadata of the reads of single read FAST5 files"""
+
+        df = fast5_extractor.scan_fast5_files(sorted(glob.glob(fast5_directory + '*.fast5')), thread_count=2)
+
+        self.assertEqual(list(fast5_extractor.fast5_read_columns), list(df.columns))
+        self.assertEqual([40, 44, 46], list(df['read_number']))
+        self.assertEqual([282, 282, 282], list(df['channel']))
+        np.testing.assert_allclose([219719 / 4000, 229360 / 4000, 237215 / 4000], df['start_time'])
+        np.testing.assert_allclose([5488 / 4000, 4842 / 4000, 11587 / 4000], df['duration'], rtol=1e-6)
+        np.testing.assert_allclose([255.3949, 254.2178, 253.3044], df['median_before'], rtol=1e-6)
+
+        self.assertEqual(0, len(fast5_extractor.scan_fast5_files([])))
+
+    def test_extract_deep_scan(self):
+        """Test the statistics of the reads of all the FAST5 files of a directory"""
+
+        result_dict = self._extract(fast5_directory, deep_scan=True)
+
+        self.assertEqual(3, result_dict['fast5.extractor.file.count'])
+        self.assertEqual(3, result_dict['fast5.extractor.read.count'])
+        self.assertEqual(1, result_dict['fast5.extractor.channel.count'])
+        self.assertEqual(4000.0, result_dict['fast5.extractor.sampling.rate'])
+        self.assertAlmostEqual((237215 + 11587) / 4000, result_dict['fast5.extractor.run.time'], places=4)
+        self.assertEqual(3.0, result_dict['fast5.extractor.channel.occupancy.statistics.max'])
+        self.assertAlmostEqual(4842 / 4000, result_dict['fast5.extractor.read.duration.min'], places=5)
+        self.assertAlmostEqual(254.2178, result_dict['fast5.extractor.median.before.50%'], places=3)
+        self._assert_tracking_id_values(result_dict)
+
+    def test_extract_tar_archives(self):
+        """Test the extraction of the tracking id of the first FAST5 file of tar.gz and tar.bz2 archives"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for compression in ('gz', 'bz2'):
+                path = os.path.join(tmp_dir, 'fast5.tar.' + compression)
+                with tarfile.open(path, 'w:' + compression) as tar:
+                    tar.add(fast5_directory, arcname='fast5')
+
+                result_dict = self._extract(path)
+                self._assert_tracking_id_values(result_dict)
+                self.assertEqual(path, result_dict['sequencing.telemetry.extractor.source'])
+
+    def test_tar_archive_without_fast5(self):
+        """Test that an archive without FAST5 file is an error"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'empty.tar.gz')
+            with tarfile.open(path, 'w:gz') as tar:
+                tar.add(os.path.dirname(fast5_directory[:-1]) + '/config.txt', arcname='config.txt')
+
+            with self.assertRaises(ToulligqcError):
+                self._extract(path)
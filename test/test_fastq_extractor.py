@@ -0,0 +1,133 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import fastq_extractor
+import gzip
+import math
+import tempfile
+import unittest
+import numpy as np
+
+fastq_file = os.path.dirname(os.path.realpath(__file__)) + \
+             '/../test_data/fastq/20170328_FAF04250/20170328_FAF04250_barcode01.fastq'
+
+
+def _read_fastq_reference(filename):
+    """Compute read lengths and mean Phred scores of a FASTQ file without vectorization"""
+
+    lengths = []
+    qscores = []
+    with open(filename, 'rb') as f:
+        lines = f.read().splitlines()
+
+    for quality in lines[3::4]:
+        lengths.append(len(quality))
+        qscores.append(-10 * math.log10(sum(10 ** (-(c - 33) / 10) for c in quality) / len(quality)))
+
+    return lengths, qscores
+
+
+class TestFastqExtractor(unittest.TestCase):
+
+    """ Test the FASTQ extractor """
+
+    def _parse(self, filename, block_size):
+        blocks = [fastq_extractor.parse_fastq_block(block, newlines)
+                  for block, newlines in fastq_extractor.read_fastq_blocks(filename, block_size)]
+        return {k: np.concatenate([b[k] for b in blocks]) for k in blocks[0]}
+
+    def test_parse_fastq(self):
+        """Test read lengths, mean Phred scores and header tags whatever the block size"""
+
+        lengths, qscores = _read_fastq_reference(fastq_file)
+
+        for block_size in (100, 1000, fastq_extractor.fastq_block_size):
+            result = self._parse(fastq_file, block_size)
+            np.testing.assert_array_equal(lengths, result['sequence_length'])
+            np.testing.assert_allclose(qscores, result['mean_qscore'])
+            self.assertEqual(100, result['channel'][0])
+            self.assertEqual(np.datetime64('2017-03-28T15:36:59'), result['start_time'][0])
+            self.assertTrue((result['barcode'] == 'barcode01').all())
+
+    def test_parse_compressed_fastq_without_tags(self):
+        """Test a gzip compressed file with Windows line endings, missing tags and no final newline"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'reads.fastq.gz')
+            with gzip.open(filename, 'wb') as f:
+                f.write(b'@read1 ch=12\r\nACGT\r\n+\r\n!!II\r\n@read2\r\nAC\r\n+\r\n55')
+
+            result = self._parse(filename, 10)
+
+        np.testing.assert_array_equal([4, 2], result['sequence_length'])
+        np.testing.assert_allclose([-10 * math.log10((1 + 1 + 1e-4 + 1e-4) / 4), 20], result['mean_qscore'])
+        np.testing.assert_array_equal([12, -1], result['channel'])
+        self.assertTrue(np.isnat(result['start_time']).all())
+
+    def _extract(self, source):
+        """Run the extractor on a source and return the result dictionary and the names of the graphs"""
+
+        extractor = fastq_extractor.FastqExtractor({'fastq_source': source, 'images_directory': None,
+                                                    'barcoding': 'False', 'quiet': 'True'})
+        self.assertEqual((True, ''), extractor.check_conf())
+        extractor.init()
+        result_dict = {}
+        extractor.extract(result_dict)
+        graphs = extractor.graph_generation(result_dict)
+        extractor.clean(result_dict)
+
+        return result_dict, [graph[0] for graph in graphs]
+
+    def test_extract(self):
+        """Test the statistics and the graphs of the reads of the FASTQ files of a directory"""
+
+        lengths, qscores = _read_fastq_reference(fastq_file)
+        result_dict, graph_names = self._extract(os.path.dirname(os.path.dirname(fastq_file)))
+
+        prefix = 'basecaller.sequencing.summary.1d.extractor.'
+        self.assertEqual(len(lengths), result_dict[prefix + 'read.count'])
+        self.assertEqual(sum(lengths), result_dict[prefix + 'yield'])
+        self.assertEqual(5.0, result_dict[prefix + 'channel.occupancy.statistics.count'])
+        self.assertIn('Channel occupancy of the flowcell', graph_names)
+        self.assertIn('PHRED score over time', graph_names)
+
+        # The reads have no duration
+        self.assertNotIn('Translocation speed', graph_names)
+
+        # The compression of the files is detected from their content
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'reads.fastq')
+            with open(fastq_file, 'rb') as f, gzip.open(filename, 'wb') as out:
+                out.write(f.read())
+
+            compressed_result_dict, _ = self._extract(filename)
+
+        self.assertEqual(len(lengths), compressed_result_dict[prefix + 'read.count'])
+        self.assertEqual(sum(lengths), compressed_result_dict[prefix + 'yield'])
+
+    def test_extract_sample(self):
+        """Test that the statistics are computed on all the reads when only a sample of the reads is kept"""
+
+        lengths, _ = _read_fastq_reference(fastq_file)
+        sample_size = fastq_extractor.out_of_core_sample_size
+        fastq_extractor.out_of_core_sample_size = 10
+        try:
+            extractor = fastq_extractor.FastqExtractor({'fastq_source': fastq_file, 'images_directory': None,
+                                                        'barcoding': 'False', 'quiet': 'True'})
+            extractor.check_conf()
+            extractor.init()
+            result_dict = {}
+            extractor.extract(result_dict)
+        finally:
+            fastq_extractor.out_of_core_sample_size = sample_size
+
+        prefix = 'basecaller.sequencing.summary.1d.extractor.'
+        self.assertEqual(10, len(extractor.dataframe_1d))
+        self.assertEqual(len(lengths), result_dict[prefix + 'read.count'])
+        self.assertEqual(sum(lengths), result_dict[prefix + 'yield'])
+
+    def test_pass_status_from_path(self):
+        """Test the pass/fail status of the reads deduced from the directories of the path"""
+
+        self.assertTrue(fastq_extractor._pass_status_from_path('/run/fastq_pass/barcode01/reads.fastq'))
+        self.assertFalse(fastq_extractor._pass_status_from_path('/run/fastq_fail/reads.fastq.gz'))
+        self.assertIsNone(fastq_extractor._pass_status_from_path(fastq_file))
@@ -0,0 +1,70 @@
+import sys, os
+import subprocess
+import unittest
+
+package_directory = os.path.dirname(os.path.realpath(__file__)) + "/.."
+
+####################################################################################
+# Import time regression tests: the startup of ToulligQC (e.g. --version, --help)  #
+# must not load the heavy dependencies used by the extractors and the graphs       #
+####################################################################################
+
+heavy_modules = ('pandas', 'plotly', 'scipy', 'sklearn', 'h5py', 'matplotlib')
+
+# Maximal import time of all the modules loaded at startup in microseconds, far below the import time of pandas
+max_import_time = 300000
+
+
+def _import_time(args):
+    """
+    Launch ToulligQC in a new interpreter with the -X importtime option
+    :param args: arguments of the python interpreter
+    :return: a tuple with a dictionary with the cumulative import time (in microseconds) of each module and the import
+    time of all the modules
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = package_directory + os.pathsep + env.get('PYTHONPATH', '')
+    process = subprocess.run([sys.executable, '-X', 'importtime'] + args, env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    result = {}
+    total = 0
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if not fields[1].strip().isdigit():
+            continue
+        result[fields[2].strip()] = int(fields[1])
+
+        # The cumulative time of the modules imported at the top level includes the time of their submodules
+        if not fields[2].startswith('  '):
+            total += int(fields[1])
+
+    return result, total
+
+
+class TestImportTime(unittest.TestCase):
+
+    """ Test that the heavy dependencies are not loaded at startup and that the startup is fast """
+
+    def _assert_no_heavy_module(self, args):
+        modules, import_time = _import_time(args)
+        self.assertIn('toulligqc.configuration', modules)
+        loaded = sorted(m for m in modules if m.split('.')[0] in heavy_modules)
+        self.assertEqual([], loaded)
+        self.assertLess(import_time, max_import_time)
+
+        return modules
+
+    def test_import_main_module(self):
+        """Test the import of the main module"""
+        self._assert_no_heavy_module(['-c', 'import toulligqc.toulligqc'])
+
+    def test_version(self):
+        """Test the --version option"""
+        self._assert_no_heavy_module(['-m', 'toulligqc.toulligqc', '--version'])
+
+    def test_help(self):
+        """Test the --help option"""
+        self._assert_no_heavy_module(['-m', 'toulligqc.toulligqc', '--help'])
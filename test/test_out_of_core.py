@@ -0,0 +1,104 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import out_of_core
+from toulligqc.out_of_core import PartialResults, SpillFiles
+import numpy as np
+import pandas as pd
+import tempfile
+import unittest
+
+
+class TestOutOfCore(unittest.TestCase):
+
+    """ Test the out-of-core processing of the reads """
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        n = 5000
+        self.dataframe = pd.DataFrame({'channel': rng.integers(1, 513, n).astype(np.int16),
+                                       'mux': rng.integers(1, 5, n).astype(np.uint8),
+                                       'start_time': rng.random(n) * 7200,
+                                       'passes_filtering': rng.random(n) > 0.2,
+                                       'sequence_length': rng.integers(100, 20000, n).astype(np.uint32),
+                                       'mean_qscore': (rng.random(n) * 15).astype(np.float32),
+                                       'duration': (rng.random(n) * 10).astype(np.float32)})
+
+    def test_parse_memory_size(self):
+        """Test the parsing of memory sizes"""
+
+        self.assertEqual(512 * 1024 * 1024, out_of_core.parse_memory_size('512'))
+        self.assertEqual(8 * 1024 ** 3, out_of_core.parse_memory_size('8G'))
+        self.assertEqual(1536 * 1024, out_of_core.parse_memory_size('1.5mb'))
+        for value in ('', '0', 'G', '-1G', '8Z'):
+            with self.assertRaises(ValueError):
+                out_of_core.parse_memory_size(value)
+
+    def test_partition_groups(self):
+        """Test the grouping of the partitions under a memory ceiling"""
+
+        self.assertEqual([[0, 1], [3], [4]],
+                         out_of_core.partition_groups([10, 15, 0, 30, 5], 30 * out_of_core.out_of_core_memory_factor))
+
+    def test_spill_files(self):
+        """Test that the records of each partition are read back in order"""
+
+        records = np.empty(1000, dtype=[('channel', np.int16), ('sequence_length', np.uint32)])
+        records['channel'] = np.arange(1000) % 7
+        records['sequence_length'] = np.arange(1000)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            spill = SpillFiles(tmp_dir, 'test', records.dtype, partition_count=4)
+            try:
+                for chunk in (records[:300], records[300:]):
+                    spill.append(chunk, chunk['channel'].astype(np.int64) % 4)
+            finally:
+                spill.close()
+
+            self.assertEqual(records.dtype.itemsize * 1000, spill.sizes().sum())
+            for partition in range(4):
+                expected = records[records['channel'] % 4 == partition]
+                np.testing.assert_array_equal(expected, spill.read([partition]))
+
+    def test_partial_results(self):
+        """Test that the results merged from the partitions of the reads are the results of all the reads"""
+
+        expected = PartialResults()
+        expected.update(self.dataframe)
+
+        merged = PartialResults(sample_size=100)
+        for partition in range(3):
+            partial = PartialResults(sample_size=100)
+            partial.update(self.dataframe[self.dataframe['channel'] % 3 == partition])
+            merged.merge(partial)
+
+        self.assertEqual(expected.run_time, merged.run_time)
+        for key, value in expected.read_statistics.length.describe().items():
+            self.assertAlmostEqual(value, merged.read_statistics.length.describe()[key], delta=value * 1e-12)
+        np.testing.assert_array_equal(expected.channel_read_counts, merged.channel_read_counts)
+        np.testing.assert_array_equal(expected.channel_activity.pore_read_counts,
+                                      merged.channel_activity.pore_read_counts)
+
+        counts = merged.channel_read_count_dataframe()
+        self.assertEqual(len(self.dataframe), counts['read_count'].sum())
+        self.assertEqual(self.dataframe['passes_filtering'].sum(),
+                         counts.loc[counts['passes_filtering'], 'read_count'].sum())
+
+        sample = merged.sample_dataframe()
+        self.assertEqual(100, len(sample))
+        self.assertEqual(list(self.dataframe.columns), list(sample.columns))
+        self.assertEqual(100, len(pd.merge(sample, self.dataframe)))
+
+    def test_partial_results_categories(self):
+        """Test that the categories of the samples of partial results with different categories are merged"""
+
+        merged = PartialResults(sample_size=1000)
+        for barcodes in (['barcode01', 'barcode02'], ['barcode02', 'unclassified']):
+            partial = PartialResults(sample_size=1000)
+            partial.update(self.dataframe[:100].assign(barcode_arrangement=pd.Categorical(barcodes * 50)))
+            merged.merge(partial)
+
+        sample = merged.sample_dataframe()
+        self.assertEqual(['barcode01', 'barcode02', 'unclassified'],
+                         list(sample['barcode_arrangement'].cat.categories))
+        self.assertEqual({'barcode01': 50, 'barcode02': 100, 'unclassified': 50},
+                         sample['barcode_arrangement'].value_counts().to_dict())
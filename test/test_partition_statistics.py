@@ -0,0 +1,138 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import partition_statistics
+from toulligqc.partition_statistics import PartitionStatistics, ReadStatistics
+import numpy as np
+import pandas as pd
+import unittest
+
+
+class TestPartitionStatistics(unittest.TestCase):
+
+    """ Test the statistics of the partitions of the reads """
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.lengths = rng.integers(1, 50000, 10000).astype(np.uint32)
+        self.codes = rng.integers(0, 6, 10000)
+        # Partition 5 is empty and partition 4 has a single value
+        self.codes[self.codes == 5] = 0
+        self.codes[self.codes == 4] = 3
+        self.codes[17] = 4
+
+    def assertDescribe(self, expected, statistics):
+        for key, value in expected.items():
+            if np.isnan(value):
+                self.assertTrue(np.isnan(statistics[key]), msg=key)
+            else:
+                self.assertAlmostEqual(value, statistics[key], delta=abs(value) * 1e-9, msg=key)
+
+    def _statistics(self, values, codes=None, partition_count=6, resolution=None):
+        stats = PartitionStatistics(partition_count, resolution)
+        stats.update(values, codes)
+        return stats
+
+    def test_describe(self):
+        """Test that the statistics of partitions and of unions of partitions are those of pandas"""
+
+        stats = self._statistics(self.lengths, self.codes)
+        series = pd.Series(self.lengths)
+
+        self.assertDescribe(series.describe(), stats.describe())
+        for partitions in ([0], [1, 3], [0, 2, 4], [4], [5]):
+            expected = series[np.isin(self.codes, partitions)].describe()
+            self.assertDescribe(expected, stats.describe(partitions))
+
+        self.assertEqual(int(self.lengths.sum()), int(stats.sum()))
+        self.assertEqual(int(self.lengths.max()), stats.max())
+        self.assertEqual(0, stats.count([5]))
+
+    def test_chunks(self):
+        """Test that statistics updated by blocks or merged from chunks are exact"""
+
+        default_block_size = partition_statistics.partition_statistics_block_size
+        partition_statistics.partition_statistics_block_size = 333
+        try:
+            stats = self._statistics(self.lengths, self.codes)
+        finally:
+            partition_statistics.partition_statistics_block_size = default_block_size
+
+        merged = self._statistics(self.lengths[:5000] + 100000, self.codes[:5000])
+        merged.merge(self._statistics(self.lengths[5000:], self.codes[5000:]))
+        lengths = np.concatenate([self.lengths[:5000] + 100000, self.lengths[5000:]])
+
+        for partitions in ([1], [0, 3]):
+            self.assertDescribe(pd.Series(self.lengths[np.isin(self.codes, partitions)]).describe(),
+                                stats.describe(partitions))
+            self.assertDescribe(pd.Series(lengths[np.isin(self.codes, partitions)]).describe(),
+                                merged.describe(partitions))
+
+    def test_sparse_histograms(self):
+        """Test that only the non-empty bins of the partitions are stored"""
+
+        stats = self._statistics(self.lengths, self.codes, partition_count=1000)
+        stats.merge(self._statistics(np.array([7, 123456]), np.array([999, 999]), partition_count=1000))
+
+        self.assertEqual(len(np.unique(np.stack([self.codes, self.lengths]), axis=1).T) + 2, len(stats.bins))
+        self.assertLess(len(stats.keys), 10003)
+
+        values, counts = stats.histogram([999, 5])
+        self.assertEqual([7, 123456], list(values[counts > 0]))
+        self.assertEqual(2, stats.count([999]))
+        self.assertEqual(123456, stats.max([999]))
+
+        values, counts = stats.histogram([4, 3])
+        expected_values, expected_counts = np.unique(self.lengths[np.isin(self.codes, [3, 4])], return_counts=True)
+        np.testing.assert_array_equal(expected_values, values[counts > 0])
+        np.testing.assert_array_equal(expected_counts, counts[counts > 0])
+
+    def test_nxx(self):
+        """Test the N50 and L50 computed from the histogram"""
+
+        for lengths in (self.lengths, np.array([5, 5, 5, 5], dtype=np.uint32), np.array([1, 1, 2])):
+            data = np.sort(lengths.astype(np.int64))
+            cumulative_sums = np.cumsum(data)
+            i = np.searchsorted(cumulative_sums, cumulative_sums[-1] * 50 / 100)
+            self.assertEqual((data[i], i + 1), self._statistics(lengths, partition_count=1).nxx(50))
+
+        self.assertEqual((None, None), PartitionStatistics().nxx(50))
+
+    def test_resolution(self):
+        """Test the statistics of values counted in a histogram with a fixed resolution"""
+
+        qscores = np.random.default_rng(1).random(1000).astype(np.float32) * 20
+        stats = self._statistics(qscores, partition_count=1, resolution=1000)
+        expected = pd.Series(qscores.astype(np.float64)).describe()
+
+        self.assertDescribe(expected.drop(['25%', '50%', '75%']), stats.describe())
+        for key in ('25%', '50%', '75%'):
+            self.assertAlmostEqual(expected[key], stats.describe()[key], delta=0.001)
+
+        # Quartiles interpolated between two bins are rounded to the resolution
+        stats = self._statistics(np.array([12.349, 12.35], dtype=np.float32), partition_count=1, resolution=1000)
+        self.assertEqual('12.349', str(stats.describe()['25%']))
+        self.assertEqual('12.35', str(stats.describe()['75%']))
+
+    def test_nan_values(self):
+        """Test that NaN values are ignored"""
+
+        values = np.array([1.0, np.nan, 3.0, 4.0])
+        self.assertDescribe(pd.Series(values).describe(), self._statistics(values, resolution=10).describe())
+
+    def test_read_statistics(self):
+        """Test the partitions of the pass and fail reads of the barcodes"""
+
+        df = pd.DataFrame({'passes_filtering': [True, False, True, True, False, True],
+                           'sequence_length': np.array([100, 200, 300, 400, 500, 600], dtype=np.uint32),
+                           'mean_qscore': np.array([10, 5, 12, 11, 6, 9], dtype=np.float32),
+                           'barcode_arrangement': pd.Categorical(['barcode01', 'barcode02', 'unclassified',
+                                                                  'barcode01', 'barcode03', None])})
+        stats = ReadStatistics(['barcode01', 'barcode03'])
+        stats.update(df)
+
+        self.assertEqual(['barcode01', 'barcode03', 'unclassified', 'other barcodes'], stats.barcodes)
+        self.assertEqual(4, stats.length.count(stats.partitions('pass')))
+        self.assertEqual(400.0, stats.length.describe(stats.partitions('all', 'barcode01'))['max'])
+        self.assertEqual([2, 0, 1, 1], stats.barcode_counts('pass').tolist())
+        self.assertEqual([0, 1, 0, 1], stats.barcode_counts('fail').tolist())
+        self.assertEqual(5.5, stats.qscore.describe(stats.partitions('fail'))['mean'])
@@ -0,0 +1,83 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import plotly_graph_common as pgc
+import numpy as np
+import plotly.graph_objs as go
+import unittest
+
+
+class TestDownsampling(unittest.TestCase):
+
+    """ Test the downsampling of the traces of the figures """
+
+    def test_lttb_indices(self):
+        """Test that LTTB keeps the first and last points and the peaks of a curve"""
+
+        x = np.arange(1000, dtype=float)
+        y = np.zeros(1000)
+        y[333] = 100
+        y[777] = -50
+
+        indices = pgc._lttb_indices(x, y, 50)
+        self.assertEqual(50, len(indices))
+        self.assertEqual(0, indices[0])
+        self.assertEqual(999, indices[-1])
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(333, indices)
+        self.assertIn(777, indices)
+
+        np.testing.assert_array_equal(np.arange(10), pgc._lttb_indices(x[:10], y[:10], 50))
+
+    def test_downsample_figure(self):
+        """Test that the traces are downsampled proportionally to their number of points"""
+
+        rng = np.random.default_rng(42)
+        x = np.arange(6000, dtype=float)
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=x[:4000], y=rng.random(4000), mode='lines', text=['t'] * 4000))
+        fig.add_trace(go.Scatter(x=rng.random(2000), y=rng.random(2000), mode='markers'))
+        fig.add_trace(go.Violin(y=rng.random(2000)))
+        fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], mode='lines'))
+
+        pgc._downsample_figure(fig, 800)
+
+        self.assertEqual(400, len(fig.data[0].x))
+        self.assertEqual(400, len(fig.data[0].text))
+        self.assertEqual(200, len(fig.data[1].x))
+        self.assertEqual(200, len(fig.data[2].y))
+        self.assertEqual(2, len(fig.data[3].x))
+
+    def test_non_numeric_traces(self):
+        """Test that traces with categorical values are not downsampled"""
+
+        labels = ['barcode{:02d}'.format(i % 96) for i in range(5000)]
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=labels, y=np.arange(5000), mode='markers'))
+        fig.add_trace(go.Scatter(x=np.arange(5000), y=labels, mode='lines'))
+
+        pgc._downsample_figure(fig, 100)
+
+        self.assertEqual(5000, len(fig.data[0].x))
+        self.assertEqual(5000, len(fig.data[1].x))
+
+    def test_report_budget(self):
+        """Test that the points of the report are shared between the figures whatever their order"""
+
+        self.assertEqual([100, 300, 300], pgc.figure_shares([100, 5000, 5000], 700))
+        self.assertEqual([50, 40, 10], pgc.figure_shares([50, 40, 10], 700))
+
+        graphs = [('graph{}'.format(i), None, None,
+                   go.Figure(go.Scatter(x=np.arange(20000, dtype=float), y=np.ones(20000), mode='lines')))
+                  for i in range(30)]
+        graphs.append(('small', None, None, go.Figure(go.Scatter(x=np.arange(500, dtype=float), y=np.ones(500)))))
+        figures = [fig for _, _, _, fig in graphs]
+        rendered = pgc.render_graphs(graphs, 25000)
+
+        # The last figures of the report get as many points as the first ones
+        counts = [len(fig.data[0].x) for fig in figures]
+        self.assertEqual(500, counts[-1])
+        self.assertLessEqual(max(counts[:-1]) - min(counts[:-1]), 1)
+        self.assertLessEqual(sum(counts), 25000)
+        self.assertGreater(sum(counts), 24000)
+        self.assertEqual(['graph0', None, None], list(rendered[0][:3]))
+        self.assertIn('<div', rendered[-1][3])
@@ -0,0 +1,92 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import pod5_extractor
+import datetime
+import tempfile
+import unittest
+import uuid
+import numpy as np
+
+try:
+    import pod5
+except ImportError:
+    pod5 = None
+
+
+def _write_pod5_fixture(path, read_count):
+    """Write a small POD5 file with random reads"""
+
+    rng = np.random.RandomState(0)
+    date = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    tracking_id = {'flow_cell_id': 'PAK00001', 'run_id': 'run1', 'sample_id': 'sample1', 'device_type': 'minion'}
+    run_info = pod5.RunInfo(acquisition_id='acquisition1', acquisition_start_time=date, adc_max=2047, adc_min=-2048,
+                            context_tags={}, experiment_name='experiment1', flow_cell_id='PAK00001',
+                            flow_cell_product_code='FLO-MIN114', protocol_name='protocol1', protocol_run_id='run1',
+                            protocol_start_time=date, sample_id='sample1', sample_rate=5000,
+                            sequencing_kit='sqk-lsk114', sequencer_position='MN00001',
+                            sequencer_position_type='minion', software='MinKNOW', system_name='host1',
+                            system_type='linux', tracking_id=tracking_id)
+
+    with pod5.Writer(path) as writer:
+        for i in range(read_count):
+            writer.add_read(pod5.Read(read_id=uuid.UUID(int=i), pore=pod5.Pore(i % 512 + 1, 1, 'not_set'),
+                                      calibration=pod5.Calibration(0.0, 1.0), read_number=i,
+                                      start_sample=i * 5000, median_before=float(rng.normal(200, 10)),
+                                      end_reason=pod5.EndReason.from_reason_with_default_forced(
+                                          pod5.EndReasonEnum.SIGNAL_POSITIVE),
+                                      run_info=run_info, signal=np.zeros(500 + i, dtype=np.int16)))
+
+
+class TestPod5Extractor(unittest.TestCase):
+
+    """ Test the POD5 extractor """
+
+    def test_read_statistics_merge(self):
+        """Test that statistics computed by batches and merged are the statistics of all the reads"""
+
+        rng = np.random.RandomState(0)
+        channel = rng.randint(1, 513, 10000)
+        start_time = rng.uniform(0, 3600, 10000)
+        duration = rng.uniform(1, 10, 10000).astype(np.float32)
+        median_before = rng.normal(200, 10, 10000).astype(np.float32)
+        sampling_rate = np.full(10000, 4000.0)
+
+        stats = pod5_extractor.Pod5ReadStatistics()
+        for part in np.array_split(np.arange(10000), 7):
+            batch = pod5_extractor.Pod5ReadStatistics()
+            batch.update(channel[part], start_time[part], duration[part], median_before[part], sampling_rate[part])
+            stats.merge(batch)
+
+        self.assertEqual(10000, stats.read_count)
+        self.assertEqual(10000, len(stats.sample()))
+        np.testing.assert_array_equal(np.bincount(channel)[1:], stats.channel_occupancy().values)
+        self.assertAlmostEqual(float(np.mean(duration, dtype=np.float64)),
+                               stats.statistics['duration'].describe()['mean'])
+        self.assertAlmostEqual(float(np.std(median_before, dtype=np.float64, ddof=1)),
+                               stats.statistics['median_before'].describe()['std'])
+        self.assertEqual(float(duration.max()), stats.statistics['duration'].max())
+        self.assertAlmostEqual(float(np.median(median_before)), stats.statistics['median_before'].describe()['50%'],
+                               places=2)
+        self.assertAlmostEqual(float((start_time + duration).max()), stats.run_time)
+
+    @unittest.skipIf(pod5 is None, 'pod5 package is not installed')
+    def test_extract(self):
+        """Test the extraction of the run information and of the read statistics of a POD5 file"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            _write_pod5_fixture(os.path.join(tmp_dir, 'reads.pod5'), 1000)
+
+            config = {'pod5_source': tmp_dir, 'report_name': 'test', 'pod5_deep_scan': 'True', 'quiet': 'True'}
+            extractor = pod5_extractor.Pod5Extractor(config)
+            self.assertTrue(extractor.check_conf()[0])
+            extractor.init()
+
+            result_dict = {}
+            extractor.extract(result_dict)
+
+        self.assertEqual('PAK00001', result_dict['sequencing.telemetry.extractor.flowcell.id'])
+        self.assertEqual('sqk-lsk114', result_dict['sequencing.telemetry.extractor.sequencing.kit.version'])
+        self.assertEqual(1000, result_dict['pod5.extractor.read.count'])
+        self.assertEqual(512, result_dict['pod5.extractor.channel.count'])
+        self.assertAlmostEqual((999 * 5000 + 1499) / 5000, result_dict['pod5.extractor.run.time'])
+        self.assertAlmostEqual((500 + 999 / 2) / 5000, result_dict['pod5.extractor.read.duration.mean'])
@@ -0,0 +1,88 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import sampling
+import unittest
+import numpy as np
+
+
+class TestSampling(unittest.TestCase):
+
+    """ Test the sampling methods """
+
+    def test_quantile_sample(self):
+        """Test that the sampled values are the quantiles of the data"""
+
+        values = np.random.RandomState(0).permutation(10001).astype(float)
+        actual = sampling.quantile_sample(values, 11)
+
+        np.testing.assert_array_equal(np.arange(0, 10001, 1000), actual)
+
+    def test_quantile_sample_nan(self):
+        """Test that NaN values are ignored and that small data is returned sorted"""
+
+        actual = sampling.quantile_sample([3.0, np.nan, 1.0, 2.0], 10)
+        np.testing.assert_array_equal([1.0, 2.0, 3.0], actual)
+
+    def test_stratified_sample_indices(self):
+        """Test that one value is drawn in each stratum and that the result is reproducible"""
+
+        values = np.random.RandomState(0).uniform(size=1000)
+        indices = sampling.stratified_sample_indices(values, 10)
+
+        ranks = np.argsort(np.argsort(values))
+        np.testing.assert_array_equal(np.arange(10), np.sort(ranks[indices] // 100))
+        np.testing.assert_array_equal(indices, sampling.stratified_sample_indices(values, 10))
+
+        # Tied values are split between the strata of their ranks
+        values = np.random.RandomState(0).randint(0, 5, size=1000)
+        indices = sampling.stratified_sample_indices(values, 100)
+        self.assertEqual(100, len(np.unique(indices)))
+        sorted_values = np.sort(values)
+        self.assertTrue(np.all(sorted_values[::10] <= np.sort(values[indices])))
+        self.assertTrue(np.all(np.sort(values[indices]) <= sorted_values[9::10]))
+
+    def test_random_sample_indices(self):
+        """Test the size and the reproducibility of the sample"""
+
+        actual = sampling.random_sample_indices(1000, 100)
+        self.assertEqual(100, len(np.unique(actual)))
+        np.testing.assert_array_equal(actual, sampling.random_sample_indices(1000, 100))
+        np.testing.assert_array_equal(np.arange(10), sampling.random_sample_indices(10, 100))
+
+    def test_reservoir_sampler(self):
+        """Test that the reservoir sampling of a stream is uniform"""
+
+        sampler = sampling.ReservoirSampler(10000)
+        for chunk in np.array_split(np.arange(1000000), 37):
+            sampler.update(chunk)
+
+        sample = sampler.sample()
+        self.assertEqual(1000000, sampler.count())
+        self.assertEqual(10000, len(np.unique(sample)))
+        self.assertAlmostEqual(0.5, np.mean(sample) / 1000000, delta=0.01)
+
+    def test_reservoir_sampler_small_stream(self):
+        """Test that all the values are kept when the stream is smaller than the sample"""
+
+        sampler = sampling.ReservoirSampler(100)
+        sampler.update([1, 2, 3])
+        sampler.update([4])
+
+        np.testing.assert_array_equal([1, 2, 3, 4], sampler.sample())
+
+    def test_reservoir_sampler_merge(self):
+        """Test that merging two samplers gives a sample of the two streams in proportion of their size"""
+
+        first = sampling.ReservoirSampler(10000)
+        first.update(np.zeros(300000))
+        second = sampling.ReservoirSampler(10000)
+        second.update(np.ones(100000))
+        empty = sampling.ReservoirSampler(10000)
+
+        first.merge(second)
+        first.merge(empty)
+        sample = first.sample()
+
+        self.assertEqual(400000, first.count())
+        self.assertEqual(10000, len(sample))
+        self.assertAlmostEqual(0.25, np.mean(sample), delta=0.02)
@@ -0,0 +1,140 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import sequencing_summary_common as ssc
+from toulligqc.sequencing_summary_extractor import SequencingSummaryExtractor
+import gzip
+import numpy as np
+import tempfile
+import unittest
+
+test_data_directory = os.path.dirname(os.path.realpath(__file__)) + '/../test_data/sequencing_summary/'
+
+
+class TestSummarySchema(unittest.TestCase):
+
+    """ Test the detection of the schema of the summary files """
+
+    def test_guppy_files(self):
+        """Test the classification of Guppy sequencing summary and barcoding summary files"""
+
+        schema = ssc.read_summary_schema(test_data_directory + 'sequencing_summary_small.txt')
+        self.assertEqual(ssc.sequencing_summary_type, schema.file_type)
+        self.assertEqual(['sequence_length_template', 'mean_qscore_template'],
+                         schema.usecols(['sequence_length', 'mean_qscore']))
+
+        schema = ssc.read_summary_schema(test_data_directory + 'barcoding_summ_pass_small.txt')
+        self.assertEqual(ssc.barcoding_summary_type, schema.file_type)
+
+        schema = ssc.read_summary_schema(test_data_directory + 'random_file.txt')
+        self.assertIsNone(schema.file_type)
+
+    def test_column_aliases(self):
+        """Test a summary with other column names and order and without pass/fail status"""
+
+        schema = ssc.SummarySchema(['read_id', 'channel', 'mux', 'start_time', 'duration', 'sequence_length',
+                                    'mean_qscore', 'barcode'])
+
+        self.assertEqual(ssc.sequencing_summary_with_barcodes_type, schema.file_type)
+        self.assertEqual(['channel', 'sequence_length', 'barcode'],
+                         schema.usecols(['channel', 'passes_filtering', 'sequence_length', 'barcode_arrangement']))
+        self.assertEqual({'barcode': 'category'}, schema.dtypes({'barcode_arrangement': 'category', 'passes_filtering': bool}))
+        self.assertEqual('barcode_arrangement', schema.canonical_names()['barcode'])
+
+    def test_probe_summary_file(self):
+        """Test the detection of the compression from the content of the file and the cache of the probes"""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'summary')
+            with gzip.open(filename, 'wt') as f:
+                f.write('read_id\tbarcode_arrangement\nread1\tbarcode01\n')
+
+            info = ssc.probe_summary_file(filename)
+            self.assertEqual('gzip', info.compression)
+            self.assertEqual(ssc.barcoding_summary_type, info.schema.file_type)
+            self.assertIs(info, ssc.probe_summary_file(filename))
+
+            # A modified file is probed again
+            with open(filename, 'w') as f:
+                f.write('read_id\tchannel\tstart_time\tduration\tsequence_length\tmean_qscore\n')
+
+            info = ssc.probe_summary_file(filename)
+            self.assertIsNone(info.compression)
+            self.assertEqual(ssc.sequencing_summary_type, info.schema.file_type)
+
+            # The least recently used files are removed from the cache
+            default_cache_size = ssc.summary_file_info_cache_size
+            ssc.summary_file_info_cache_size = 2
+            try:
+                for i in range(3):
+                    with open(filename + str(i), 'w') as f:
+                        f.write('read_id\tbarcode_arrangement\n')
+                    ssc.probe_summary_file(filename + str(i))
+                self.assertEqual(2, len(ssc._summary_file_info_cache))
+                self.assertNotIn(os.path.abspath(filename + '0'), ssc._summary_file_info_cache)
+            finally:
+                ssc.summary_file_info_cache_size = default_cache_size
+
+            with self.assertRaises(FileNotFoundError) as context:
+                ssc.probe_summary_file(filename + 'missing')
+            self.assertIn(filename + 'missing', str(context.exception))
+            self.assertIsInstance(context.exception.__cause__, OSError)
+
+
+class TestBarcodeBalance(unittest.TestCase):
+
+    """ Test the metrics of the balance of the read counts of the barcodes """
+
+    def test_balanced_barcodes(self):
+        """Test the metrics of barcodes with the same number of reads"""
+
+        balance = ssc.barcode_balance([250, 250, 250, 250])
+        self.assertEqual(0.0, balance['cv'])
+        self.assertEqual(1.0, balance['min.max.ratio'])
+        self.assertAlmostEqual(0.0, balance['gini'])
+
+    def test_unbalanced_barcodes(self):
+        """Test the metrics of barcodes with different numbers of reads and of a barcode without read"""
+
+        counts = np.array([400, 100, 300, 200])
+        balance = ssc.barcode_balance(counts)
+        self.assertAlmostEqual(counts.std() / counts.mean(), balance['cv'])
+        self.assertEqual(0.25, balance['min.max.ratio'])
+
+        # Mean absolute difference of all the pairs of barcodes divided by twice the mean
+        gini = np.abs(counts[:, None] - counts[None, :]).sum() / (2 * len(counts) ** 2 * counts.mean())
+        self.assertAlmostEqual(gini, balance['gini'])
+
+        balance = ssc.barcode_balance([0, 0, 1000])
+        self.assertEqual(0.0, balance['min.max.ratio'])
+        self.assertAlmostEqual(2 / 3, balance['gini'])
+
+    def test_no_read(self):
+        """Test that the metrics are NaN without read"""
+
+        for counts in ([], [0, 0]):
+            balance = ssc.barcode_balance(counts)
+            self.assertEqual(set(ssc.barcode_balance_keys), set(balance))
+            self.assertTrue(all(np.isnan(v) for v in balance.values()))
+
+
+class TestBarcodeInfo(unittest.TestCase):
+
+    """ Test the statistics of the barcodes """
+
+    def test_dataframe_unchanged(self):
+        """Test that the barcodes not selected are grouped without modifying the dataframe of the reads"""
+
+        files = [test_data_directory + f for f in ('sequencing_summary_small.txt', 'barcoding_summ_pass_small.txt',
+                                                   'barcoding_summ_fail_small.txt')]
+        extractor = SequencingSummaryExtractor({'sequencing_summary_source': '\t'.join(files),
+                                                'images_directory': None, 'barcoding': 'True',
+                                                'barcode_selection': ['barcode07', 'barcode08'], 'quiet': 'True'})
+        extractor.init()
+        barcodes = extractor.dataframe_1d['barcode_arrangement'].copy()
+        extractor.extract({})
+
+        self.assertTrue(barcodes.equals(extractor.dataframe_1d['barcode_arrangement']))
+        self.assertIn('barcode10', set(extractor.dataframe_1d['barcode_arrangement']))
+        dataframe = extractor.dataframe_dict['barcode_selection_sequence_length_dataframe']
+        self.assertEqual({'passes_filtering', 'barcode07', 'barcode08', 'unclassified', 'other barcodes'},
+                         set(dataframe.columns))
@@ -0,0 +1,46 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc.server import JobQueue
+import unittest
+
+test_data_directory = os.path.dirname(os.path.realpath(__file__)) + '/../test_data/sequencing_summary/'
+
+
+class TestServer(unittest.TestCase):
+
+    """ Test the queue of the QC jobs of the server """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.job_queue = JobQueue(worker_count=1, max_queued_jobs=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.job_queue.shutdown()
+
+    def test_jobs(self):
+        """Test that the events of the jobs are streamed until their results"""
+
+        job = self.job_queue.submit({'sequencing_summary': test_data_directory + 'sequencing_summary_small.txt'})
+        failed_job = self.job_queue.submit({'sequencing_summary': test_data_directory + 'missing.txt'})
+
+        events = list(self.job_queue.events(job))
+        self.assertEqual(['queued', 'running'], [e['status'] for e in events[:2]])
+        self.assertIn('* Start Basecaller sequencing summary extractor', [e.get('message') for e in events])
+        self.assertEqual('done', events[-1]['status'])
+        self.assertEqual(9999, job.result['report']['basecaller.sequencing.summary.1d.extractor.read.count'])
+
+        self.assertEqual('failed', list(self.job_queue.events(failed_job))[-1]['status'])
+        self.assertIn('missing.txt', failed_job.error)
+        self.assertEqual([job, failed_job], self.job_queue.list()[-2:])
+
+    def test_queue_limit(self):
+        """Test that jobs are refused when the queue is full"""
+
+        inputs = {'sequencing_summary': test_data_directory + 'sequencing_summary_small.txt'}
+        jobs = [self.job_queue.submit(inputs) for _ in range(4)]
+
+        self.assertIsNone(jobs[-1])
+        for job in jobs[:-1]:
+            if job is not None:
+                self.assertEqual('done', list(self.job_queue.events(job))[-1]['status'])
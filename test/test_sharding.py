@@ -0,0 +1,68 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc import sharding
+from toulligqc.sequencing_summary_extractor import SequencingSummaryExtractor
+from toulligqc.sequencing_summary_common import probe_summary_file
+from toulligqc.sharding import SequentialExecutor
+import tempfile
+import unittest
+
+test_data_directory = os.path.dirname(os.path.realpath(__file__)) + '/../test_data/sequencing_summary/'
+
+
+class TestSharding(unittest.TestCase):
+
+    """ Test the processing of the sequencing summary files by shards """
+
+    def setUp(self):
+        self.min_shard_size = sharding.min_shard_size
+        sharding.min_shard_size = 20000
+
+    def tearDown(self):
+        sharding.min_shard_size = self.min_shard_size
+
+    def test_summary_shards(self):
+        """Test that the shards are ranges of complete lines that cover the file"""
+
+        filename = test_data_directory + 'sequencing_summary_small.txt'
+        shards = sharding.summary_shards([probe_summary_file(filename)], 4)
+
+        with open(filename, 'rb') as f:
+            data = f.read()
+        self.assertGreater(len(shards), 1)
+        self.assertEqual(0, shards[0].start)
+        self.assertEqual(len(data), shards[-1].end)
+        for previous, shard in zip(shards[:-1], shards[1:]):
+            self.assertEqual(previous.end, shard.start)
+            self.assertEqual(ord('\n'), data[shard.start - 1])
+
+    def test_sharded_extraction(self):
+        """Test that the results merged from the shards are the results of the whole files"""
+
+        files = [test_data_directory + f for f in ('sequencing_summary_small.txt', 'barcoding_summ_pass_small.txt',
+                                                   'barcoding_summ_fail_small.txt')]
+        results = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # The barcodes of the reads of the shards are joined by groups of partitions spread over the workers
+            for executor, workers in ((None, '1'), (SequentialExecutor(), '1'), (SequentialExecutor(), '3')):
+                config = {'sequencing_summary_source': '\t'.join(files), 'images_directory': tmp_dir + '/',
+                          'barcoding': 'True', 'quiet': 'True', 'workers': workers,
+                          'barcode_selection': ['barcode07', 'barcode08', 'barcode10', 'barcode12']}
+                extractor = SequencingSummaryExtractor(config)
+                extractor.executor = executor
+                extractor.init()
+                result_dict = {}
+                extractor.extract(result_dict)
+                extractor.clean(result_dict)
+                results.append(result_dict)
+
+        for sharded_results in results[1:]:
+            self.assertEqual(sorted(results[0]), sorted(sharded_results))
+            self.assertEqual('sharded', sharded_results['basecaller.sequencing.summary.1d.extractor.execution.plan'])
+            for key, value in results[0].items():
+                if '.execution.plan' in key:
+                    continue
+                if isinstance(value, float):
+                    self.assertAlmostEqual(value, sharded_results[key], delta=abs(value) * 1e-9, msg=key)
+                else:
+                    self.assertEqual(value, sharded_results[key], msg=key)
@@ -0,0 +1,89 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../toulligqc")
+from toulligqc.partition_statistics import PartitionStatistics
+from toulligqc.time_windows import TimeWindowStatistics
+import numpy as np
+import pandas as pd
+import unittest
+
+
+class TestTimeWindows(unittest.TestCase):
+
+    """ Test the metrics of the time windows of the run """
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.dataframe = pd.DataFrame({'start_time': rng.uniform(0, 5 * 3600, 5000).astype(np.float32),
+                                       'passes_filtering': rng.random(5000) < 0.8,
+                                       'sequence_length': rng.integers(100, 20000, 5000).astype(np.uint32),
+                                       'mean_qscore': rng.uniform(5, 15, 5000).astype(np.float32)})
+        # The third hour of the run is empty
+        self.dataframe = self.dataframe[(self.dataframe['start_time'] < 2 * 3600)
+                                        | (self.dataframe['start_time'] >= 3 * 3600)].reset_index(drop=True)
+
+    def test_metrics(self):
+        """Test that the metrics of each window are those of the reads of the window"""
+
+        time_windows = TimeWindowStatistics()
+        time_windows.update(self.dataframe)
+        metrics = time_windows.metrics()
+
+        self.assertEqual(5, time_windows.window_count)
+        self.assertEqual([0, 1, 2, 3, 4], list(metrics['start']))
+
+        windows = (self.dataframe['start_time'] // 3600).astype(int)
+        for window, row in metrics.iterrows():
+            reads = self.dataframe[windows == window]
+            self.assertEqual(len(reads), row['read.count'])
+            self.assertEqual(int(reads['sequence_length'].sum()), row['yield'])
+            if len(reads) == 0:
+                self.assertTrue(np.isnan(row['pass.ratio']))
+                self.assertTrue(np.isnan(row['n50']))
+                continue
+
+            self.assertAlmostEqual(reads['passes_filtering'].mean(), row['pass.ratio'])
+            self.assertAlmostEqual(reads['mean_qscore'].median(), row['median.qscore'], delta=1e-3)
+
+            lengths = np.sort(reads['sequence_length'].values)
+            cumulative_sums = np.cumsum(lengths)
+            n50 = lengths[np.searchsorted(cumulative_sums, cumulative_sums[-1] / 2)]
+            self.assertEqual(n50, row['n50'])
+
+    def test_merge(self):
+        """Test that merged windows of chunks with different run durations are the windows of all the reads"""
+
+        expected = TimeWindowStatistics()
+        expected.update(self.dataframe)
+
+        early = self.dataframe['start_time'] < 3600
+        time_windows = TimeWindowStatistics()
+        time_windows.update(self.dataframe[early])
+        later = TimeWindowStatistics()
+        later.update(self.dataframe[~early])
+        time_windows.merge(later)
+        self.assertEqual(5, later.window_count)
+
+        # Merge a chunk with fewer windows
+        merged = TimeWindowStatistics()
+        merged.update(self.dataframe[~early])
+        first = TimeWindowStatistics()
+        first.update(self.dataframe[early])
+        merged.merge(first)
+        self.assertEqual(1, first.window_count)
+
+        pd.testing.assert_frame_equal(expected.metrics(), time_windows.metrics())
+        pd.testing.assert_frame_equal(expected.metrics(), merged.metrics())
+
+    def test_add_partitions(self):
+        """Test that the partitions added to partition statistics are empty"""
+
+        stats = PartitionStatistics(2)
+        stats.update(np.array([10, 20, 30]), np.array([0, 1, 1]))
+        stats.add_partitions(4)
+        stats.update(np.array([40]), np.array([3]))
+
+        self.assertEqual(4, stats.partition_count)
+        self.assertEqual(0, stats.count([2]))
+        self.assertEqual(40, stats.max([3]))
+        self.assertEqual(25, stats.describe([1])['mean'])
+
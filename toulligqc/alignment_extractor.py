@@ -0,0 +1,492 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# For more information on the ToulligQC project and its aims,
+# visit the home page at:
+#
+#      https://github.com/GenomicParisCentre/toulligQC
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# Extraction of mapping statistics from aligned BAM files or PAF files
+
+import gzip
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from toulligqc.fastq_extractor import find_files
+from toulligqc.sequencing_summary_common import add_image_to_result
+from toulligqc.sequencing_summary_common import log_task
+from toulligqc.sequencing_summary_common import set_result_value
+
+# Extensions of the alignment files searched in directories
+alignment_extensions = ('.bam', '.paf', '.paf.gz')
+
+# Number of records converted at once in typed arrays
+alignment_batch_size = 65536
+
+# Number of bins of the identity histogram (bins of 0.1%)
+identity_bin_count = 1000
+
+# Maximal value and resolution of the histogram of the alignment accuracies (Phred scale)
+max_accuracy_qscore = 60
+accuracy_bins_per_qscore = 10
+
+# Key of the read count of the basecaller extractors, used when unmapped reads are missing from PAF files
+basecaller_read_count_key = 'basecaller.sequencing.summary.1d.extractor.read.count'
+
+
+class AlignmentExtractor:
+    """
+    Extraction of mapping statistics from aligned BAM files (sorted or not) or PAF files.
+    Files are streamed and the primary alignment of each read is accumulated in fixed size histograms:
+    the memory used does not depend on the number of reads.
+    The identity of an alignment is the number of matches divided by the number of alignment columns
+    (matches, mismatches, insertions and deletions) and the accuracy is the identity in Phred scale.
+    """
+
+    def __init__(self, config_dictionary):
+        self.config_dictionary = config_dictionary
+        self.sources = config_dictionary['alignment_source'].split('\t')
+        self.images_directory = config_dictionary.get('images_directory', None)
+        self.quiet = config_dictionary.get('quiet', 'False').lower() == 'true'
+        self.thread_count = int(config_dictionary.get('threads', '1'))
+        self.files = []
+        self.statistics = None
+
+    def check_conf(self):
+        """
+        Check if the alignment sources contain BAM or PAF files and if the pysam package is available
+        for BAM files
+        :return: boolean and a string for error message
+        """
+
+        for source in self.sources:
+            if not os.path.exists(source):
+                return False, "No such file or directory " + source
+            self.files.extend(find_files(source, alignment_extensions))
+
+        if len(self.files) == 0:
+            return False, "No alignment file has been found"
+
+        if any(not _is_paf_file(f) for f in self.files):
+            try:
+                import pysam
+            except ImportError:
+                return False, 'The pysam Python package is required to read BAM files (pip install pysam)'
+
+        return True, ""
+
+    def init(self):
+        """
+        Stream all the alignment files and accumulate the statistics of the reads
+        """
+
+        start_time = time.time()
+        self.statistics = AlignmentStatistics()
+
+        for path in self.files:
+            batches = read_paf_batches(path) if _is_paf_file(path) else read_alignment_batches(path, self.thread_count)
+            for batch in batches:
+                self.statistics.update(**batch)
+
+        log_task(self.quiet,
+                 'Read {:,d} alignments in {:,d} files'.format(self.statistics.read_count, len(self.files)),
+                 start_time,
+                 time.time())
+
+    @staticmethod
+    def get_name():
+        """
+        Get the name of the extractor.
+        :return: the name of the extractor
+        """
+        return 'Alignment'
+
+    @staticmethod
+    def get_report_data_file_id():
+        """
+        Get the report.data id of the extractor
+        :return: the report.data id
+        """
+        return 'alignment.extractor'
+
+    def extract(self, result_dict):
+        """
+        Put the mapping statistics in the result_dict
+        :param result_dict: Dictionary which gathers all the extracted
+        information that will be reported in the report.data file
+        """
+
+        stats = self.statistics
+
+        # PAF files only contain unmapped reads when the aligner is asked to (e.g. minimap2 --paf-no-hit),
+        # the read count of the basecaller extractor is used instead
+        read_count = stats.read_count
+        if stats.unmapped_count == 0 and result_dict.get(basecaller_read_count_key, 0) > read_count \
+                and all(_is_paf_file(f) for f in self.files):
+            read_count = result_dict[basecaller_read_count_key]
+
+        set_result_value(self, result_dict, 'file.count', len(self.files))
+        set_result_value(self, result_dict, 'read.count', int(read_count))
+        set_result_value(self, result_dict, 'mapped.read.count', int(stats.mapped_count))
+        set_result_value(self, result_dict, 'unmapped.read.count', int(read_count - stats.mapped_count))
+        set_result_value(self, result_dict, 'mapped.read.ratio', stats.mapped_count / read_count if read_count else np.nan)
+        set_result_value(self, result_dict, 'mapped.read.frequency',
+                         stats.mapped_count / read_count * 100 if read_count else np.nan)
+        set_result_value(self, result_dict, 'mapped.read.yield', int(stats.mapped_yield))
+        set_result_value(self, result_dict, 'aligned.yield', int(stats.aligned_yield))
+        set_result_value(self, result_dict, 'aligned.yield.ratio',
+                         stats.aligned_yield / stats.mapped_yield if stats.mapped_yield else np.nan)
+
+        # Identity and accuracy statistics
+        set_result_value(self, result_dict, 'identity.read.count', int(stats.identity_histogram.sum()))
+        set_result_value(self, result_dict, 'identity.aggregate', stats.aggregate_identity())
+        for key, value in stats.identity_statistics().items():
+            set_result_value(self, result_dict, 'identity.' + key, value)
+        for key, value in stats.accuracy_statistics().items():
+            set_result_value(self, result_dict, 'accuracy.qscore.' + key, value)
+
+        # Mapping rate of the barcodes
+        if not stats.has_barcodes():
+            return
+
+        for barcode, (barcode_read_count, barcode_mapped_count) in sorted(stats.barcode_counts.items()):
+            set_result_value(self, result_dict, barcode + '.read.count', int(barcode_read_count))
+            set_result_value(self, result_dict, barcode + '.mapped.read.count', int(barcode_mapped_count))
+            set_result_value(self, result_dict, barcode + '.mapped.read.frequency',
+                             barcode_mapped_count / barcode_read_count * 100)
+
+    def graph_generation(self, result_dict):
+        """
+        Generation of the identity, accuracy and barcode mapping rate graphs
+        :return: images array containing the title and the path toward the images
+        """
+        images = []
+
+        if self.statistics.identity_histogram.sum() == 0:
+            return images
+
+        from toulligqc import plotly_graph_generator as pgg
+
+        add_image_to_result(self.quiet, images, time.time(),
+                            pgg.alignment_identity_distribution(self.statistics.identity_distribution(),
+                                                                result_dict, self.images_directory))
+        add_image_to_result(self.quiet, images, time.time(),
+                            pgg.alignment_accuracy_distribution(self.statistics.accuracy_distribution(),
+                                                                self.images_directory))
+        if self.statistics.has_barcodes():
+            add_image_to_result(self.quiet, images, time.time(),
+                                pgg.alignment_barcode_mapping_rate(self.statistics.barcode_mapping_rates(),
+                                                                   self.images_directory))
+        return images
+
+    def clean(self, result_dict):
+        """
+        Removing the alignment statistics
+        :param result_dict: dictionary which gathers all the extracted
+        information that will be reported in the report.data file
+        :return:
+        """
+        self.statistics = None
+
+
+class AlignmentStatistics:
+    """
+    Mapping statistics of a stream of reads, updated by batches of primary alignments and mergeable.
+    Identities and accuracies are kept in histograms, quantiles are computed at the resolution of the bins.
+    """
+
+    def __init__(self):
+        self.read_count = 0
+        self.mapped_count = 0
+        self.unmapped_count = 0
+        self.mapped_yield = 0
+        self.aligned_yield = 0
+        self.match_count = 0
+        self.column_count = 0
+        self.identity_sum = 0.0
+        self.identity_histogram = np.zeros(identity_bin_count + 1, dtype=np.int64)
+        self.accuracy_histogram = np.zeros(max_accuracy_qscore * accuracy_bins_per_qscore + 1, dtype=np.int64)
+        self.barcode_counts = {}
+
+    def update(self, mapped, read_length, aligned_length, matches, columns, barcode=None):
+        """
+        Add a batch of reads.
+        :param mapped: mapping status of the reads (boolean ndarray)
+        :param read_length: length of the reads (ndarray)
+        :param aligned_length: number of bases of the reads in the alignments (ndarray)
+        :param matches: number of matches of the alignments, negative if unknown (ndarray)
+        :param columns: number of columns of the alignments (ndarray)
+        :param barcode: barcode of the reads, '' if unknown (ndarray or None)
+        """
+        if len(mapped) == 0:
+            return
+
+        mapped_count = int(mapped.sum())
+        self.read_count += len(mapped)
+        self.mapped_count += mapped_count
+        self.unmapped_count += len(mapped) - mapped_count
+        self.mapped_yield += int(read_length[mapped].sum())
+        self.aligned_yield += int(aligned_length[mapped].sum())
+
+        known = mapped & (matches >= 0) & (columns > 0)
+        matches = matches[known].astype(np.int64)
+        columns = columns[known].astype(np.int64)
+        identity = matches / columns
+        self.match_count += int(matches.sum())
+        self.column_count += int(columns.sum())
+        self.identity_sum += float(identity.sum())
+
+        self.identity_histogram += np.bincount(np.minimum(identity * identity_bin_count, identity_bin_count)
+                                               .astype(np.int64), minlength=len(self.identity_histogram))
+        with np.errstate(divide='ignore'):
+            accuracy = -10.0 * np.log10(1.0 - identity)
+        self.accuracy_histogram += np.bincount(np.minimum(accuracy * accuracy_bins_per_qscore,
+                                                          len(self.accuracy_histogram) - 1).astype(np.int64),
+                                               minlength=len(self.accuracy_histogram))
+
+        if barcode is not None:
+            barcodes, inverse = np.unique(np.where(barcode == '', 'unclassified', barcode), return_inverse=True)
+            read_counts = np.bincount(inverse, minlength=len(barcodes))
+            mapped_counts = np.bincount(inverse, weights=mapped, minlength=len(barcodes)).astype(np.int64)
+            for name, read_count, mapped_count in zip(barcodes, read_counts, mapped_counts):
+                self._add_barcode_counts(str(name), read_count, mapped_count)
+
+    def merge(self, other):
+        """
+        Merge the statistics of another set of reads.
+        :param other: the other AlignmentStatistics object
+        """
+        self.read_count += other.read_count
+        self.mapped_count += other.mapped_count
+        self.unmapped_count += other.unmapped_count
+        self.mapped_yield += other.mapped_yield
+        self.aligned_yield += other.aligned_yield
+        self.match_count += other.match_count
+        self.column_count += other.column_count
+        self.identity_sum += other.identity_sum
+        self.identity_histogram += other.identity_histogram
+        self.accuracy_histogram += other.accuracy_histogram
+        for name, (read_count, mapped_count) in other.barcode_counts.items():
+            self._add_barcode_counts(name, read_count, mapped_count)
+
+    def aggregate_identity(self):
+        """
+        Get the identity of all the alignments as a whole (total matches / total alignment columns).
+        :return: the aggregate identity or NaN if no identity is known
+        """
+        return self.match_count / self.column_count if self.column_count > 0 else np.nan
+
+    def identity_statistics(self):
+        """
+        Get the mean, min, quartiles and max of the identities of the reads.
+        :return: a dictionary of floats
+        """
+        result = _histogram_statistics(self.identity_histogram, identity_bin_count)
+        count = self.identity_histogram.sum()
+        result['mean'] = self.identity_sum / count if count > 0 else np.nan
+        return result
+
+    def accuracy_statistics(self):
+        """
+        Get the min, quartiles and max of the accuracies of the reads (Phred scale).
+        :return: a dictionary of floats
+        """
+        return _histogram_statistics(self.accuracy_histogram, accuracy_bins_per_qscore)
+
+    def identity_distribution(self):
+        """
+        Get the distribution of the identities of the reads.
+        :return: a Pandas Series with the read counts indexed by identity (in percent)
+        """
+        return pd.Series(self.identity_histogram, index=np.arange(len(self.identity_histogram)) * 100.0
+                         / identity_bin_count, name='reads')
+
+    def accuracy_distribution(self):
+        """
+        Get the distribution of the accuracies of the reads.
+        :return: a Pandas Series with the read counts indexed by accuracy (Phred scale)
+        """
+        return pd.Series(self.accuracy_histogram, index=np.arange(len(self.accuracy_histogram))
+                         / accuracy_bins_per_qscore, name='reads')
+
+    def has_barcodes(self):
+        """
+        Check if some reads are barcoded.
+        :return: True if at least one read has a barcode
+        """
+        return any(name != 'unclassified' for name in self.barcode_counts)
+
+    def barcode_mapping_rates(self):
+        """
+        Get the mapping rate of the barcodes.
+        :return: a Pandas Series with the percent of mapped reads indexed by barcode
+        """
+        names = sorted(self.barcode_counts)
+        return pd.Series([self.barcode_counts[n][1] / self.barcode_counts[n][0] * 100 for n in names],
+                         index=names, name='mapped reads')
+
+    def _add_barcode_counts(self, name, read_count, mapped_count):
+        counts = self.barcode_counts.setdefault(name, [0, 0])
+        counts[0] += int(read_count)
+        counts[1] += int(mapped_count)
+
+
+def _histogram_statistics(histogram, bins_per_unit):
+    """
+    Compute the min, quartiles and max of values from their histogram. Values are the lower bounds of the bins.
+    :param histogram: counts of the values of each bin (ndarray)
+    :param bins_per_unit: number of bins per unit of the values
+    :return: a dictionary of floats
+    """
+    count = histogram.sum()
+    if count == 0:
+        return {k: np.nan for k in ('min', '25%', '50%', '75%', 'max')}
+
+    non_empty = np.flatnonzero(histogram)
+    cumulative = np.cumsum(histogram)
+    result = {'min': non_empty[0] / bins_per_unit}
+    for q in (25, 50, 75):
+        result[str(q) + '%'] = np.searchsorted(cumulative, count * q / 100.0) / bins_per_unit
+    result['max'] = non_empty[-1] / bins_per_unit
+
+    return result
+
+
+def read_alignment_batches(path, thread_count=1, batch_size=alignment_batch_size):
+    """
+    Read the primary alignments of a BAM file by batches. Secondary and supplementary alignments are ignored.
+    The number of matches is computed from the NM tag or else from the =/X CIGAR operations.
+    :param path: path of the BAM file
+    :param thread_count: number of threads to use for the decompression
+    :param batch_size: number of records of a batch
+    :return: a generator of dictionaries of ndarrays with the arguments of AlignmentStatistics.update()
+    """
+    import pysam
+    from toulligqc.bam_extractor import _barcode_pattern
+
+    batch = _new_batch()
+
+    with pysam.AlignmentFile(path, 'rb', check_sq=False, threads=max(1, thread_count)) as bam:
+        for record in bam.fetch(until_eof=True):
+            if record.is_secondary or record.is_supplementary:
+                continue
+
+            barcode = record.get_tag('BC') if record.has_tag('BC') else \
+                record.get_tag('RG') if record.has_tag('RG') else ''
+            match = _barcode_pattern.search(barcode)
+            batch['barcode'].append(match.group(1) if match else '')
+
+            if record.is_unmapped:
+                batch['mapped'].append(False)
+                batch['read_length'].append(record.query_length)
+                batch['aligned_length'].append(0)
+                batch['matches'].append(-1)
+                batch['columns'].append(0)
+            else:
+                # Operations counts in the MIDNSHP=X order followed by the NM tag value
+                counts = record.get_cigar_stats()[0]
+                columns = counts[0] + counts[1] + counts[2] + counts[7] + counts[8]
+                if record.has_tag('NM'):
+                    matches = columns - counts[-1]
+                elif counts[7] + counts[8] > 0 and counts[0] == 0:
+                    matches = counts[7]
+                else:
+                    matches = -1
+
+                batch['mapped'].append(True)
+                batch['read_length'].append(record.infer_read_length())
+                batch['aligned_length'].append(record.query_alignment_length)
+                batch['matches'].append(matches)
+                batch['columns'].append(columns)
+
+            if len(batch['mapped']) == batch_size:
+                yield _batch_to_arrays(batch)
+                batch = _new_batch()
+
+    if len(batch['mapped']) > 0:
+        yield _batch_to_arrays(batch)
+
+
+def read_paf_batches(path, batch_size=alignment_batch_size):
+    """
+    Read the primary alignments of a PAF file (optionally compressed with gzip) by batches.
+    The alignments of a read must be consecutive, like in the minimap2 output: the first alignment of a read
+    with the tp:A:P tag (or the first alignment if there is no tp tag) is used. Unmapped reads have a '*'
+    target name. The number of matches and the number of columns are the 10th and 11th columns.
+    :param path: path of the PAF file
+    :param batch_size: number of reads of a batch
+    :return: a generator of dictionaries of ndarrays with the arguments of AlignmentStatistics.update()
+    """
+
+    batch = _new_batch()
+    previous_read = None
+
+    with gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb') as f:
+        for line in f:
+            fields = line.rstrip(b'\r\n').split(b'\t')
+            if len(fields) < 12 or fields[0] == previous_read:
+                continue
+            if b'tp:A:' in line and b'tp:A:P' not in line and fields[5] != b'*':
+                continue
+            previous_read = fields[0]
+
+            mapped = fields[5] != b'*'
+            batch['mapped'].append(mapped)
+            batch['read_length'].append(int(fields[1]))
+            batch['aligned_length'].append(int(fields[3]) - int(fields[2]) if mapped else 0)
+            batch['matches'].append(int(fields[9]) if mapped else -1)
+            batch['columns'].append(int(fields[10]) if mapped else 0)
+
+            if len(batch['mapped']) == batch_size:
+                yield _batch_to_arrays(batch)
+                batch = _new_batch()
+
+    if len(batch['mapped']) > 0:
+        yield _batch_to_arrays(batch)
+
+
+def _new_batch():
+    return {'mapped': [], 'read_length': [], 'aligned_length': [], 'matches': [], 'columns': [], 'barcode': []}
+
+
+def _batch_to_arrays(batch):
+    """
+    Convert the lists of values of a batch in typed arrays.
+    :param batch: a dictionary of lists
+    :return: a dictionary of ndarrays
+    """
+    result = {'mapped': np.array(batch['mapped'], dtype=bool),
+              'read_length': np.array(batch['read_length'], dtype=np.int64),
+              'aligned_length': np.array(batch['aligned_length'], dtype=np.int64),
+              'matches': np.array(batch['matches'], dtype=np.int64),
+              'columns': np.array(batch['columns'], dtype=np.int64)}
+
+    # PAF files do not contain barcodes
+    if len(batch['barcode']) > 0:
+        result['barcode'] = np.array(batch['barcode'], dtype=str)
+
+    return result
+
+
+def _is_paf_file(path):
+    return path.endswith(('.paf', '.paf.gz'))
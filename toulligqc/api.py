@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains the Python API of ToulligQC. A QC can be run from another Python program with the run_qc()
+# function: the results are returned in memory instead of being written in a HTML report and a report.data file, and
+# errors are raised as exceptions instead of exiting the program. The command line uses the same functions to create
+# and run the extractors.
+
+import re
+import time
+
+from toulligqc import common
+from toulligqc import configuration
+from toulligqc import toulligqc_info_extractor
+from toulligqc.common import ToulligqcError
+
+# Configuration keys of the input sources of run_qc()
+input_sources = {'sequencing_summary': 'sequencing_summary_source',
+                 'sequencing_summary_1dsqr': 'sequencing_summary_1dsqr_source',
+                 'sequencing_telemetry': 'sequencing_telemetry_source',
+                 'fast5': 'fast5_source',
+                 'pod5': 'pod5_source',
+                 'fastq': 'fastq_source',
+                 'bam': 'bam_source',
+                 'alignment': 'alignment_source'}
+
+# Configuration keys of the sources of basecalled reads
+basecalled_sources = ('sequencing_summary_source', 'sequencing_summary_1dsqr_source', 'fastq_source', 'bam_source')
+
+# Configuration keys of the sources of raw data files
+raw_data_sources = ('fast5_source', 'pod5_source')
+
+
+def run_qc(inputs, options=None, figures=False, executor=None):
+    """
+    Run a QC and return its results without writing any file. The function can be called several times in the same
+    process.
+    :param inputs: dictionary with the name of the input sources (sequencing_summary, sequencing_summary_1dsqr,
+    sequencing_telemetry, fast5, pod5, fastq, bam or alignment) as keys and a path or a list of paths as values
+    :param options: dictionary of the options of the QC with the names of the configuration (e.g. barcodes, threads,
+    workers, out_of_core, max_memory, report_name), optional
+    :param figures: True to generate the graphs and return their plotly figures
+    :param executor: a concurrent.futures Executor object processing the shards of the sequencing summary files,
+    optional
+    :return: a tuple with the result dictionary (the values of report.data) and the list of the graphs, each graph is
+    a tuple with its name, its plotly Figure object, its HTML table and its HTML div. The list of graphs is empty if
+    figures is False
+    """
+    config_dictionary = configuration.ToulligqcConf()
+    config_dictionary['report_name'] = 'ToulligQC-report'
+    config_dictionary['quiet'] = 'True'
+
+    for key, value in (options or {}).items():
+        config_dictionary[key] = str(value)
+
+    for name, paths in inputs.items():
+        if name not in input_sources:
+            raise ToulligqcError('Unknown input source: ' + str(name))
+        if paths:
+            config_dictionary[input_sources[name]] = paths if isinstance(paths, str) else '\t'.join(paths)
+
+    # Nothing is written on the disk
+    config_dictionary['images_directory'] = None
+    config_dictionary['html_report_path'] = None
+    config_dictionary['data_report_path'] = None
+
+    if config_dictionary.get('barcodes', ''):
+        config_dictionary['barcoding'] = 'True'
+
+    check_configuration(config_dictionary)
+    set_barcode_selection(config_dictionary)
+
+    extractors_list = create_extractor_list(config_dictionary)
+    if executor is not None:
+        for extractor in extractors_list:
+            if hasattr(extractor, 'executor'):
+                extractor.executor = executor
+
+    result_dict, graphs = _run_extractors(config_dictionary, extractors_list, figures)
+    if not graphs:
+        return result_dict, []
+
+    # The figures are rendered with the point budget of this report, the rendered graphs are in the order of the
+    # figures
+    from toulligqc.plotly_graph_common import render_graphs
+    return result_dict, [(name, fig, table, div)
+                         for (name, _, table, div), (_, _, _, fig) in zip(render_graphs(graphs), graphs)]
+
+
+def check_configuration(config_dictionary):
+    """
+    Check the input sources and the options of the configuration.
+    :param config_dictionary: configuration dictionary
+    """
+    if not any(config_dictionary.get(key, '') for key in basecalled_sources + raw_data_sources):
+        raise ToulligqcError('No sequencing summary file, BAM file, FASTQ file, Fast5 file or POD5 file has been '
+                             'provided')
+
+    if 'max_memory' in config_dictionary:
+        from toulligqc.out_of_core import parse_memory_size
+        try:
+            parse_memory_size(config_dictionary['max_memory'])
+        except ValueError:
+            raise ToulligqcError('Invalid memory size: ' + config_dictionary['max_memory'])
+
+
+def set_barcode_selection(config_dictionary):
+    """
+    Set the list of the selected barcodes from the barcodes of the configuration (e.g. BC05,RB09,NB01,barcode10).
+    :param config_dictionary: configuration dictionary
+    """
+    if config_dictionary['barcoding'].lower() != 'true':
+        config_dictionary['barcode_selection'] = ''
+        return
+
+    config_dictionary['barcode_selection'] = []
+
+    if 'barcodes' in config_dictionary:
+        barcode_set = set()
+        for b in config_dictionary['barcodes'].strip().split(','):
+            pattern = re.search(r'(BC|RB|NB|BP|BARCODE)(\d{2})', b.strip().upper())
+            if pattern:
+                barcode = 'barcode{}'.format(pattern.group(2))
+                barcode_set.add(barcode)
+        barcode_selection = sorted(barcode_set)
+
+        if len(barcode_selection) == 0:
+            raise ToulligqcError('No known barcode found in provided list of barcodes')
+        config_dictionary['barcode_selection'] = barcode_selection
+
+
+def create_extractor_list(config_dictionary):
+    """
+    Create the extractors required by the input sources of the configuration.
+    :param config_dictionary: configuration dictionary
+    :return: a list of extractors
+    """
+    result = []
+
+    # Without basecalled reads, the raw data files are the primary source of the QC and all their reads are read
+    if not any(config_dictionary.get(key, '') for key in basecalled_sources):
+        config_dictionary['fast5_deep_scan'] = 'True'
+        config_dictionary['pod5_deep_scan'] = 'True'
+
+    if 'sequencing_telemetry_source' in config_dictionary and \
+            config_dictionary['sequencing_telemetry_source']:
+        from toulligqc import sequencing_telemetry_extractor
+        result.append(sequencing_telemetry_extractor.SequencingTelemetryExtractor(config_dictionary))
+
+    if 'fast5_source' in config_dictionary and config_dictionary['fast5_source']:
+        from toulligqc import fast5_extractor
+        result.append(fast5_extractor.Fast5Extractor(config_dictionary))
+
+    if 'pod5_source' in config_dictionary and config_dictionary['pod5_source']:
+        from toulligqc import pod5_extractor
+        result.append(pod5_extractor.Pod5Extractor(config_dictionary))
+
+    if 'sequencing_summary_1dsqr_source' in config_dictionary and \
+            config_dictionary['sequencing_summary_1dsqr_source']:
+        from toulligqc import sequencing_summary_onedsquare_extractor
+        result.append(sequencing_summary_onedsquare_extractor.
+                      OneDSquareSequencingSummaryExtractor(config_dictionary))
+    elif 'sequencing_summary_source' in config_dictionary and config_dictionary['sequencing_summary_source']:
+        from toulligqc import sequencing_summary_extractor
+        result.append(sequencing_summary_extractor.SequencingSummaryExtractor(config_dictionary))
+    elif 'bam_source' in config_dictionary and config_dictionary['bam_source']:
+        from toulligqc import bam_extractor
+        result.append(bam_extractor.BamExtractor(config_dictionary))
+    elif 'fastq_source' in config_dictionary and config_dictionary['fastq_source']:
+        from toulligqc import fastq_extractor
+        result.append(fastq_extractor.FastqExtractor(config_dictionary))
+
+    if 'alignment_source' in config_dictionary and config_dictionary['alignment_source']:
+        from toulligqc import alignment_extractor
+        result.append(alignment_extractor.AlignmentExtractor(config_dictionary))
+
+    result.insert(0, toulligqc_info_extractor.ToulligqcInfoExtractor(config_dictionary, result))
+
+    return result
+
+
+def run_extractors(config_dictionary, extractors_list, graph_generation=True):
+    """
+    Check the configuration of the extractors and execute them.
+    :param config_dictionary: configuration dictionary
+    :param extractors_list: list of extractors
+    :param graph_generation: True to generate the graphs
+    :return: a tuple with the result dictionary and the list of the graphs
+    """
+    result_dict, graphs = _run_extractors(config_dictionary, extractors_list, graph_generation)
+
+    # The point budget of the report is shared between the figures once all the graphs are generated
+    if graphs:
+        from toulligqc.plotly_graph_common import render_graphs
+        graphs = render_graphs(graphs)
+
+    return result_dict, graphs
+
+
+def _run_extractors(config_dictionary, extractors_list, graph_generation):
+    """
+    Check the configuration of the extractors and execute them, without rendering the graphs.
+    :param config_dictionary: configuration dictionary
+    :param extractors_list: list of extractors
+    :param graph_generation: True to generate the graphs
+    :return: a tuple with the result dictionary and the list of the graphs, each graph is a tuple with its name,
+    the path of its file or None, its HTML table and its plotly figure
+    """
+    # Check extractor configuration
+    for extractor in extractors_list:
+        (check_result, error_message) = extractor.check_conf()
+        if not check_result:
+            raise ToulligqcError("Error while checking " + extractor.get_name() + " configuration: " + error_message)
+
+    result_dict = {}
+    graphs = []
+
+    # Information extraction about statistics and generation of the graphs
+    for extractor in extractors_list:
+        _show(config_dictionary, "* Start {0} extractor".format(extractor.get_name()))
+        extractor_start = time.time()
+
+        # Execute extractor
+        extractor.init()
+        extractor.extract(result_dict)
+        if graph_generation:
+            graphs.extend(extractor.graph_generation(result_dict))
+        extractor.clean(result_dict)
+
+        extractor_end = time.time()
+        extract_time = extractor_end - extractor_start
+        result_dict['{}.duration'.format(extractor.get_report_data_file_id())] = round(extract_time, 2)
+
+        _show(config_dictionary, "* End of {0} extractor (done in {1})".format(extractor.get_name(),
+                                                                               common.format_duration(extract_time)))
+
+    return result_dict, graphs
+
+
+def _show(config_dictionary, msg):
+    """
+    Print a message on the screen
+    :param config_dictionary: configuration dictionary
+    :param msg: message to print
+    """
+    if 'quiet' not in config_dictionary or config_dictionary['quiet'].lower() != 'true':
+        print(msg)
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# For more information on the ToulligQC project and its aims,
+# visit the home page at:
+#
+#      https://github.com/GenomicParisCentre/toulligQC
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# Extraction of statistics from the unaligned (or aligned) BAM files written by the Dorado basecaller
+
+import re
+
+import numpy as np
+
+from toulligqc.fastq_extractor import FastqExtractor
+from toulligqc.sequencing_summary_common import default_min_pass_qscore
+
+# Number of records converted at once in typed arrays
+bam_batch_size = 65536
+
+_start_time_pattern = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?')
+_barcode_pattern = re.compile(r'(barcode\d+|unclassified)$')
+
+# Error probability of each Phred value
+_error_probabilities = 10.0 ** (-np.arange(256) / 10.0)
+
+
+class BamExtractor(FastqExtractor):
+    """
+    Extraction of statistics from the BAM files written by the basecaller. The BGZF blocks are decompressed
+    by several threads. The read length and the values of the qs (mean Phred score), ch (channel),
+    st (start time), du (duration) and BC (barcode) tags of the primary records are converted by batches
+    in typed arrays and the statistics are computed batch by batch: only a uniform sample of the reads is kept
+    in memory.
+    The extractor fills the same keys as the sequencing summary extractor.
+    """
+
+    source_key = 'bam_source'
+    file_extensions = ('.bam',)
+
+    def check_conf(self):
+        """
+        Check if the pysam package is available and if the BAM source contains BAM files
+        :return: boolean and a string for error message
+        """
+
+        try:
+            import pysam
+        except ImportError:
+            return False, 'The pysam Python package is required to read BAM files (pip install pysam)'
+
+        return super().check_conf()
+
+    @staticmethod
+    def get_name() -> str:
+        """
+        Get the name of the extractor.
+        :return: the name of the extractor
+        """
+        return 'BAM'
+
+    def _read_batches(self):
+        """
+        Read the statistics of the reads of the BAM files by batches. Secondary and supplementary alignments are
+        ignored. Read pass/fail status is deduced from the mean Phred score of the reads.
+        :return: a generator of dictionaries of ndarrays with the channel (-1 if unknown), start_time (datetime64,
+        NaT if unknown), passes_filtering, sequence_length, mean_qscore, duration (NaN if unknown) and
+        barcode_arrangement ('' if unknown) of the reads
+        """
+
+        for path in self.files:
+            for batch in read_bam_batches(path, self.thread_count):
+                batch['passes_filtering'] = batch['mean_qscore'] >= default_min_pass_qscore
+                yield batch
+
+    def _run_start_time(self):
+        """
+        Get the start time of the run from the DT field of the read groups of the BAM headers.
+        :return: a datetime64 or None if unknown
+        """
+        start_times = [t for path in self.files for t in read_bam_start_times(path)]
+        return min(start_times) if len(start_times) > 0 else None
+
+
+def read_bam_start_times(path):
+    """
+    Get the start times of the read groups of a BAM file (DT field of the @RG header lines).
+    :param path: path of the BAM file
+    :return: a list of datetime64
+    """
+    import pysam
+
+    with pysam.AlignmentFile(path, 'rb', check_sq=False) as bam:
+        read_groups = bam.header.to_dict().get('RG', [])
+
+    start_times = []
+    for read_group in read_groups:
+        match = _start_time_pattern.match(read_group.get('DT', ''))
+        if match:
+            start_times.append(np.datetime64(match.group(0), 'ms'))
+
+    return start_times
+
+
+def read_bam_batches(path, thread_count=1, batch_size=bam_batch_size):
+    """
+    Read the per read values of a BAM file by batches.
+    :param path: path of the BAM file
+    :param thread_count: number of threads to use for the decompression
+    :param batch_size: number of records of a batch
+    :return: a generator of dictionaries of ndarrays with the sequence_length, mean_qscore, channel (-1 if unknown),
+    start_time (NaT if unknown), duration (NaN if unknown) and barcode_arrangement ('' if unknown) of the reads
+    """
+    import pysam
+
+    batch = _new_batch()
+
+    with pysam.AlignmentFile(path, 'rb', check_sq=False, threads=max(1, thread_count)) as bam:
+        for record in bam.fetch(until_eof=True):
+            if record.is_secondary or record.is_supplementary:
+                continue
+
+            # Only the tags used are decoded, not the large tags (e.g. mv, MM and ML)
+            batch['sequence_length'].append(record.query_length)
+            batch['mean_qscore'].append(_get_tag(record, 'qs', None))
+            batch['channel'].append(_get_tag(record, 'ch', -1))
+            batch['start_time'].append(_get_tag(record, 'st', ''))
+            batch['duration'].append(_get_tag(record, 'du', np.nan))
+            batch['barcode_arrangement'].append(_get_tag(record, 'BC', ''))
+
+            # Compute the mean Phred score from the qualities if there is no qs tag
+            if batch['mean_qscore'][-1] is None:
+                batch['mean_qscore'][-1] = _mean_qscore(record.query_qualities)
+
+            if len(batch['sequence_length']) == batch_size:
+                yield _batch_to_arrays(batch)
+                batch = _new_batch()
+
+    if len(batch['sequence_length']) > 0:
+        yield _batch_to_arrays(batch)
+
+
+def _get_tag(record, tag, default):
+    """
+    Get the value of a tag of a record.
+    :param record: a pysam AlignedSegment object
+    :param tag: the name of the tag
+    :param default: the value to return if the record does not have the tag
+    :return: the value of the tag
+    """
+    return record.get_tag(tag) if record.has_tag(tag) else default
+
+
+def _new_batch():
+    return {'sequence_length': [], 'mean_qscore': [], 'channel': [], 'start_time': [], 'duration': [],
+            'barcode_arrangement': []}
+
+
+def _batch_to_arrays(batch):
+    """
+    Convert the lists of values of a batch in typed arrays.
+    :param batch: a dictionary of lists
+    :return: a dictionary of ndarrays
+    """
+
+    start_times = []
+    for value in batch['start_time']:
+        match = _start_time_pattern.match(value)
+        start_times.append(match.group(0) if match else 'NaT')
+
+    barcodes = []
+    for value in batch['barcode_arrangement']:
+        match = _barcode_pattern.search(value)
+        barcodes.append(match.group(1) if match else value)
+
+    return {'sequence_length': np.array(batch['sequence_length'], dtype=np.uint32),
+            'mean_qscore': np.array(batch['mean_qscore'], dtype=np.float32),
+            'channel': np.array(batch['channel'], dtype=np.int32),
+            'start_time': np.array(start_times, dtype='datetime64[ms]'),
+            'duration': np.array(batch['duration'], dtype=np.float32),
+            'barcode_arrangement': np.array(barcodes, dtype=str)}
+
+
+def _mean_qscore(qualities):
+    """
+    Compute the mean Phred score of a read in the error probability space.
+    :param qualities: the Phred values of the read (array or None)
+    :return: the mean Phred score or NaN if the read has no quality values
+    """
+    if qualities is None or len(qualities) == 0:
+        return np.nan
+
+    return float(-10.0 * np.log10(_error_probabilities[np.asarray(qualities)].mean()))
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains the computation of the number of reads and of the yield of each barcode over time. The reads
+# are aggregated in a barcode group x time bin matrix with a single bincount on the codes of the barcode groups and
+# the time bins, so the memory used depends only on the number of barcodes and on the duration of the run, and the
+# matrices of chunks of reads can be merged.
+
+import numpy as np
+
+# Duration of the time bins in seconds
+barcode_activity_bin_duration = 600
+
+# Number of reads aggregated at once
+barcode_activity_block_size = 10 * 1000 * 1000
+
+
+class BarcodeActivity:
+    """
+    Number of reads and number of bases of each barcode group for each time bin of the run.
+    """
+
+    def __init__(self, barcodes, bin_duration=barcode_activity_bin_duration):
+        """
+        Constructor.
+        :param barcodes: list of the barcode groups
+        :param bin_duration: duration of the time bins in seconds
+        """
+        self.barcodes = list(barcodes)
+        self.bin_duration = bin_duration
+        self.bin_count = 0
+        self.read_counts = np.zeros((len(self.barcodes), 0), dtype=np.int64)
+        self.bases = np.zeros((len(self.barcodes), 0), dtype=np.float64)
+
+    def update(self, codes, start_times, sequence_lengths):
+        """
+        Add a chunk of reads.
+        :param codes: array of the index of the barcode group of each read
+        :param start_times: array of the start times of the reads in seconds
+        :param sequence_lengths: array of the lengths of the reads
+        """
+        if len(codes) == 0:
+            return
+
+        start_times = np.asarray(start_times)
+        self._add_bins(int(max(start_times.max(), 0) // self.bin_duration) + 1)
+        shape = self.read_counts.shape
+
+        for start in range(0, len(codes), barcode_activity_block_size):
+            block = slice(start, start + barcode_activity_block_size)
+            time_bins = np.clip(start_times[block] // self.bin_duration, 0, None).astype(np.int64)
+            cells = np.asarray(codes[block], dtype=np.int64) * self.bin_count + time_bins
+
+            self.read_counts += np.bincount(cells, minlength=self.read_counts.size).reshape(shape)
+            self.bases += np.bincount(cells, weights=np.asarray(sequence_lengths[block], dtype=np.float64),
+                                      minlength=self.bases.size).reshape(shape)
+
+    def merge(self, other):
+        """
+        Add the activity of another chunk of reads.
+        :param other: the other BarcodeActivity object, with the same barcode groups and bin duration
+        """
+        if other.barcodes != self.barcodes or other.bin_duration != self.bin_duration:
+            raise ValueError('Cannot merge barcode activities with different barcodes or bin durations')
+
+        self._add_bins(other.bin_count)
+        self.read_counts[:, :other.bin_count] += other.read_counts
+        self.bases[:, :other.bin_count] += other.bases
+
+    def _add_bins(self, bin_count):
+        """
+        Add empty time bins at the end of the run.
+        :param bin_count: the new number of time bins, lower numbers are ignored
+        """
+        if bin_count <= self.bin_count:
+            return
+
+        padding = ((0, 0), (0, bin_count - self.bin_count))
+        self.read_counts = np.pad(self.read_counts, padding)
+        self.bases = np.pad(self.bases, padding)
+        self.bin_count = bin_count
+
+    def time_bins(self):
+        """
+        Get the end of the time bins.
+        :return: an array with the time of the bins in hours
+        """
+        return (np.arange(self.bin_count) + 1) * self.bin_duration / 3600
+
+    def active_barcodes(self):
+        """
+        Get the barcode groups with reads.
+        :return: a list of the indices of the barcode groups
+        """
+        return list(np.flatnonzero(self.read_counts.sum(axis=1)))
+
+    def cumulative_yield(self):
+        """
+        Get the number of bases sequenced since the start of the run for each barcode group.
+        :return: a 2D array with the number of bases of each barcode group at the end of each time bin
+        """
+        return np.cumsum(self.bases, axis=1)
+
+    def throughput(self):
+        """
+        Get the throughput of each barcode group.
+        :return: a 2D array with the bases per hour of each barcode group in each time bin
+        """
+        return self.bases * 3600 / self.bin_duration
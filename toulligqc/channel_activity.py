@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains the computation of the activity of the channels of the flowcell over time. The reads are
+# aggregated in a channel x time bin matrix with a 2D bincount, so the memory used depends only on the number of
+# channels and on the duration of the run.
+
+import warnings
+
+import numpy as np
+
+# Duration of the time bins in seconds
+channel_activity_bin_duration = 600
+
+# Number of reads aggregated at once
+channel_activity_block_size = 10 * 1000 * 1000
+
+
+class ChannelActivity:
+    """
+    Number of reads, number of bases and sequencing time of each channel for each time bin of the run. When the mux
+    of the reads is known, the number of reads is also computed for each pore (channel and mux).
+    """
+
+    def __init__(self, channels, start_times, sequence_lengths, durations=None, muxes=None,
+                 bin_duration=channel_activity_bin_duration):
+        """
+        Constructor.
+        :param channels: array of the channels of the reads
+        :param start_times: array of the start times of the reads in seconds
+        :param sequence_lengths: array of the lengths of the reads
+        :param durations: array of the durations of the reads in seconds, optional
+        :param muxes: array of the muxes of the reads, optional
+        :param bin_duration: duration of the time bins in seconds
+        """
+        channels = np.asarray(channels)
+        start_times = np.asarray(start_times)
+
+        self.bin_duration = bin_duration
+        self.bin_count = int(max(start_times.max(), 0) // bin_duration) + 1 if len(start_times) > 0 else 1
+        self.channel_count = int(channels.max()) + 1 if len(channels) > 0 else 1
+        self.mux_count = int(np.max(muxes)) + 1 if muxes is not None and len(channels) > 0 else 1
+        self.has_mux = muxes is not None
+        self.has_duration = durations is not None
+
+        channel_shape = (self.channel_count, self.bin_count)
+        pore_shape = (self.channel_count * self.mux_count, self.bin_count)
+        self.pore_read_counts = np.zeros(pore_shape, dtype=np.int64)
+        self.bases = np.zeros(channel_shape, dtype=np.float64)
+        self.durations = np.zeros(channel_shape, dtype=np.float64)
+
+        for start in range(0, len(channels), channel_activity_block_size):
+            block = slice(start, start + channel_activity_block_size)
+            time_bins = np.clip(start_times[block] // bin_duration, 0, None).astype(np.int64)
+            cells = channels[block].astype(np.int64) * self.bin_count + time_bins
+
+            self.bases += np.bincount(cells, weights=np.asarray(sequence_lengths[block], dtype=np.float64),
+                                      minlength=self.bases.size).reshape(channel_shape)
+            if durations is not None:
+                self.durations += np.bincount(cells, weights=np.asarray(durations[block], dtype=np.float64),
+                                              minlength=self.durations.size).reshape(channel_shape)
+
+            if muxes is not None:
+                pores = channels[block].astype(np.int64) * self.mux_count + muxes[block]
+                cells = pores * self.bin_count + time_bins
+            self.pore_read_counts += np.bincount(cells, minlength=self.pore_read_counts.size).reshape(pore_shape)
+
+        self.read_counts = self.pore_read_counts.reshape(self.channel_count, self.mux_count, self.bin_count).sum(axis=1)
+
+    @classmethod
+    def from_dataframe(cls, dataframe, bin_duration=channel_activity_bin_duration):
+        """
+        Aggregate the reads of a dataframe.
+        :param dataframe: a dataframe with the channel, start_time and sequence_length columns and optionally the
+        duration and mux columns
+        :param bin_duration: duration of the time bins in seconds
+        :return: a ChannelActivity object
+        """
+        return cls(dataframe['channel'].values,
+                   dataframe['start_time'].values,
+                   dataframe['sequence_length'].values,
+                   dataframe['duration'].values if 'duration' in dataframe.columns else None,
+                   dataframe['mux'].values if 'mux' in dataframe.columns else None,
+                   bin_duration)
+
+    def merge(self, other):
+        """
+        Add the activity of another set of reads, e.g. another partition of the reads of the run.
+        :param other: the other ChannelActivity object, with the same bin duration
+        """
+        if other.bin_duration != self.bin_duration:
+            raise ValueError('Cannot merge channel activities with different bin durations')
+
+        channel_count = max(self.channel_count, other.channel_count)
+        mux_count = max(self.mux_count, other.mux_count)
+        bin_count = max(self.bin_count, other.bin_count)
+
+        def pad(a, shape):
+            result = np.zeros(shape, dtype=a.dtype)
+            result[tuple(slice(0, n) for n in a.shape)] = a
+            return result
+
+        pore_shape = (channel_count, mux_count, bin_count)
+        self.pore_read_counts = \
+            (pad(self.pore_read_counts.reshape(self.channel_count, self.mux_count, self.bin_count), pore_shape)
+             + pad(other.pore_read_counts.reshape(other.channel_count, other.mux_count, other.bin_count), pore_shape)) \
+            .reshape(channel_count * mux_count, bin_count)
+        self.bases = pad(self.bases, (channel_count, bin_count)) + pad(other.bases, (channel_count, bin_count))
+        self.durations = pad(self.durations, (channel_count, bin_count)) + pad(other.durations, (channel_count, bin_count))
+
+        self.channel_count = channel_count
+        self.mux_count = mux_count
+        self.bin_count = bin_count
+        self.has_mux = self.has_mux or other.has_mux
+        self.has_duration = self.has_duration or other.has_duration
+        self.read_counts = self.pore_read_counts.reshape(channel_count, mux_count, bin_count).sum(axis=1)
+
+    def time_bins(self):
+        """
+        Get the middle of the time bins.
+        :return: an array with the time of the bins in hours
+        """
+        return (np.arange(self.bin_count) + 0.5) * self.bin_duration / 3600
+
+    def active_channels(self):
+        """
+        Get the number of channels with at least one read started in each time bin.
+        :return: an array of integers
+        """
+        return np.count_nonzero(self.read_counts, axis=0)
+
+    def sequencing_time_percent(self):
+        """
+        Get the percentage of time spent by the active channels sequencing reads in each time bin.
+        :return: an array of floats, NaN for the bins without active channels
+        """
+        active_channels = self.active_channels()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(active_channels > 0,
+                            self.durations.sum(axis=0) / (active_channels * self.bin_duration) * 100, np.nan)
+
+    def channel_throughput_quantiles(self, quantiles=(25, 50, 75)):
+        """
+        Get quantiles of the throughput of the active channels in each time bin.
+        :param quantiles: quantiles to compute in percent
+        :return: a 2D array with the bases per hour for each quantile and each time bin
+        """
+        throughput = np.where(self.read_counts > 0, self.bases * 3600 / self.bin_duration, np.nan)
+        with warnings.catch_warnings():
+            # Bins without active channels
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nanpercentile(throughput, quantiles, axis=0)
+
+    def survival(self):
+        """
+        Get the percentage of the channels still active over time. A channel is active until the time bin of its
+        last read. When the mux of the reads is known, the percentage of the pores still active is also computed
+        for each mux.
+        :return: a dictionary with the name of the curves as key and an array of percentages as value
+        """
+        result = {'All channels': _survival_curve(self.read_counts)}
+
+        if self.has_mux:
+            pore_read_counts = self.pore_read_counts.reshape(self.channel_count, self.mux_count, self.bin_count)
+            for mux in range(1, self.mux_count):
+                if pore_read_counts[:, mux].any():
+                    result['Pores of mux ' + str(mux)] = _survival_curve(pore_read_counts[:, mux])
+
+        return result
+
+
+def _survival_curve(read_counts):
+    """
+    Compute the percentage of the rows of a matrix with reads in a column or in a following column.
+    :param read_counts: a 2D array with the number of reads of each channel or pore in each time bin
+    :return: an array of percentages
+    """
+    read_counts = read_counts[read_counts.any(axis=1)]
+    if len(read_counts) == 0:
+        return np.zeros(read_counts.shape[1])
+
+    last_bins = read_counts.shape[1] - 1 - np.argmax(read_counts[:, ::-1] > 0, axis=1)
+    still_active = len(read_counts) - np.cumsum(np.bincount(last_bins, minlength=read_counts.shape[1])) \
+        + np.bincount(last_bins, minlength=read_counts.shape[1])
+
+    return still_active / len(read_counts) * 100
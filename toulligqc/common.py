@@ -18,13 +18,21 @@
 # Maintainer: Laurent Jourdren
 # Since version 2.2
 
-import numpy as np
-from packaging import version
+
+class ToulligqcError(Exception):
+    """
+    Error raised when a QC cannot be run, e.g. when the configuration or the input files are invalid.
+    """
+
 
 def is_numpy_1_24():
     """
     This function checks if Numpy version is later then 1.20
     """
+    # Imports are done here to avoid loading NumPy when the module is imported
+    import numpy as np
+    from packaging import version
+
     return version.parse(np.__version__) >= version.parse("1.20")
 
 def format_duration(t):
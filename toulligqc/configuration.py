@@ -43,6 +43,7 @@ class ToulligqcConf:
                                    'quiet': 'False',
                                    'tmpdir': tempfile.gettempdir(),
                                    'barcoding': 'False',
+                                   'threads': '1',
                                    'report_only': 'False'}
 
     def __getitem__(self, item):
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains a decompression pipeline for compressed input files. The data is decompressed by background
+# threads and returned through a bounded buffer, so decompression and parsing are done at the same time.
+
+import bz2
+import io
+import queue
+import re
+import struct
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Size of the compressed data decompressed at once
+decompression_chunk_size = 4 * 1024 * 1024
+
+# Maximal number of decompressed chunks waiting to be parsed
+decompression_queue_size = 4
+
+# Maximal window size of zstd frames (long-range mode uses windows up to 2 GB)
+zstd_max_window_size = 2 ** 31
+
+# Magic numbers of the compression formats
+_gzip_magic = b'\x1f\x8b'
+_bz2_magic = b'BZh'
+_zstd_magic = b'\x28\xb5\x2f\xfd'
+
+# Header of a bzip2 stream followed by the magic number of its first block. Streams are byte aligned,
+# unlike the blocks inside a stream
+_bz2_stream_start = re.compile(rb'BZh[1-9]1AY&SY')
+
+# Marker of the end of the data in the queue
+_end_of_data = object()
+
+
+def detect_compression(magic):
+    """
+    Detect the compression format of a file from its first bytes.
+    :param magic: the first bytes of the file (at least 4 bytes)
+    :return: 'gzip', 'bz2', 'zstd' or None if the file is not compressed
+    """
+    if magic.startswith(_gzip_magic):
+        return 'gzip'
+    if magic.startswith(_bz2_magic):
+        return 'bz2'
+    if magic.startswith(_zstd_magic):
+        return 'zstd'
+
+    return None
+
+
+def open_decompressed(path, compression, thread_count=1):
+    """
+    Open a compressed file for reading. Data is decompressed by background threads and read through a bounded
+    buffer. BGZF (blocked gzip) files and bzip2 files with several streams (e.g. written by pbzip2) are decompressed
+    in parallel by blocks, other gzip and bzip2 files and zstd files are decompressed by a single background thread.
+    :param path: path of the file
+    :param compression: compression format ('gzip', 'bz2' or 'zstd')
+    :param thread_count: number of threads to use for the decompression
+    :return: a binary file object
+    """
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('The zstandard Python package is required to read zstd files (pip install zstandard)')
+
+    elif compression not in ('gzip', 'bz2'):
+        raise ValueError('Unknown compression format: ' + str(compression))
+
+    return io.BufferedReader(_DecompressedStream(path, compression, max(1, thread_count)),
+                             buffer_size=1024 * 1024)
+
+
+class _DecompressedStream(io.RawIOBase):
+    """
+    Raw stream of the data decompressed by a background thread.
+    """
+
+    def __init__(self, path, compression, thread_count):
+        self._queue = queue.Queue(maxsize=decompression_queue_size)
+        self._buffer = memoryview(b'')
+        self._closing = threading.Event()
+        self._eof = False
+        self._thread = threading.Thread(target=self._produce, args=(path, compression, thread_count), daemon=True)
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while len(self._buffer) == 0:
+            if self._eof:
+                return 0
+
+            item = self._queue.get()
+            if item is _end_of_data:
+                self._eof = True
+            elif isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            else:
+                self._buffer = memoryview(item)
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            # Unblock the background thread if it waits for free space in the queue
+            self._closing.set()
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        super().close()
+
+    def _put(self, item):
+        """
+        Put an item in the queue, unless the stream is closed.
+        :param item: the item to put
+        :return: False if the stream is closed
+        """
+        while not self._closing.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self, path, compression, thread_count):
+        try:
+            for chunk in _decompressed_chunks(path, compression, thread_count):
+                if len(chunk) > 0 and not self._put(chunk):
+                    return
+            self._put(_end_of_data)
+        except Exception as e:
+            self._put(e)
+
+
+def _decompressed_chunks(path, compression, thread_count):
+    """
+    Get the decompressed data of a file by chunks.
+    :param path: path of the file
+    :param compression: compression format
+    :param thread_count: number of threads to use
+    :return: a generator of bytes
+    """
+
+    if compression == 'zstd':
+        import zstandard
+        with open(path, 'rb') as f:
+            reader = zstandard.ZstdDecompressor(max_window_size=zstd_max_window_size) \
+                .stream_reader(f, read_across_frames=True)
+            while True:
+                chunk = reader.read(decompression_chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    if compression == 'gzip' and _is_bgzf_file(path):
+        segments = _bgzf_segments(path)
+        decompress = _decompress_gzip_members
+    elif compression == 'bz2' and thread_count > 1 and _is_multi_stream_bz2_file(path):
+        segments = _bz2_segments(path)
+        decompress = bz2.decompress
+    else:
+        yield from _sequential_chunks(path, compression)
+        return
+
+    # Compressed segments are decompressed in parallel and returned in the order of the file. The number of segments
+    # pending is bounded to bound the memory used
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        for segment in segments:
+            pending.append(executor.submit(decompress, segment))
+            if len(pending) > thread_count:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def _sequential_chunks(path, compression):
+    """
+    Decompress a file by a single thread. Files with several gzip members or bzip2 streams are supported.
+    :param path: path of the file
+    :param compression: compression format ('gzip' or 'bz2')
+    :return: a generator of bytes
+    """
+    new_decompressor = (lambda: zlib.decompressobj(zlib.MAX_WBITS | 16)) if compression == 'gzip' \
+        else bz2.BZ2Decompressor
+    decompressor = new_decompressor()
+    started = False
+
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(decompression_chunk_size)
+            if not data:
+                break
+
+            while data:
+                started = True
+                yield decompressor.decompress(data)
+                if not decompressor.eof:
+                    break
+
+                # Start of the next member or stream
+                data = decompressor.unused_data
+                decompressor = new_decompressor()
+                started = False
+
+    if started:
+        raise EOFError('Compressed file ended before the end-of-stream marker was reached: ' + path)
+
+
+def _decompress_gzip_members(data):
+    """
+    Decompress a segment of complete gzip members.
+    :param data: compressed data
+    :return: the decompressed data
+    """
+    result = []
+    while data:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        result.append(decompressor.decompress(data))
+        if not decompressor.eof:
+            raise EOFError('Truncated gzip member')
+        data = decompressor.unused_data
+
+    return b''.join(result)
+
+
+def _is_bgzf_file(path):
+    """
+    Check if a gzip file is a BGZF file (blocked gzip written by bgzip, samtools...): the header of
+    the first member has an extra field with the size of the member.
+    :param path: path of the file
+    :return: True if the file is a BGZF file
+    """
+    with open(path, 'rb') as f:
+        header = f.read(18)
+
+    return len(header) == 18 and header[3] & 4 != 0 and header[12:14] == b'BC'
+
+
+def _bgzf_segments(path):
+    """
+    Split a BGZF file in segments of complete members, without decompression.
+    :param path: path of the file
+    :return: a generator of bytes
+    """
+    with open(path, 'rb') as f:
+        segment = bytearray()
+        while True:
+            header = f.read(18)
+            if len(header) == 0:
+                break
+            if len(header) < 18 or header[12:14] != b'BC':
+                # Not a BGZF member: the remaining data is decompressed at once
+                segment += header + f.read()
+                break
+
+            block_size = struct.unpack('<H', header[16:18])[0] + 1
+            segment += header + f.read(block_size - 18)
+            if len(segment) >= decompression_chunk_size:
+                yield bytes(segment)
+                segment = bytearray()
+
+        if segment:
+            yield bytes(segment)
+
+
+def _is_multi_stream_bz2_file(path):
+    """
+    Check if a bzip2 file contains several streams in its first chunks (e.g. files written by pbzip2).
+    :param path: path of the file
+    :return: True if the file contains several streams
+    """
+    with open(path, 'rb') as f:
+        data = f.read(2 * decompression_chunk_size)
+
+    return _bz2_stream_start.search(data, 1) is not None
+
+
+def _bz2_segments(path):
+    """
+    Split a bzip2 file in segments of complete streams, without decompression. Stream starts are searched
+    with the magic numbers of the stream header and of the first block.
+    :param path: path of the file
+    :return: a generator of bytes
+    """
+    with open(path, 'rb') as f:
+        buffer = bytearray()
+        scan_position = 1
+
+        while True:
+            data = f.read(decompression_chunk_size)
+            if not data:
+                if buffer:
+                    yield bytes(buffer)
+                return
+
+            buffer += data
+            last_start = None
+            for m in _bz2_stream_start.finditer(buffer, scan_position):
+                last_start = m.start()
+
+            # A magic number may be split between two reads, the last bytes are scanned again with the next read
+            scan_position = max(scan_position, len(buffer) - 9)
+
+            if last_start is not None and last_start >= decompression_chunk_size:
+                yield bytes(buffer[:last_start])
+                del buffer[:last_start]
+                scan_position -= last_start
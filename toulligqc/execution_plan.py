@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains the choice of the loading mode of the sequencing summary files under a memory budget. The
+# number of reads is estimated from the size of the files, their compression and the length of their first lines,
+# and the memory used to load the reads from the columns to load. The files are loaded in memory if they fit in the
+# budget, otherwise they are read by chunks, or processed out-of-core when the barcoding summaries must be joined.
+
+import os
+
+import numpy as np
+
+from toulligqc.decompression import open_decompressed
+from toulligqc.out_of_core import default_max_memory
+from toulligqc.out_of_core import parse_memory_size
+
+# Loading modes of the sequencing summary files
+in_memory_mode = 'in-memory'
+chunked_mode = 'chunked'
+out_of_core_mode = 'out-of-core'
+sharded_mode = 'sharded'
+
+# Part of the available memory used when no memory budget is set
+default_memory_ratio = 0.8
+
+# Ratio between the memory used by the in-memory mode and the size of the loaded columns
+in_memory_factor = 3
+
+# Memory used by a read id loaded as a Python string, in bytes
+read_id_memory = 100
+
+# Estimated ratio between the size of the decompressed and of the compressed summary files
+compression_ratios = {'gzip': 5, 'bz2': 7, 'zstd': 5}
+
+# Number of bytes read at the start of the files to estimate the length of the lines
+line_sample_size = 1024 * 1024
+
+# Files with the memory limit of the control groups (v2 and v1)
+_cgroup_memory_limit_files = ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+
+
+class ExecutionPlan:
+    """
+    Loading mode of the sequencing summary files and the estimations it is based on.
+    """
+
+    def __init__(self, mode, max_memory, estimated_read_count, estimated_memory):
+        """
+        Constructor.
+        :param mode: the loading mode
+        :param max_memory: the memory budget in bytes
+        :param estimated_read_count: estimated number of reads of the sequencing summary files
+        :param estimated_memory: estimated memory used to load the reads in memory, in bytes
+        """
+        self.mode = mode
+        self.max_memory = max_memory
+        self.estimated_read_count = estimated_read_count
+        self.estimated_memory = estimated_memory
+
+    def __repr__(self):
+        return 'ExecutionPlan({!r}, {!r}, {!r}, {!r})'.format(self.mode, self.max_memory, self.estimated_read_count,
+                                                             self.estimated_memory)
+
+
+def available_memory():
+    """
+    Get the memory available to the process: the physical memory or the memory limit of the control group of the
+    process if it is lower (e.g. for a job of a cluster scheduler or a container).
+    :return: the memory in bytes or None if it is unknown
+    """
+    limits = []
+    try:
+        limits.append(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'))
+    except (AttributeError, ValueError, OSError):
+        pass
+
+    for filename in _cgroup_memory_limit_files:
+        try:
+            with open(filename) as f:
+                limits.append(int(f.read().strip()))
+        except (OSError, ValueError):
+            # No limit is written 'max'
+            pass
+
+    limits = [limit for limit in limits if limit > 0]
+    return min(limits) if limits else None
+
+
+def memory_budget(max_memory=None):
+    """
+    Get the memory budget of the loading of the sequencing summary files.
+    :param max_memory: the memory size set by the user (e.g. 8G), optional
+    :return: the memory budget in bytes, a part of the available memory if no memory size is set
+    """
+    if max_memory:
+        return parse_memory_size(max_memory)
+
+    memory = available_memory()
+    if memory is None:
+        return parse_memory_size(default_max_memory)
+
+    return int(memory * default_memory_ratio)
+
+
+def estimate_read_count(info):
+    """
+    Estimate the number of reads of a summary file from its size and the length of its first lines.
+    :param info: the SummaryFileInfo object of the file
+    :return: the estimated number of reads
+    """
+    if info.compression is None:
+        with open(info.filename, 'rb') as f:
+            sample = f.read(line_sample_size)
+        size = info.size
+    else:
+        with open_decompressed(info.filename, info.compression) as f:
+            sample = f.read(line_sample_size)
+        size = info.size * compression_ratios.get(info.compression, 1)
+
+    header_size = sample.find(b'\n') + 1
+    line_count = sample.count(b'\n', header_size)
+    if len(sample) < line_sample_size:
+        # The whole file has been read
+        return line_count + (1 if len(sample) > header_size and not sample.endswith(b'\n') else 0)
+    if line_count == 0:
+        return 0
+
+    return int((size - header_size) / ((len(sample) - header_size) / line_count))
+
+
+def plan_execution(infos, columns, datatypes, max_memory, join=False, out_of_core=False, sharded=False):
+    """
+    Choose the loading mode of the sequencing summary files.
+    :param infos: list of the SummaryFileInfo objects of the sequencing summary files
+    :param columns: list of the canonical names of the columns to load
+    :param datatypes: dictionary of the types of the canonical columns
+    :param max_memory: the memory budget in bytes
+    :param join: True if the barcodes of barcoding summary files must be joined with the reads
+    :param out_of_core: True if the out-of-core mode has been requested
+    :param sharded: True if the files are processed by shards in worker processes
+    :return: an ExecutionPlan object
+    """
+    read_count = sum(estimate_read_count(info) for info in infos)
+
+    # Categorical columns are stored as 32 bits codes
+    read_memory = sum(4 if datatypes[c] == 'category' else np.dtype(datatypes[c]).itemsize for c in columns)
+    if join:
+        read_memory += read_id_memory
+    memory = read_count * read_memory * in_memory_factor
+
+    if sharded:
+        mode = sharded_mode
+    elif out_of_core:
+        mode = out_of_core_mode
+    elif memory <= max_memory:
+        mode = in_memory_mode
+    elif not join:
+        mode = chunked_mode
+    else:
+        mode = out_of_core_mode
+
+    return ExecutionPlan(mode, max_memory, read_count, memory)
@@ -25,13 +25,45 @@
 # Extraction of the information about the FAST5 files
 
 import glob
+import io
 import os
-import shutil
-import sys
 import tarfile
-import tempfile
-
-import h5py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from toulligqc.common import ToulligqcError
+from toulligqc.sequencing_summary_common import add_image_to_result
+from toulligqc.sequencing_summary_common import log_task
+from toulligqc.sequencing_summary_common import set_result_value
+
+# Per read columns extracted in deep scan mode and their types
+fast5_read_columns = {
+    'channel': np.int16,
+    'read_number': np.uint32,
+    'start_mux': np.uint8,
+    'start_time': np.float64,
+    'duration': np.float32,
+    'sampling_rate': np.float32,
+    'median_before': np.float32}
+
+# Keys of the sequencing telemetry extractor filled with the values of the tracking id of the raw data files
+tracking_id_keys = {
+    'flowcell.id': 'flow_cell_id',
+    'minknow.version': 'version',
+    'hostname': 'hostname',
+    'operating.system': 'operating_system',
+    'run.id': 'run_id',
+    'protocol.run.id': 'protocol_run_id',
+    'protocol.group.id': 'protocol_group_id',
+    'sample.id': 'sample_id',
+    'exp.start.time': 'exp_start_time',
+    'device.id': 'device_id',
+    'device.type': 'device_type',
+    'distribution.version': 'distribution_version',
+    'flow.cell.product.code': 'flow_cell_product_code'}
 
 
 class Fast5Extractor:
@@ -52,6 +84,13 @@ class Fast5Extractor:
         self.report_name = config_dictionary['report_name']
         self.fast5_file_extension = ''
         self.fast5_file = ''
+        self.h5py_file = None
+        self.deep_scan = config_dictionary.get('fast5_deep_scan', 'False').lower() == 'true'
+        self.thread_count = int(config_dictionary.get('threads', '1'))
+        self.quiet = config_dictionary.get('quiet', 'False').lower() == 'true'
+        self.images_directory = config_dictionary.get('images_directory', None)
+        self.fast5_files = []
+        self.dataframe_reads = None
         self.get_report_data_file_id()
 
     def check_conf(self):
@@ -63,6 +102,11 @@ class Fast5Extractor:
         if not os.path.exists(self.fast5_source):
             return False, 'The input file or directory for Fast5 file does not exists: ' + self.fast5_source
 
+        if self.deep_scan:
+            self.fast5_files = self._find_all_fast5_files()
+            if len(self.fast5_files) == 0:
+                return False, 'No Fast5 file found for deep scan in: ' + self.fast5_source
+
         if os.path.isdir(self.fast5_source):
             file_found = self._find_file_in_directory()
             if file_found is None:
@@ -85,14 +129,21 @@ class Fast5Extractor:
 
         return True, ""
 
-
-
-
     def init(self):
         """
-        Determination of the fast5 file extension
+        Scan all the FAST5 files in deep scan mode
         """
-        return
+        if not self.deep_scan:
+            return
+
+        start_time = time.time()
+        self.dataframe_reads = scan_fast5_files(self.fast5_files, self.thread_count)
+        log_task(self.quiet,
+                 'Scan {:,d} Fast5 files ({:,.2f} MB used)'.format(len(self.fast5_files),
+                                                                 self.dataframe_reads.memory_usage(deep=True).sum()
+                                                                 / 1024 / 1024),
+                 start_time,
+                 time.time())
 
     @staticmethod
     def get_name():
@@ -120,99 +171,112 @@ class Fast5Extractor:
         h5py_file = self._read_fast5()
         tracking_id_dict = self._get_fast5_items(h5py_file, 'tracking_id')
 
+        if self.deep_scan:
+            self._extract_reads_statistics(result_dict)
+
         if len(tracking_id_dict) == 0:
             return
 
-        prefix = 'sequencing.telemetry.extractor'
-        result_dict[prefix + '.source'] = self.fast5_source
-        _set_result_dict_value(result_dict, prefix + '.flowcell.id', tracking_id_dict, 'flow_cell_id')
-        _set_result_dict_value(result_dict, prefix + '.minknow.version', tracking_id_dict, 'version')
-        _set_result_dict_value(result_dict, prefix + '.hostname', tracking_id_dict, 'hostname')
-        _set_result_dict_value(result_dict, prefix + '.operating.system', tracking_id_dict, 'operating_system')
-        _set_result_dict_value(result_dict, prefix + '.run.id', tracking_id_dict, 'run_id')
-        _set_result_dict_value(result_dict, prefix + '.protocol.run.id', tracking_id_dict, 'protocol_run_id')
-        _set_result_dict_value(result_dict, prefix + '.protocol.group.id', tracking_id_dict, 'protocol_group_id')
-        _set_result_dict_value(result_dict, prefix + '.sample.id', tracking_id_dict, 'sample_id')
-        _set_result_dict_value(result_dict, prefix + '.exp.start.time', tracking_id_dict, 'exp_start_time')
-        _set_result_dict_value(result_dict, prefix + '.device.id', tracking_id_dict, 'device_id')
-        _set_result_dict_value(result_dict, prefix + '.device.type', tracking_id_dict, 'device_type')
-        _set_result_dict_value(result_dict, prefix + '.distribution.version', tracking_id_dict, 'distribution_version')
-        _set_result_dict_value(result_dict, prefix + '.flow.cell.product.code', tracking_id_dict,
-                               'flow_cell_product_code')
+        set_tracking_id_values(result_dict, self.fast5_source, tracking_id_dict)
+
+    def _extract_reads_statistics(self, result_dict):
+        """
+        Put statistics about the reads found in deep scan mode in the result_dict
+        :param result_dict: Dictionary which gathers all the extracted
+        information that will be reported in the report.data file
+        """
+        df = self.dataframe_reads
+
+        set_result_value(self, result_dict, 'file.count', len(self.fast5_files))
+        set_result_value(self, result_dict, 'read.count', len(df))
+
+        if len(df) == 0:
+            return
+
+        set_result_value(self, result_dict, 'channel.count', int(df['channel'].nunique()))
+        set_result_value(self, result_dict, 'sampling.rate', float(df['sampling_rate'].max()))
+        set_result_value(self, result_dict, 'run.time', float((df['start_time'] + df['duration']).max()))
+
+        for index, value in df['channel'].value_counts().describe().items():
+            set_result_value(self, result_dict, 'channel.occupancy.statistics.' + index, float(value))
+
+        for column, key in (('duration', 'read.duration'), ('median_before', 'median.before')):
+            for index, value in df[column].describe().drop('count').items():
+                set_result_value(self, result_dict, key + '.' + index, float(value))
 
     def graph_generation(self, result_dict):
         """
         Graph generation
-        :return: nothing
+        :return: images array containing the title and the path toward the images
         """
-        return []
+        images = []
+
+        if not self.deep_scan or self.dataframe_reads is None or len(self.dataframe_reads) == 0:
+            return images
+
+        from toulligqc import plotly_graph_generator as pgg
+
+        add_image_to_result(self.quiet, images, time.time(),
+                            pgg.raw_data_channel_occupancy(self.dataframe_reads['channel'].value_counts(),
+                                                           self.images_directory, 'Fast5'))
+        add_image_to_result(self.quiet, images, time.time(),
+                            pgg.raw_data_median_before_over_time(self.dataframe_reads, self.images_directory,
+                                                                 'Fast5'))
+        return images
 
     def clean(self, result_dict):
         """
-        Deleting the temporary fast5 file extracted from the tar archive if used
-        and removing dictionary entries that will not be kept in the report.data file
+        Closing the FAST5 file and removing dictionary entries that will not be kept in the report.data file
         :param result_dict: dictionary which gathers all the extracted
         information that will be reported in the report.data file
         :return:
         """
-        if self.temporary_directory:
-            shutil.rmtree(self.temporary_directory, ignore_errors=True)
+        if self.h5py_file is not None:
+            self.h5py_file.close()
+            self.h5py_file = None
 
-    def _fast5_tar_bz2_extraction(self, tar_bz2_file, output_directory):
-        """
-        Extraction of the FAST5 file stored in tar_bz2 format
-        :param tar_bz2_file: tar bz2 file containing the set of the raw FAST5 files
-        :param output_directory:dictionary which gathers all the extracted
-        information that will be reported in the report.data file
-        :return: a FAST5 file
-        """
-        tar_bz2 = tarfile.open(tar_bz2_file, 'r:bz2')
-        while True:
-            member = tar_bz2.next()
-            if member.name.endswith('.fast5'):
-                tar_bz2.extract(member, path=output_directory)
-                break
-        return output_directory + '/' + member.name
+        self.dataframe_reads = None
 
-    def _fast5_tar_gz_extraction(self, tar_gz_file, output_directory):
+    @staticmethod
+    def _fast5_tar_extraction(tar_file, compression):
         """
-        Extraction of a FAST5 file stored in tar_gz format
-        :param tar_gz_file: tar gz file containing the set of the raw FAST5 files
-        :param output_directory: dictionary which gathers all the extracted
-        information that will be reported in the report.data file
-        :return: a FAST5 file
+        Read the first FAST5 file stored in a tar archive. The archive is read as a stream, the FAST5 file
+        is loaded in memory and the archive is not read beyond this file
+        :param tar_file: tar file containing the set of the raw FAST5 files
+        :param compression: compression of the tar file (gz or bz2)
+        :return: a tuple with the name of the FAST5 file in the archive and its content
         """
-        tar_gz = tarfile.open(self, tar_gz_file, 'r:gz')
-        while True:
-            member = tar_gz.next()
-            if member.name.endswith('.fast5'):
-                tar_gz.extract(member, path=output_directory)
-                break
-        return output_directory + '/' + member.name
+        with tarfile.open(tar_file, 'r|' + compression) as tar:
+            for member in tar:
+                if member.isfile() and member.name.endswith('.fast5'):
+                    return member.name, tar.extractfile(member).read()
+
+        raise ToulligqcError('No Fast5 file found in archive: ' + tar_file)
 
     def _read_fast5(self):
         """
-        Extraction of one fast5 file from the archive and stores
+        Read one fast5 file, from the archive if required, and stores
         it in a h5py object for next retrieving information
         :return: h5py_file: h5py file
         """
-        self.temporary_directory = tempfile.mkdtemp()
-        if self.fast5_file_extension == 'tar.bz2':
-            tar_bz2_file = self.file_to_process
-            self.fast5_file = self._fast5_tar_bz2_extraction(tar_bz2_file, self.temporary_directory)
 
-        elif self.fast5_file_extension == 'tar.gz':
-            tar_gz_file = self.file_to_process
-            self.fast5_file = self._fast5_tar_gz_extraction(tar_gz_file, self.temporary_directory)
+        # h5py is only loaded when a Fast5 file is read
+        import h5py
+
+        if self.fast5_file_extension == 'tar.bz2' or self.fast5_file_extension == 'tar.gz':
+            name, data = self._fast5_tar_extraction(self.file_to_process, self.fast5_file_extension[4:])
+            self.fast5_file = self.file_to_process + '/' + name
+
+            # Open the content of the FAST5 file as an in-memory HDF5 file image
+            self.h5py_file = h5py.File(io.BytesIO(data), 'r')
 
         elif self.fast5_file_extension == 'fast5' or self.fast5_file_extension == '.fast5':
             self.fast5_file = self.file_to_process
+            self.h5py_file = h5py.File(self.fast5_file, 'r')
         else:
-            err_msg = 'There is a problem with the fast5 file or the tar file'
-            sys.exit(err_msg)
-        h5py_file = h5py.File(self.fast5_file)
+            raise ToulligqcError('There is a problem with the fast5 file or the tar file')
 
-        return h5py_file
+        return self.h5py_file
 
     def _get_fast5_items(self, h5py_file, group):
         """
@@ -245,10 +309,89 @@ class Fast5Extractor:
 
         return None
 
+    def _find_all_fast5_files(self):
+        """
+        Find all the FAST5 files of the source (file or directory, subdirectories included).
+        :return: a sorted list with the paths of the FAST5 files
+        """
+
+        if not os.path.isdir(self.fast5_source):
+            return [self.fast5_source] if self.fast5_source.endswith('.fast5') else []
+
+        result = []
+        for root, dirs, files in os.walk(self.fast5_source):
+            for f in files:
+                if f.endswith('.fast5'):
+                    result.append(os.path.join(root, f))
+
+        return sorted(result)
+
+
+def scan_fast5_files(paths, thread_count=1):
+    """
+    Read the metadata of all the reads of a list of single or multi-read FAST5 files.
+    Files are read in parallel, each thread having its own file handle.
+    :param paths: list of the paths of the FAST5 files
+    :param thread_count: number of threads to use
+    :return: a Pandas Dataframe with one row per read and the columns of fast5_read_columns
+    """
+
+    with ThreadPoolExecutor(max_workers=max(1, thread_count)) as executor:
+        tables = list(executor.map(_scan_fast5_file, paths))
+
+    return pd.DataFrame({column: np.concatenate([t[column] for t in tables]).astype(dtype, copy=False)
+                         if len(tables) > 0 else np.empty(0, dtype=dtype)
+                         for column, dtype in fast5_read_columns.items()})
+
+
+def _scan_fast5_file(path):
+    """
+    Read the metadata of all the reads of a FAST5 file.
+    Start time and duration are converted from samples to seconds.
+    :param path: path of the FAST5 file
+    :return: a dictionary of ndarrays with the columns of fast5_read_columns
+    """
+    import h5py
+
+    values = {column: [] for column in fast5_read_columns}
+
+    with h5py.File(path, 'r') as f:
+
+        if 'Raw/Reads' in f:
+            # Single read FAST5 file
+            groups = [(f['Raw/Reads/' + k], f['UniqueGlobalKey/channel_id']) for k in f['Raw/Reads']]
+        else:
+            # Multi-read FAST5 file
+            groups = [(f[k + '/Raw'], f[k + '/channel_id']) for k in f if k.startswith('read_')]
+
+        for raw, channel in groups:
+            raw_attrs = raw.attrs
+            channel_attrs = channel.attrs
+            sampling_rate = float(channel_attrs['sampling_rate'])
+
+            values['channel'].append(int(channel_attrs['channel_number']))
+            values['read_number'].append(raw_attrs['read_number'])
+            values['start_mux'].append(raw_attrs.get('start_mux', 0))
+            values['start_time'].append(raw_attrs['start_time'] / sampling_rate)
+            values['duration'].append(raw_attrs['duration'] / sampling_rate)
+            values['sampling_rate'].append(sampling_rate)
+            values['median_before'].append(raw_attrs.get('median_before', np.nan))
+
+    return {column: np.array(v, dtype=fast5_read_columns[column]) for column, v in values.items()}
+
+
+def set_tracking_id_values(result_dict, source, tracking_id_dict):
+    """
+    Put the run information of the tracking id of a raw data file (FAST5 or POD5) in the result_dict,
+    using the keys of the sequencing telemetry extractor.
+    :param result_dict: Dictionary which gathers all the extracted
+    information that will be reported in the report.data file
+    :param source: source of the raw data
+    :param tracking_id_dict: a dictionary with the tracking id values
+    """
 
-def _set_result_dict_value(result_dict, key, tracking_id_dict, dict_key):
-    value = ''
-    if dict_key in tracking_id_dict:
-        value = tracking_id_dict[dict_key]
+    prefix = 'sequencing.telemetry.extractor.'
+    result_dict[prefix + 'source'] = source
 
-    result_dict[key] = value
+    for key, dict_key in tracking_id_keys.items():
+        result_dict[prefix + key] = tracking_id_dict.get(dict_key, '')
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# For more information on the ToulligQC project and its aims,
+# visit the home page at:
+#
+#      https://github.com/GenomicParisCentre/toulligQC
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# Extraction of statistics from FASTQ files, when no sequencing summary file is available
+
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from toulligqc.decompression import detect_compression
+from toulligqc.decompression import open_decompressed
+from toulligqc.out_of_core import PartialResults
+from toulligqc.out_of_core import out_of_core_sample_size
+from toulligqc.sequencing_summary_common import default_min_pass_qscore
+from toulligqc.sequencing_summary_common import log_task
+from toulligqc.sequencing_summary_extractor import SequencingSummaryExtractor as SSE
+
+# Size of the blocks of data read from the FASTQ files
+fastq_block_size = 4 * 1024 * 1024
+
+# Extensions of the FASTQ files searched in directories
+fastq_extensions = ('.fastq', '.fq', '.fastq.gz', '.fq.gz', '.fastq.bz2', '.fq.bz2', '.fastq.zst', '.fq.zst')
+
+# Tags of the headers of the reads written by the basecaller. The leading space only matches headers,
+# as space is not a valid quality character
+_channel_tag = re.compile(rb' ch=(\d+)')
+_start_time_tag = re.compile(rb' start_time=(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?)')
+_barcode_tag = re.compile(rb' barcode=(\S+)')
+
+# Error probability of each Phred+33 quality character. Newline characters are not quality characters
+# and have a null value
+_error_probabilities = np.concatenate((np.zeros(33), 10.0 ** (-np.arange(256 - 33) / 10.0)))
+
+
+class FastqExtractor(SSE):
+    """
+    Extraction of statistics from FASTQ files. FASTQ files are read by blocks and the read length
+    and the mean Phred score of the reads are computed by vectorized operations on each block.
+    The channel, start time and barcode of the reads are parsed from the header tags when present.
+    The extractor fills the same keys and generates the same graphs as the sequencing summary extractor,
+    except the graphs that require missing values (e.g. the speed graph without the duration of the reads).
+    This class is also the base class of the extractors of other per read files (e.g. BAM).
+    """
+
+    # Configuration key of the source and extensions of the files searched in the source directories
+    source_key = 'fastq_source'
+    file_extensions = fastq_extensions
+
+    def _init_sources(self, config_dictionary):
+        """
+        Set the files of the extractor. The availability of the channel, the start time and the duration of the
+        reads is only known once the files are read.
+        :param config_dictionary: dictionary containing the files or directories paths
+        """
+        self.sources = config_dictionary[self.source_key].split('\t')
+        self.is_barcode = config_dictionary['barcoding'] == 'True'
+        self.files = []
+        self.has_channel = False
+        self.has_start_time = False
+        self.has_duration = False
+
+    def check_conf(self):
+        """
+        Check if the source contains files to read
+        :return: boolean and a string for error message
+        """
+
+        for source in self.sources:
+            if not os.path.exists(source):
+                return False, "No such file or directory " + source
+            self.files.extend(find_files(source, self.file_extensions))
+
+        if len(self.files) == 0:
+            return False, "No {} file has been found".format(self.get_name())
+
+        return True, ""
+
+    def init(self):
+        """
+        Computation of the statistics of the reads of the files, batch by batch. Only a uniform sample of the reads
+        is kept in memory for the graphs
+        """
+
+        start_time = time.time()
+
+        if self.is_barcode:
+            self.barcode_selection = self.config_dictionary['barcode_selection']
+
+        self.partial_results = self._load_read_data()
+        self.dataframe_1d = self.partial_results.sample_dataframe()
+        if self.dataframe_1d.empty:
+            raise pd.errors.EmptyDataError("No read found in {} files".format(self.get_name()))
+
+        # Add missing categories
+        if 'barcode_arrangement' in self.dataframe_1d.columns:
+            self.dataframe_1d['barcode_arrangement'].cat.add_categories([0, 'other barcodes', 'passes_filtering'],
+                                                                        inplace=True)
+
+        # Dictionary for storing all pd.Series and pd.Dataframe entries
+        self.dataframe_dict = {}
+
+        log_task(self.quiet,
+                 'Read {:,d} {} files ({:,d} reads, {:,.2f} MB used by the sample)'.format(
+                     len(self.files), self.get_name(), self.partial_results.read_statistics.length.count(),
+                     self.dataframe_1d.memory_usage(deep=True).sum() / 1024 / 1024),
+                 start_time,
+                 time.time())
+
+    @staticmethod
+    def get_name() -> str:
+        """
+        Get the name of the extractor.
+        :return: the name of the extractor
+        """
+        return 'FASTQ'
+
+    def _occupancy_channel(self):
+        """
+        Statistics about the channels of the flowcell
+        :return: dictionary containing statistics about the number of reads of the channels
+        """
+        # Reads without channel tag in their header are counted in the channel 0
+        return self._read_count_statistics(self.partial_results.channel_read_counts[1:].sum(axis=1))
+
+    def _channel_read_count_dataframe(self):
+        """
+        Get the number of pass and fail reads of the channels for the channel occupancy graph.
+        :return: a Pandas Dataframe with the channel, passes_filtering and read_count columns
+        """
+        dataframe = self.partial_results.channel_read_count_dataframe()
+        return dataframe[dataframe['channel'] > 0]
+
+    def _channel_activity_over_time(self):
+        """
+        Get the reads with a channel tag in their header aggregated by channel and time bin.
+        :return: a ChannelActivity object
+        """
+        return self.channel_activity
+
+    def _read_batches(self):
+        """
+        Read the statistics of the reads of the FASTQ files by blocks. Read pass/fail status is deduced from the
+        path of the files (fastq_pass and fastq_fail directories) or else from the mean Phred score of the reads.
+        :return: a generator of dictionaries of ndarrays with the channel (-1 if unknown), start_time (datetime64,
+        NaT if unknown), passes_filtering, sequence_length, mean_qscore, barcode_arrangement ('' if unknown) and
+        optionally duration (NaN if unknown) of the reads
+        """
+
+        for path in self.files:
+            status = _pass_status_from_path(path)
+
+            for block, newlines in read_fastq_blocks(path, thread_count=self.thread_count):
+                batch = parse_fastq_block(block, newlines)
+                batch['barcode_arrangement'] = batch.pop('barcode')
+                if status is None:
+                    batch['passes_filtering'] = batch['mean_qscore'] >= default_min_pass_qscore
+                else:
+                    batch['passes_filtering'] = np.full(len(batch['mean_qscore']), status)
+                yield batch
+
+    def _run_start_time(self):
+        """
+        Get the start time of the run, used as origin of the start times of the reads.
+        :return: a datetime64 or None if unknown
+        """
+        return None
+
+    def _load_read_data(self):
+        """
+        Compute the statistics of the reads of the files batch by batch, like the chunked loading of the sequencing
+        summary files. The reads with a channel tag are also aggregated by channel and time bin.
+        :return: a PartialResults object
+        """
+
+        partial_results = PartialResults(self.barcode_selection if self.is_barcode else None,
+                                         out_of_core_sample_size, with_channel_activity=False)
+        self.channel_activity = None
+        self.run_start_time = self._run_start_time()
+
+        for batch in self._read_batches():
+            dataframe = self._create_dataframe(batch)
+            partial_results.update(dataframe)
+
+            reads = dataframe[dataframe['channel'] > 0]
+            if len(reads) == 0:
+                continue
+            if 'duration' not in batch or np.isnan(batch['duration']).all():
+                reads = reads.drop(columns=['duration'])
+            channel_activity = self._channel_activity(reads)
+            if self.channel_activity is None:
+                self.channel_activity = channel_activity
+            else:
+                self.channel_activity.merge(channel_activity)
+
+        return partial_results
+
+    def _create_dataframe(self, batch):
+        """
+        Create the dataframe of a batch of reads.
+        :param batch: a dictionary of ndarrays with the channel (-1 if unknown), start_time (datetime64, NaT if
+        unknown), passes_filtering, sequence_length, mean_qscore, barcode_arrangement ('' if unknown) and optionally
+        duration (NaN if unknown) of the reads
+        :return: a Pandas Dataframe object
+        """
+
+        channel = batch['channel']
+        start_time = batch['start_time']
+        duration = batch['duration'].astype(np.float32) if 'duration' in batch \
+            else np.full(len(channel), np.nan, dtype=np.float32)
+        has_start_time = not np.isnat(start_time).all()
+        self.has_channel = self.has_channel or bool((channel >= 0).any())
+        self.has_start_time = self.has_start_time or has_start_time
+        self.has_duration = self.has_duration or not np.isnan(duration).all()
+
+        # Start times are converted in seconds since the start of the run or else since the first read of the
+        # first batch with start times. Reads written before are set to 0
+        if self.run_start_time is None and has_start_time:
+            self.run_start_time = start_time[~np.isnat(start_time)].min()
+        start_time = np.maximum((start_time - self.run_start_time) / np.timedelta64(1, 's'), 0) \
+            if has_start_time else np.zeros(len(start_time))
+
+        df = pd.DataFrame({'channel': np.maximum(channel, 0).astype(np.int16),
+                           'start_time': start_time,
+                           'passes_filtering': batch['passes_filtering'],
+                           'sequence_length': batch['sequence_length'].astype(np.uint32),
+                           'mean_qscore': batch['mean_qscore'].astype(np.float32),
+                           'duration': duration})
+
+        if self.is_barcode:
+            barcodes = batch['barcode_arrangement']
+            df['barcode_arrangement'] = pd.Categorical(np.where(barcodes == '', 'unclassified', barcodes))
+
+        # Reads without start time or quality are set to 0 like in the sequencing summary extractor
+        return df.fillna(0)
+
+
+def read_fastq_blocks(path, block_size=fastq_block_size, thread_count=1):
+    """
+    Read a FASTQ file (optionally compressed with gzip, bgzip, bzip2 or zstd) by blocks of complete records.
+    Records must be written on 4 lines.
+    :param path: path of the FASTQ file
+    :param block_size: size of the data to read at once
+    :param thread_count: number of threads to use for the decompression
+    :return: a generator of tuples with a block of records (bytes) and the positions of its newline characters
+    """
+
+    with _open_fastq(path, thread_count) as f:
+        remainder = b''
+
+        while True:
+            data = f.read(block_size)
+            if not data:
+                break
+
+            block = remainder + data
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+            line_count = len(newlines) // 4 * 4
+            if line_count == 0:
+                remainder = block
+                continue
+
+            end = newlines[line_count - 1] + 1
+            yield block[:end], newlines[:line_count]
+            remainder = block[end:]
+
+        # Last record without final newline
+        if remainder.strip():
+            block = remainder.rstrip(b'\r\n') + b'\n'
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+            if len(newlines) % 4 != 0:
+                raise ValueError('Truncated FASTQ file: ' + path)
+            yield block, newlines
+
+
+def parse_fastq_block(block, newlines):
+    """
+    Compute the statistics of the reads of a block of FASTQ records. The mean Phred score of a read is computed
+    in the error probability space, like the basecaller does.
+    :param block: a block of complete FASTQ records (bytes)
+    :param newlines: positions of the newline characters of the block
+    :return: a dictionary of ndarrays with the sequence_length, mean_qscore, channel (-1 if unknown),
+    start_time (NaT if unknown) and barcode ('' if unknown) of the reads
+    """
+
+    buffer = np.frombuffer(block, dtype=np.uint8)
+    starts = np.concatenate(([0], newlines[:-1] + 1))
+    ends = newlines.copy()
+
+    # Handle Windows line endings
+    ends[(ends > starts) & (buffer[np.maximum(ends - 1, 0)] == 13)] -= 1
+
+    if not (buffer[starts[0::4]] == ord('@')).all() or not (buffer[starts[2::4]] == ord('+')).all():
+        raise ValueError('Invalid FASTQ record, records must be written on 4 lines')
+
+    quality_starts = starts[3::4]
+    quality_ends = ends[3::4]
+    lengths = quality_ends - quality_starts
+
+    # Sum of the error probabilities of each read. The block is split in segments starting at the header and at
+    # the quality line of each record. The quality segments only contain quality characters and newline characters
+    segments = np.empty(2 * len(quality_starts), dtype=np.int64)
+    segments[0::2] = starts[0::4]
+    segments[1::2] = quality_starts
+    error_sums = np.add.reduceat(_error_probabilities[buffer], segments)[1::2]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_qscores = -10.0 * np.log10(error_sums / lengths)
+
+    headers = (starts[0::4], ends[0::4])
+
+    return {'sequence_length': lengths,
+            'mean_qscore': mean_qscores,
+            'channel': _parse_tag(block, headers, _channel_tag, b'-1').astype(np.int32),
+            'start_time': _parse_tag(block, headers, _start_time_tag, b'NaT').astype('U').astype('datetime64[ms]'),
+            'barcode': _parse_tag(block, headers, _barcode_tag, b'').astype('U')}
+
+
+def _parse_tag(block, headers, tag, missing_value):
+    """
+    Get the value of a tag for all the reads of a block.
+    :param block: a block of complete FASTQ records (bytes)
+    :param headers: a tuple with the start and end positions of the header lines
+    :param tag: compiled regular expression of the tag
+    :param missing_value: value to use for the reads without the tag
+    :return: a ndarray of bytes with the value of the tag for each read
+    """
+
+    # Fast path: all the headers contain the tag
+    values = tag.findall(block)
+    if len(values) != len(headers[0]):
+        values = []
+        for start, end in zip(*headers):
+            match = tag.search(block, start, end)
+            values.append(match.group(1) if match else missing_value)
+
+    return np.array(values, dtype=bytes) if len(values) > 0 else np.array([], dtype='S1')
+
+
+def _open_fastq(path, thread_count=1):
+    """
+    Open a FASTQ file in binary mode. The compression of the file is detected from its first bytes and compressed
+    files are decompressed by background threads.
+    :param path: path of the FASTQ file
+    :param thread_count: number of threads to use for the decompression
+    :return: a file object
+    """
+    with open(path, 'rb') as f:
+        compression = detect_compression(f.read(4))
+
+    if compression is None:
+        return open(path, 'rb')
+
+    return open_decompressed(path, compression, thread_count)
+
+
+def _pass_status_from_path(path):
+    """
+    Get the pass/fail status of the reads of a file from the directories of its path (fastq_pass or fastq_fail
+    directories created by MinKNOW).
+    :param path: path of the FASTQ file
+    :return: True for pass reads, False for fail reads and None if the status is unknown
+    """
+    directories = os.path.dirname(os.path.abspath(path)).split(os.sep)
+
+    for directory in reversed(directories):
+        if directory in ('fastq_pass', 'pass'):
+            return True
+        if directory in ('fastq_fail', 'fail'):
+            return False
+
+    return None
+
+
+def find_files(source, extensions):
+    """
+    Find all the files of the source (file or directory, subdirectories included).
+    :param source: a file or a directory
+    :param extensions: a tuple with the extensions of the files to search in directories
+    :return: a sorted list with the paths of the files
+    """
+
+    if not os.path.isdir(source):
+        return [source]
+
+    result = []
+    for root, dirs, files in os.walk(source):
+        for f in files:
+            if f.endswith(extensions):
+                result.append(os.path.join(root, f))
+
+    return sorted(result)
@@ -35,6 +35,9 @@ from toulligqc.plotly_graph_common import graph_font
 from toulligqc.plotly_graph_common import help_html_link
 from toulligqc.plotly_graph_common import title_size
 
+# Report data ids of the extractors providing the statistics of the run, in order of preference
+run_statistics_extractor_ids = ('basecaller.sequencing.summary.1d.extractor', 'fast5.extractor', 'pod5.extractor')
+
 
 def html_report(config_dictionary, result_dict, graphs):
     """
@@ -153,14 +156,21 @@ def _modules_report(graphs, result_dict, run_id, report_name, run_date, toulligq
 def _basic_statistics_module_report(result_dict, sample_id, report_name, run_date, toulligqc_version):
     minknow_version = _get_result_value(result_dict, 'sequencing.telemetry.extractor.minknow.version', "Unknown")
 
-    seconds = result_dict["basecaller.sequencing.summary.1d.extractor.run.time"]
+    # The run statistics come from the raw data files when no basecalled read has been provided
+    extractor_id = _run_statistics_extractor_id(result_dict)
+
+    seconds = result_dict.get(extractor_id + ".run.time", 0)
 
     run_time = '%dh%02dm%02ds' % (seconds // 3600, (seconds % 3600) // 60, seconds % 60)
 
-    read_count = result_dict["basecaller.sequencing.summary.1d.extractor.read.count"]
-    run_yield = _format_int_with_prefix(result_dict["basecaller.sequencing.summary.1d.extractor.yield"])
-    n50 = result_dict["basecaller.sequencing.summary.1d.extractor.n50"]
-    l50 = result_dict["basecaller.sequencing.summary.1d.extractor.l50"]
+    read_count = _format_int(result_dict[extractor_id + ".read.count"])
+    run_yield = "Unknown"
+    n50 = "Unknown"
+    l50 = "Unknown"
+    if extractor_id + ".yield" in result_dict:
+        run_yield = _format_int_with_prefix(result_dict[extractor_id + ".yield"])
+        n50 = _format_int(int(result_dict[extractor_id + ".n50"]))
+        l50 = _format_int(int(result_dict[extractor_id + ".l50"]))
 
     # from telemetry file
     flow_cell_id = _get_result_value(result_dict, 'sequencing.telemetry.extractor.flowcell.id', "Unknown")
@@ -227,9 +237,9 @@ def _basic_statistics_module_report(result_dict, sample_id, report_name, run_dat
                sequencing_kit_version=sequencing_kit_version,
                barcode_kits_version=barcode_kits_version,
                run_yield=run_yield,
-               read_count=_format_int(read_count),
-               n50=_format_int(int(n50)),
-               l50=_format_int(int(l50)))
+               read_count=read_count,
+               n50=n50,
+               l50=l50)
 
     result += """
       <div class="module" id="software_info">
@@ -348,6 +358,20 @@ def _embedded_image(image_path, resource=False, remove=False):
     return result
 
 
+def _run_statistics_extractor_id(result_dict):
+    """
+    Get the extractor providing the statistics of the run: the extractor of the basecalled reads or, when there is
+    no basecalled read, the extractor of the raw data files.
+    :param result_dict: result dictionary
+    :return: the report.data id of the extractor
+    """
+    for extractor_id in run_statistics_extractor_ids:
+        if extractor_id + ".read.count" in result_dict:
+            return extractor_id
+
+    return run_statistics_extractor_ids[0]
+
+
 def _get_result_value(result_dict, key, default_value="", value_type='str'):
     """
     Get the value of the result dictionary or a default value if the key does not exists.
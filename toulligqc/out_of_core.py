@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains the tools of the out-of-core processing of the sequencing summaries that do not fit in memory.
+# The reads are read by chunks and written in temporary spill files, one file for each partition of the reads (by
+# channel, or by read id when the barcoding summaries must be joined with the sequencing summaries). The partitions
+# are then loaded by groups that fit under a memory ceiling and the results computed on each group (statistics,
+# channel activity, sample of the reads for the graphs) are merged.
+
+import copy
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from toulligqc.barcode_activity import BarcodeActivity
+from toulligqc.channel_activity import ChannelActivity
+from toulligqc.partition_statistics import ReadStatistics
+from toulligqc.partition_statistics import barcode_codes
+from toulligqc.sampling import ReservoirSampler
+from toulligqc.time_windows import TimeWindowStatistics
+
+# Memory budget used when the memory available to the process is unknown
+default_max_memory = '4G'
+
+# Number of partitions of the spilled reads
+out_of_core_partition_count = 64
+
+# Maximal number of lines of the summary files read at once
+out_of_core_chunk_size = 1000 * 1000
+
+# Memory allowed for each line of a chunk while the chunk is parsed, in bytes
+out_of_core_line_memory = 1024
+
+# Ratio between the memory used to process a group of partitions and the size of the partitions on disk
+out_of_core_memory_factor = 4
+
+# Number of reads kept in memory for the graphs
+out_of_core_sample_size = 1000 * 1000
+
+# Keys of the two hashes of the read ids
+_read_id_hash_keys = ('toulligqc-hash-1', 'toulligqc-hash-2')
+
+_memory_units = {'': 1024 ** 2, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_memory_size(value):
+    """
+    Parse a memory size like 512M or 8G. Units are powers of 1024, the size is in megabytes if there is no unit.
+    :param value: the memory size as a string
+    :return: the memory size in bytes
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d*)?)\s*([KMGT]?)B?\s*', str(value), re.IGNORECASE)
+    if match is None or float(match.group(1)) == 0:
+        raise ValueError('Invalid memory size: ' + str(value))
+
+    return int(float(match.group(1)) * _memory_units[match.group(2).upper()])
+
+
+def chunk_line_count(max_memory):
+    """
+    Get the number of lines of the summary files to read at once under a memory ceiling.
+    :param max_memory: memory ceiling in bytes
+    :return: a number of lines
+    """
+    return int(max(1000, min(out_of_core_chunk_size, max_memory // out_of_core_line_memory)))
+
+
+def read_id_hashes(read_ids):
+    """
+    Hash read ids on 128 bits. The spilled reads are joined on the hashes of their read ids instead of the read ids.
+    :param read_ids: a Pandas Series with the read ids
+    :return: a tuple with two arrays of 64 bits hashes
+    """
+    values = np.asarray(read_ids, dtype=object)
+    return tuple(pd.util.hash_array(values, hash_key=key, categorize=False) for key in _read_id_hash_keys)
+
+
+def partition_groups(sizes, max_memory):
+    """
+    Group consecutive partitions so that the memory used to process each group stays under a memory ceiling.
+    A partition larger than the ceiling is processed alone and empty partitions are skipped.
+    :param sizes: sizes of the partitions on disk in bytes
+    :param max_memory: memory ceiling in bytes
+    :return: a list of lists of partitions
+    """
+    groups = []
+    group = []
+    group_size = 0
+    for partition, size in enumerate(sizes):
+        if size == 0:
+            continue
+        if group and (group_size + size) * out_of_core_memory_factor > max_memory:
+            groups.append(group)
+            group = []
+            group_size = 0
+        group.append(partition)
+        group_size += size
+
+    if group:
+        groups.append(group)
+
+    return groups
+
+
+class SpillFiles:
+    """
+    Records of reads written in temporary files, with a file for each partition of the reads.
+    """
+
+    def __init__(self, directory, name, dtype, partition_count=out_of_core_partition_count):
+        """
+        Constructor.
+        :param directory: directory of the spill files
+        :param name: prefix of the name of the spill files
+        :param dtype: numpy structured type of the records
+        :param partition_count: number of partitions
+        """
+        self.dtype = np.dtype(dtype)
+        self.partition_count = partition_count
+        self.filenames = [os.path.join(directory, '{}.{}.bin'.format(name, i)) for i in range(partition_count)]
+        self.record_counts = np.zeros(partition_count, dtype=np.int64)
+        self._files = [open(f, 'wb') for f in self.filenames]
+
+    def append(self, records, partitions):
+        """
+        Write records at the end of the files of their partitions.
+        :param records: a structured array of records
+        :param partitions: an array with the partition of each record
+        """
+        order = np.argsort(partitions, kind='stable')
+        bounds = np.searchsorted(partitions[order], np.arange(self.partition_count + 1))
+        for partition, f in enumerate(self._files):
+            if bounds[partition + 1] > bounds[partition]:
+                records[order[bounds[partition]:bounds[partition + 1]]].tofile(f)
+
+        self.record_counts += np.diff(bounds)
+
+    def close(self):
+        """
+        Close the spill files once all the records have been written. Closed spill files can be sent to other
+        processes to read their records.
+        """
+        for f in self._files:
+            f.close()
+        self._files = []
+
+    def read(self, partitions):
+        """
+        Read the records of partitions.
+        :param partitions: list of partitions
+        :return: a structured array of records
+        """
+        return np.concatenate([np.fromfile(self.filenames[p], dtype=self.dtype) for p in partitions])
+
+    def sizes(self):
+        """
+        Get the size of the partitions.
+        :return: an array with the size of each partition in bytes
+        """
+        return self.record_counts * self.dtype.itemsize
+
+
+class PartialResults:
+    """
+    Results of the sequencing summary extractor computed on a part of the reads and that can be merged: statistics
+    of the length and of the qscore of the reads, number of pass and fail reads of each channel, duration of the run,
+    metrics of the time windows of the run, activity of the channels, reads and yield of each barcode over time and
+    optionally a uniform sample of the reads.
+    """
+
+    def __init__(self, barcode_selection=None, sample_size=0, with_channel_activity=True):
+        """
+        Constructor.
+        :param barcode_selection: list of the selected barcodes, optional
+        :param sample_size: number of reads to sample, no sample is kept if 0
+        :param with_channel_activity: True to compute the activity of the channels
+        """
+        self.read_statistics = ReadStatistics(barcode_selection)
+        self.channel_read_counts = np.zeros((0, 2), dtype=np.int64)
+        self.run_time = None
+        self.time_windows = TimeWindowStatistics()
+        self.channel_activity = None
+        self.barcode_activity = BarcodeActivity(self.read_statistics.barcodes) if barcode_selection else None
+        self.sample = None
+        self.categories = {}
+        self._sample_size = sample_size
+        self._with_channel_activity = with_channel_activity
+
+    def update(self, dataframe):
+        """
+        Add a chunk of reads.
+        :param dataframe: a dataframe with the columns of the sequencing summary
+        """
+        if len(dataframe) == 0:
+            return
+
+        # The barcode groups of the reads are computed once for the statistics and the activity of the barcodes
+        barcodes = None
+        if self.barcode_activity is not None:
+            barcodes = barcode_codes(dataframe['barcode_arrangement'], self.read_statistics.barcodes)
+            self.barcode_activity.update(barcodes, dataframe['start_time'].values, dataframe['sequence_length'].values)
+
+        self.read_statistics.update(dataframe, barcodes)
+
+        # Number of fail reads and of pass reads of each channel
+        channels = dataframe['channel'].values.astype(np.int64)
+        cells = channels * 2 + dataframe['passes_filtering'].values
+        self.channel_read_counts = _add_padded(self.channel_read_counts,
+                                               np.bincount(cells, minlength=2 * (channels.max() + 1)).reshape(-1, 2))
+
+        run_time = float(dataframe['start_time'].max())
+        self.run_time = run_time if self.run_time is None else max(self.run_time, run_time)
+
+        self.time_windows.update(dataframe)
+
+        if self._with_channel_activity:
+            channel_activity = ChannelActivity.from_dataframe(dataframe)
+            if self.channel_activity is None:
+                self.channel_activity = channel_activity
+            else:
+                self.channel_activity.merge(channel_activity)
+
+        if self._sample_size > 0:
+            records = _dataframe_records(dataframe, self.categories)
+            if self.sample is None:
+                self.sample = ReservoirSampler(self._sample_size, records.dtype)
+            self.sample.update(records)
+
+    def merge(self, other):
+        """
+        Merge the results of another chunk of reads.
+        :param other: the other PartialResults object, with the same barcode selection and sample size
+        """
+        self.read_statistics.merge(other.read_statistics)
+        self.channel_read_counts = _add_padded(self.channel_read_counts, other.channel_read_counts)
+
+        if other.run_time is not None:
+            self.run_time = other.run_time if self.run_time is None else max(self.run_time, other.run_time)
+
+        self.time_windows.merge(other.time_windows)
+
+        if self.barcode_activity is not None:
+            self.barcode_activity.merge(other.barcode_activity)
+
+        if self.channel_activity is None:
+            self.channel_activity = other.channel_activity
+        elif other.channel_activity is not None:
+            self.channel_activity.merge(other.channel_activity)
+
+        if other.sample is not None:
+            # The codes of the categories of the other sample are converted in the codes of this sample
+            sample = copy.deepcopy(other.sample)
+            for name, categories in other.categories.items():
+                lookup = _category_lookup(self.categories.setdefault(name, {}), categories)
+                sample.apply(lambda records: _replace_field(records, name, lookup[records[name]]))
+
+            if self.sample is None:
+                self.sample = sample
+            else:
+                self.sample.merge(sample)
+
+    def channel_read_count_dataframe(self):
+        """
+        Get the number of pass and fail reads of the channels with reads.
+        :return: a Pandas Dataframe with the channel, passes_filtering and read_count columns
+        """
+        channels, statuses = np.nonzero(self.channel_read_counts)
+        return pd.DataFrame({'channel': channels,
+                             'passes_filtering': statuses.astype(bool),
+                             'read_count': self.channel_read_counts[channels, statuses]})
+
+    def sample_dataframe(self):
+        """
+        Get the sampled reads.
+        :return: a Pandas Dataframe object
+        """
+        if self.sample is None:
+            return pd.DataFrame()
+
+        records = self.sample.sample()
+        columns = {}
+        for name in records.dtype.names:
+            if name in self.categories:
+                columns[name] = pd.Categorical.from_codes(records[name], categories=list(self.categories[name]))
+            else:
+                columns[name] = records[name]
+
+        return pd.DataFrame(columns)
+
+
+def _add_padded(a, b):
+    """
+    Add two 2D arrays with the same number of columns, the shortest array is padded with zeros.
+    :param a: a 2D array
+    :param b: a 2D array
+    :return: a 2D array
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    result = a.copy()
+    result[:len(b)] += b
+    return result
+
+
+def _category_lookup(codes, categories):
+    """
+    Get the lookup table of the codes of categories, new categories are added to the codes.
+    :param codes: a dictionary with the code of each category, updated with the new categories
+    :param categories: list of categories
+    :return: an array with the code of each category, and -1 as last element for the missing values
+    """
+    return np.array([codes.setdefault(c, len(codes)) for c in categories] + [-1], dtype=np.int32)
+
+
+def _replace_field(records, name, values):
+    """
+    Replace the values of a field of records.
+    :param records: a structured array
+    :param name: the name of the field
+    :param values: the new values of the field
+    :return: the structured array
+    """
+    records[name] = values
+    return records
+
+
+def _dataframe_records(dataframe, categories):
+    """
+    Convert a dataframe in a structured array, categorical columns are stored as codes.
+    :param dataframe: a Pandas Dataframe object
+    :param categories: a dictionary with the codes of the categories of each categorical column, updated with the
+    new categories
+    :return: a structured array
+    """
+    arrays = {}
+    for name in dataframe.columns:
+        column = dataframe[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            lookup = _category_lookup(categories.setdefault(name, {}), column.cat.categories)
+            arrays[name] = lookup[column.cat.codes.values]
+        else:
+            arrays[name] = column.values
+
+    records = np.empty(len(dataframe), dtype=[(name, a.dtype) for name, a in arrays.items()])
+    for name, a in arrays.items():
+        records[name] = a
+
+    return records
@@ -0,0 +1,499 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains the computation of the statistics of the columns of the reads for several partitions of the
+# reads at once (e.g. the pass and fail reads of each barcode). The values are counted in a sparse histogram for each
+# partition and the moments of each partition are merged chunk by chunk, so the memory used does not depend on the
+# number of reads. The partitions share the sorted keys of the bins and only the non-empty bins of each partition are
+# stored, so the memory used does not grow with the number of partitions times the number of distinct values. Integer
+# values like the read lengths are counted in an exact histogram with a bin for each value found, so the quartiles and
+# the N50 are exact. The statistics of unions of partitions (all the reads, the pass reads, the reads of a barcode...)
+# are merged from the statistics of the partitions.
+
+import numpy as np
+import pandas as pd
+
+# Number of values processed at once
+partition_statistics_block_size = 10 * 1000 * 1000
+
+# Maximal range of the histogram keys of a block counted with a dense bincount
+partition_statistics_max_dense_keys = 16 * 1024 * 1024
+
+# Number of histogram bins per unit for the qscores
+qscore_histogram_resolution = 1000
+
+# Statistics returned by PartitionStatistics.describe(), in the order of pandas.Series.describe()
+describe_keys = ('count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max')
+
+# Read types of the partitions of ReadStatistics
+read_types = ('all', 'pass', 'fail')
+
+
+class PartitionStatistics:
+    """
+    Count, sum, mean, variance, minimum, maximum and histogram of the values of a column for each partition of the
+    values. Statistics are updated by chunks of values and can be merged with the statistics of other chunks. NaN
+    values are ignored.
+    """
+
+    def __init__(self, partition_count=1, resolution=None):
+        """
+        Constructor.
+        :param partition_count: number of partitions
+        :param resolution: number of histogram bins per unit, None for an exact histogram of integer values
+        """
+        self.partition_count = partition_count
+        self.resolution = resolution
+        self.counts = np.zeros(partition_count, dtype=np.int64)
+        self.sums = np.zeros(partition_count)
+        self.m2 = np.zeros(partition_count)
+        self.mins = np.full(partition_count, np.nan)
+        self.maxs = np.full(partition_count, np.nan)
+
+        # Sorted keys of the histogram bins (the values multiplied by the resolution), shared by the partitions
+        self.keys = np.zeros(0, dtype=np.int64)
+
+        # Non-empty bins of the partitions, sorted by partition and key: code of the bins (partition * number of keys
+        # + index of the key) and number of values of each bin
+        self.bins = np.zeros(0, dtype=np.int64)
+        self.bin_counts = np.zeros(0, dtype=np.int64)
+
+    def update(self, values, codes=None):
+        """
+        Add a chunk of values.
+        :param values: array of the values
+        :param codes: array of the partitions of the values (integers lower than the partition count), optional
+        """
+        values = np.asarray(values)
+        codes = np.zeros(len(values), dtype=np.intp) if codes is None else np.asarray(codes)
+
+        if values.dtype.kind == 'f':
+            valid = ~np.isnan(values)
+            if not valid.all():
+                values = values[valid]
+                codes = codes[valid]
+
+        for start in range(0, len(values), partition_statistics_block_size):
+            block = slice(start, start + partition_statistics_block_size)
+            self._update_block(values[block], codes[block])
+
+    def merge(self, other):
+        """
+        Merge the statistics of another chunk of values.
+        :param other: the other PartitionStatistics object, with the same partitions and resolution
+        """
+        if other.partition_count != self.partition_count or other.resolution != self.resolution:
+            raise ValueError('Cannot merge statistics with different partitions or resolutions')
+
+        self._add_keys(other.keys)
+        if len(other.bins) > 0:
+            other_key_count = len(other.keys)
+            key_indices = np.searchsorted(self.keys, other.keys)[other.bins % other_key_count]
+            self._add_bins(other.bins // other_key_count * len(self.keys) + key_indices, other.bin_counts)
+        self._combine(other.counts, other.sums, other.m2, other.mins, other.maxs)
+
+    def add_partitions(self, partition_count):
+        """
+        Increase the number of partitions, the new partitions are empty.
+        :param partition_count: the new number of partitions, lower numbers are ignored
+        """
+        added = partition_count - self.partition_count
+        if added <= 0:
+            return
+
+        self.counts = np.concatenate([self.counts, np.zeros(added, dtype=np.int64)])
+        self.sums = np.concatenate([self.sums, np.zeros(added)])
+        self.m2 = np.concatenate([self.m2, np.zeros(added)])
+        self.mins = np.concatenate([self.mins, np.full(added, np.nan)])
+        self.maxs = np.concatenate([self.maxs, np.full(added, np.nan)])
+        self.partition_count = partition_count
+
+    def _update_block(self, values, codes):
+        """
+        Add a block of values.
+        :param values: array of the values
+        :param codes: array of the partitions of the values
+        """
+        partition_count = self.partition_count
+        counts = np.bincount(codes, minlength=partition_count)
+        sums = np.bincount(codes, weights=values, minlength=partition_count)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = sums / counts
+        m2 = np.bincount(codes, weights=(values - means[codes]) ** 2, minlength=partition_count)
+
+        if self.resolution is None:
+            keys = values.astype(np.int64)
+        else:
+            keys = np.rint(values.astype(np.float64) * self.resolution).astype(np.int64)
+
+        block_keys, key_indices = _unique_keys(keys)
+        self._add_keys(block_keys)
+        key_indices = np.searchsorted(self.keys, block_keys)[key_indices]
+        key_count = len(self.keys)
+        bins, bin_indices = _unique_keys(codes.astype(np.int64) * key_count + key_indices)
+
+        # The minimum and the maximum of a partition are in its first and last non-empty bins
+        mins = np.full(partition_count, np.nan)
+        maxs = np.full(partition_count, np.nan)
+        if len(bins) > 0:
+            bin_partitions = bins // key_count
+            starts = np.flatnonzero(np.diff(bin_partitions, prepend=-1))
+            ends = np.append(starts[1:], len(bins)) - 1
+            first_bins = np.full(partition_count, -1, dtype=np.int64)
+            last_bins = np.full(partition_count, -1, dtype=np.int64)
+            first_bins[bin_partitions[starts]] = bins[starts] % key_count
+            last_bins[bin_partitions[ends]] = bins[ends] % key_count
+            candidates = key_indices == first_bins[codes]
+            np.fmin.at(mins, codes[candidates], values[candidates])
+            candidates = key_indices == last_bins[codes]
+            np.fmax.at(maxs, codes[candidates], values[candidates])
+
+        self._add_bins(bins, np.bincount(bin_indices, minlength=len(bins)))
+        self._combine(counts, sums, m2, mins, maxs)
+
+    def _add_keys(self, keys):
+        """
+        Add keys to the keys of the histograms. The codes of the bins are updated with the new indices of the keys.
+        :param keys: sorted array of the keys
+        """
+        if _contains(self.keys, keys):
+            return
+
+        new_keys = np.union1d(self.keys, keys)
+        if len(self.bins) > 0:
+            key_count = len(self.keys)
+            key_indices = np.searchsorted(new_keys, self.keys)[self.bins % key_count]
+            self.bins = self.bins // key_count * len(new_keys) + key_indices
+        self.keys = new_keys
+
+    def _add_bins(self, bins, counts):
+        """
+        Add values to the bins of the histograms.
+        :param bins: sorted array of the codes of the bins
+        :param counts: array of the number of values to add to each bin
+        """
+        positions = np.searchsorted(self.bins, bins)
+        found = positions < len(self.bins)
+        found[found] = self.bins[positions[found]] == bins[found]
+        self.bin_counts[positions[found]] += counts[found]
+
+        # The new bins are inserted at their position, the bins stay sorted
+        if not found.all():
+            missing = ~found
+            self.bins = np.insert(self.bins, positions[missing], bins[missing])
+            self.bin_counts = np.insert(self.bin_counts, positions[missing], counts[missing])
+
+    def _combine(self, counts, sums, m2, mins, maxs):
+        """
+        Merge the moments of a chunk of values in the moments of the partitions (Chan et al. parallel algorithm).
+        """
+        total = self.counts + counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = sums / counts - self.sums / self.counts
+            self.m2 += m2 + np.where((self.counts > 0) & (counts > 0),
+                                     delta ** 2 * self.counts * counts / total, 0.0)
+        self.counts = total
+        self.sums += sums
+        self.mins = np.fmin(self.mins, mins)
+        self.maxs = np.fmax(self.maxs, maxs)
+
+    def _partitions(self, partitions):
+        return np.arange(self.partition_count) if partitions is None else np.asarray(partitions, dtype=np.int64)
+
+    def count(self, partitions=None):
+        """
+        Get the number of values of partitions.
+        :param partitions: list of partitions, all the partitions if None
+        :return: an integer
+        """
+        return int(self.counts[self._partitions(partitions)].sum())
+
+    def sum(self, partitions=None):
+        """
+        Get the sum of the values of partitions.
+        :param partitions: list of partitions, all the partitions if None
+        :return: a float
+        """
+        return float(self.sums[self._partitions(partitions)].sum())
+
+    def min(self, partitions=None):
+        """
+        Get the minimum of the values of partitions.
+        :param partitions: list of partitions, all the partitions if None
+        :return: a float, NaN if the partitions are empty
+        """
+        return float(np.fmin.reduce(self.mins[self._partitions(partitions)], initial=np.nan))
+
+    def max(self, partitions=None):
+        """
+        Get the maximum of the values of partitions.
+        :param partitions: list of partitions, all the partitions if None
+        :return: a float, NaN if the partitions are empty
+        """
+        return float(np.fmax.reduce(self.maxs[self._partitions(partitions)], initial=np.nan))
+
+    def histogram(self, partitions=None):
+        """
+        Get the histogram of the values of partitions.
+        :param partitions: list of partitions, all the partitions if None
+        :return: a tuple with an array of the values of the bins and an array of the number of values of each bin
+        """
+        values = self.keys.astype(np.float64) if self.resolution is None else self.keys / self.resolution
+        key_count = len(self.keys)
+        if key_count == 0:
+            return values, np.zeros(0, dtype=np.int64)
+
+        bins = self.bins
+        bin_counts = self.bin_counts
+        if partitions is not None:
+            # The bins of each partition are contiguous
+            partitions = np.unique(self._partitions(partitions))
+            starts = np.searchsorted(bins, partitions * key_count)
+            ends = np.searchsorted(bins, (partitions + 1) * key_count)
+            selected = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)] + [[]]) \
+                .astype(np.intp)
+            bins = bins[selected]
+            bin_counts = bin_counts[selected]
+
+        counts = np.bincount(bins % key_count, weights=bin_counts, minlength=key_count)
+        return values, counts.astype(np.int64)
+
+    def describe(self, partitions=None):
+        """
+        Get the statistics of the values of partitions, like pandas.Series.describe(): count, mean, standard
+        deviation, minimum, quartiles and maximum. The moments of the partitions are merged and the quartiles are
+        interpolated from the histogram like numpy.percentile(). Quartiles are exact for integer values and rounded
+        to the resolution of the histogram otherwise.
+        :param partitions: list of partitions, all the partitions if None
+        :return: a dictionary of floats with the keys of describe_keys
+        """
+        partitions = self._partitions(partitions)
+        counts = self.counts[partitions]
+        count = int(counts.sum())
+        result = dict.fromkeys(describe_keys, np.nan)
+        result['count'] = float(count)
+        if count == 0:
+            return result
+
+        non_empty = partitions[counts > 0]
+        means = self.sums[non_empty] / self.counts[non_empty]
+        mean = self.sums[non_empty].sum() / count
+        m2 = self.m2[non_empty].sum() + (self.counts[non_empty] * (means - mean) ** 2).sum()
+
+        result['mean'] = float(mean)
+        result['std'] = float(np.sqrt(m2 / (count - 1))) if count > 1 else np.nan
+        result['min'] = self.min(non_empty)
+        result['max'] = self.max(non_empty)
+
+        # Bins have a width with a fixed resolution, quartiles are kept between the minimum and the maximum and are
+        # rounded to the resolution of the histogram
+        quartiles = np.clip(_histogram_quantiles(*self.histogram(non_empty), (0.25, 0.5, 0.75)),
+                            result['min'], result['max'])
+        if self.resolution is not None:
+            quartiles = np.rint(quartiles * self.resolution) / self.resolution
+        for key, value in zip(('25%', '50%', '75%'), quartiles):
+            result[key] = float(value)
+
+        return result
+
+    def nxx(self, x, partitions=None):
+        """
+        Get the NXX and LXX values of integer values (e.g. N50 and L50 of read lengths): the value that
+        reaches XX percent of the sum of the values when the values are summed in increasing order and the
+        number of values summed.
+        :param x: percentage of the sum of the values
+        :param partitions: list of partitions, all the partitions if None
+        :return: a tuple with the NXX and the LXX values or (None, None) if the partitions are empty
+        """
+        values, counts = self.histogram(partitions)
+        non_empty = counts > 0
+        if not non_empty.any():
+            return None, None
+
+        values = values[non_empty].astype(np.int64)
+        counts = counts[non_empty]
+        cumulative_sums = np.cumsum(values * counts)
+        threshold = cumulative_sums[-1] * x / 100
+        i = int(np.searchsorted(cumulative_sums, threshold, side='left'))
+
+        previous_sum = int(cumulative_sums[i - 1]) if i > 0 else 0
+        previous_count = int(counts[:i].sum())
+        value = int(values[i])
+
+        # Number of values of the bin needed to reach the threshold
+        needed = 1
+        if value > 0 and threshold - previous_sum > value:
+            needed = int(np.ceil((threshold - previous_sum) / value))
+            while previous_sum + (needed - 1) * value >= threshold:
+                needed -= 1
+
+        return value, previous_count + needed
+
+
+class ReadStatistics:
+    """
+    Statistics of the length and of the qscore of the reads for the pass and fail reads of each barcode. Barcodes
+    that are not selected are grouped in the 'other barcodes' partitions.
+    """
+
+    def __init__(self, barcode_selection=None):
+        """
+        Constructor.
+        :param barcode_selection: list of the selected barcodes, optional
+        """
+        self.barcodes = barcode_groups(barcode_selection) if barcode_selection else []
+
+        partition_count = 2 * max(len(self.barcodes), 1)
+        self.length = PartitionStatistics(partition_count)
+        self.qscore = PartitionStatistics(partition_count, qscore_histogram_resolution)
+
+    def update(self, dataframe, barcodes=None):
+        """
+        Add a chunk of reads.
+        :param dataframe: a dataframe with the passes_filtering, sequence_length and mean_qscore columns and the
+        barcode_arrangement column if barcodes are selected
+        :param barcodes: array of the index of the barcode group of each read returned by barcode_codes(), computed
+        from the barcode_arrangement column if None
+        """
+        codes = dataframe['passes_filtering'].values.astype(np.uint16)
+        if self.barcodes:
+            if barcodes is None:
+                barcodes = barcode_codes(dataframe['barcode_arrangement'], self.barcodes)
+            codes += 2 * barcodes
+
+        self.length.update(dataframe['sequence_length'].values, codes)
+        self.qscore.update(dataframe['mean_qscore'].values, codes)
+
+    def merge(self, other):
+        """
+        Merge the statistics of another chunk of reads.
+        :param other: the other ReadStatistics object, with the same barcode selection
+        """
+        self.length.merge(other.length)
+        self.qscore.merge(other.qscore)
+
+    def partitions(self, read_type='all', barcode=None):
+        """
+        Get the partitions of a read type.
+        :param read_type: 'all', 'pass' or 'fail'
+        :param barcode: a barcode of the barcode groups, all the barcodes if None
+        :return: a list of partitions
+        """
+        groups = range(max(len(self.barcodes), 1)) if barcode is None else [self.barcodes.index(barcode)]
+        statuses = {'all': (0, 1), 'pass': (1,), 'fail': (0,)}[read_type]
+        return [2 * g + s for g in groups for s in statuses]
+
+    def barcode_counts(self, read_type='all'):
+        """
+        Get the number of reads of each barcode group.
+        :param read_type: 'all', 'pass' or 'fail'
+        :return: a Pandas Series with the read counts indexed by barcode
+        """
+        # The partitions of the fail and pass reads of each barcode group are consecutive
+        statuses = {'all': [0, 1], 'pass': [1], 'fail': [0]}[read_type]
+        counts = self.length.counts.reshape(-1, 2)[:len(self.barcodes), statuses].sum(axis=1)
+        return pd.Series(counts, index=self.barcodes, dtype=np.int64)
+
+
+def barcode_groups(barcode_selection):
+    """
+    Get the barcode groups of a barcode selection: the selected barcodes, 'unclassified' and 'other barcodes'.
+    :param barcode_selection: list of the selected barcodes
+    :return: a list of barcode names
+    """
+    groups = list(barcode_selection)
+    for barcode in ('unclassified', 'other barcodes'):
+        if barcode not in groups:
+            groups.append(barcode)
+
+    return groups
+
+
+def barcode_codes(barcodes, groups):
+    """
+    Get the index of the barcode group of each read. Barcodes not in the groups and missing barcodes belong to the
+    'other barcodes' group.
+    :param barcodes: a Pandas Series with the barcodes of the reads
+    :param groups: list of the barcode groups
+    :return: an array of integers
+    """
+    categorical = pd.Categorical(barcodes)
+    other = groups.index('other barcodes')
+
+    # Missing values have the code -1 and use the last element of the lookup table
+    lookup = np.array([groups.index(c) if c in groups else other for c in categorical.categories] + [other],
+                      dtype=np.uint16)
+    return lookup[categorical.codes]
+
+
+def _unique_keys(keys):
+    """
+    Get the unique keys of a block and the index of each key in the unique keys. Keys with a small range compared to
+    the number of keys are counted with a bincount, without sorting the keys.
+    :param keys: array of integers
+    :return: a tuple with the sorted array of the unique keys and the array of the indices
+    """
+    if len(keys) == 0:
+        return keys, keys
+
+    offset = int(keys.min())
+    key_range = int(keys.max()) - offset + 1
+    if key_range > min(partition_statistics_max_dense_keys, 16 * len(keys)):
+        return np.unique(keys, return_inverse=True)
+
+    present = np.bincount(keys - offset, minlength=key_range) > 0
+    lookup = np.cumsum(present) - 1
+    return np.flatnonzero(present) + offset, lookup[keys - offset]
+
+
+def _contains(sorted_values, values):
+    """
+    Check if all the values are in a sorted array.
+    :param sorted_values: sorted array
+    :param values: array of the values to check
+    :return: True if all the values are in the sorted array
+    """
+    if len(values) == 0:
+        return True
+    if len(sorted_values) == 0:
+        return False
+
+    positions = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return bool(np.all(sorted_values[positions] == values))
+
+
+def _histogram_quantiles(values, counts, quantiles):
+    """
+    Compute quantiles from a histogram with the linear interpolation of numpy.percentile().
+    :param values: sorted array of the values of the bins
+    :param counts: array of the number of values of each bin
+    :param quantiles: quantiles to compute between 0 and 1
+    :return: an array of floats
+    """
+    cumulative_counts = np.cumsum(counts)
+    positions = np.asarray(quantiles, dtype=np.float64) * (cumulative_counts[-1] - 1)
+    lower = np.floor(positions)
+    upper = np.minimum(lower + 1, cumulative_counts[-1] - 1)
+    a = values[np.searchsorted(cumulative_counts, lower, side='right')]
+    b = values[np.searchsorted(cumulative_counts, upper, side='right')]
+
+    # Same formula than numpy to get the same rounding
+    t = positions - lower
+    return np.where(t >= 0.5, b - (b - a) * (1 - t), a + (b - a) * t)
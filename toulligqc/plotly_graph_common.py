@@ -26,9 +26,10 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
 import plotly.offline as py
-from scipy.interpolate import interp1d
-from scipy.ndimage.filters import gaussian_filter1d
-from sklearn.utils import resample
+from scipy.ndimage import gaussian_filter1d
+
+from toulligqc.sampling import quantile_sample
+from toulligqc.sampling import stratified_sample_indices
 
 figure_image_width = 1000
 figure_image_height = 562
@@ -45,6 +46,10 @@ toulligqc_colors = {'all': '#fca311',  # Yellow
                     'phred_score_over_time': '#7aaceb',
                     'speed_over_time': '#AE3F7B',
                     'nseq_over_time': '#edb773',
+                    'median_before_over_time': '#5c7ab8',
+                    'alignment': '#3d7f9e',
+                    'channel_activity': '#2a6f97',
+                    'channel_throughput': '#8d6a9f',
                     'pie_chart_palette': ["#f3a683", "#f7d794", "#778beb", "#e77f67", "#cf6a87", "#786fa6", "#f8a5c2",
                                           "#63cdda", "#ea8685", "#596275"],
                     'green_zone_color': 'rgba(0,100,0,.1)'
@@ -73,6 +78,14 @@ interpolation_point_count_dict = {
     'phred_violin': (10000, 4000, 3),
 }
 
+# Maximal number of data points embedded in the HTML report, shared by all the figures of the report, and maximal
+# number of data points of a single figure
+report_point_budget = 200000
+figure_point_budget = 10000
+
+# Traces with less points than this value are never downsampled (e.g. threshold lines)
+downsampling_min_trace_points = 10
+
 help_url = 'https://htmlpreview.github.io/?https://github.com/GenomicParisCentre/toulligQC/master/docs/help.html'
 
 
@@ -91,6 +104,9 @@ def _format_int(i):
 
 
 def _format_float(f):
+    if np.isnan(f):
+        return 'NaN'
+
     s = str(f)
     i = int(s.split('.')[0])
     f = float('0.' + s.split('.')[1])
@@ -178,11 +194,12 @@ def _interpolate(x, npoints: int, y=None, interp_type=None, axis=-1):
     :param interp_type: string specifying the type of interpolation (i.e. linear, nearest, cubic, quadratic etc.)
     :param axis: number specifying the axis of y along which to interpolate. Default = -1
     """
-    # In case of single array of data, use
+    # In case of single array of data, use the quantiles of the data
     if y is None:
-        return np.sort(resample(x, n_samples=npoints, random_state=1))
+        return quantile_sample(x, npoints)
 
     else:
+        from scipy.interpolate import interp1d
         f = interp1d(x, y, kind=interp_type, axis=axis)
         x_int = np.linspace(min(x), max(x), npoints)
         y_int = f(x_int)
@@ -198,6 +215,12 @@ def _smooth_data(npoints: int, sigma: int, data, min_arg=None, max_arg=None, wei
     :param sigma: sigma value of the gaussian filter
     """
 
+    # No data (e.g. no fail reads): the histogram is null on the bins if they are defined
+    if len(data) == 0:
+        if min_arg is None or max_arg is None:
+            return np.empty(0), np.empty(0), np.empty(0)
+        density = False
+
     if min_arg is None:
         min_arg = np.nanmin(data)
 
@@ -299,24 +322,193 @@ def _transparent_component(c, b, a):
     return r
 
 
-def _create_and_save_div(fig, result_directory, main):
-    div = py.plot(fig,
-                  include_plotlyjs=False,
-                  output_type='div',
-                  auto_open=False,
-                  show_link=False)
-
-    if result_directory is not None:
-        output_file = result_directory + '/' + '_'.join(main.split())
-        py.plot(fig,
-                filename=output_file,
-                output_type="file",
-                include_plotlyjs="directory",
-                auto_open=False)
-    else:
-        output_file = None
+def figure_shares(point_counts, total=report_point_budget):
+    """
+    Share the point budget of a report between its figures before the figures are rendered, so the points of a graph
+    do not depend on its position in the report. The figures that need less than an equal share keep all their
+    points and the rest of the budget is shared equally by the other figures.
+    :param point_counts: number of points of each figure
+    :param total: maximal number of data points of the report
+    :return: a list with the number of points of each figure
+    """
+    shares = [0] * len(point_counts)
+    remaining = total
+    for i, index in enumerate(sorted(range(len(point_counts)), key=lambda f: point_counts[f])):
+        shares[index] = min(point_counts[index], remaining // (len(point_counts) - i))
+        remaining -= shares[index]
+
+    return shares
+
+
+def render_graphs(graphs, total=report_point_budget):
+    """
+    Create the HTML divs and the files of the graphs of a report. The figures are downsampled to their share of the
+    point budget of the report first.
+    :param graphs: list of graphs, each graph is a tuple with its name, the path of its file or None, its HTML table
+    and its plotly figure
+    :param total: maximal number of data points of the report
+    :return: the list of the graphs, each graph is a tuple with its name, the path of its file or None, its HTML table
+    and its HTML div
+    """
+    figures = [fig for _, _, _, fig in graphs]
+    shares = figure_shares([sum(_trace_point_count(t) for t in fig.data) for fig in figures], total)
+
+    result = []
+    for (name, output_file, table_html, fig), share in zip(graphs, shares):
+        _downsample_figure(fig, share)
+        div = py.plot(fig,
+                      include_plotlyjs=False,
+                      output_type='div',
+                      auto_open=False,
+                      show_link=False)
+
+        if output_file is not None:
+            py.plot(fig,
+                    filename=output_file,
+                    output_type="file",
+                    include_plotlyjs="directory",
+                    auto_open=False)
+
+        result.append((name, output_file, table_html, div))
+
+    return result
+
+
+def _prepare_figure(fig, result_directory, main):
+    """
+    Prepare the figure of a graph. The figure is downsampled to figure_point_budget points, its HTML div and its file
+    are created by render_graphs() once all the figures of the report are known.
+    :param fig: plotly figure
+    :param result_directory: directory of the file of the graph, None to not write the file
+    :param main: name of the graph
+    :return: the path of the file of the graph or None
+    """
+    _downsample_figure(fig, figure_point_budget)
+
+    if result_directory is None:
+        return None
+
+    return result_directory + '/' + '_'.join(main.split())
+
+
+def _downsample_figure(fig, budget):
+    """
+    Reduce the number of points of the traces of a figure to fit in a point budget.
+    The budget is shared between the traces proportionally to their number of points.
+    Lines are downsampled using the Largest-Triangle-Three-Buckets algorithm, markers using a stratified sampling
+    and violin data using quantiles.
+    :param fig: plotly figure to downsample
+    :param budget: maximal number of points for the whole figure
+    """
+
+    traces = [t for t in fig.data if _trace_point_count(t) >= downsampling_min_trace_points]
+    total = sum(_trace_point_count(t) for t in traces)
+
+    if total <= budget:
+        return
+
+    for trace in traces:
+        count = _trace_point_count(trace)
+        npoints = max(downsampling_min_trace_points, int(budget * count / total))
+        if npoints >= count:
+            continue
+
+        if trace.type == 'violin':
+            trace.y = quantile_sample(trace.y, npoints)
+            continue
+
+        x = np.asarray(trace.x, dtype=float)
+        y = np.asarray(trace.y, dtype=float)
+        if (trace.mode is None or 'lines' in trace.mode) and np.all(np.diff(x) >= 0):
+            indices = _lttb_indices(x, y, npoints)
+        else:
+            indices = np.sort(stratified_sample_indices(x, npoints))
+
+        _take_trace_points(trace, indices, count)
+
+
+def _trace_point_count(trace):
+    """
+    Get the number of points of a trace that can be downsampled. Heatmaps are not downsampled: their cells (and their
+    ids and hover text) are the channels of the flowcell, whose number does not depend on the number of reads.
+    :param trace: plotly trace
+    :return: the number of points or 0 if the trace type is not handled by the downsampler
+    """
+
+    if trace.type == 'violin':
+        return len(trace.y) if _is_numeric(trace.y) else 0
+
+    # Traces with categorical or date values are not downsampled
+    if trace.type in ('scatter', 'scattergl') and _is_numeric(trace.x) and _is_numeric(trace.y):
+        return len(trace.x)
+
+    return 0
+
+
+def _is_numeric(values):
+    """
+    Check if the values of a trace attribute are numbers.
+    :param values: the values of the attribute
+    :return: True if values is an array of numbers
+    """
+
+    if values is None or isinstance(values, str):
+        return False
+
+    return np.asarray(values).dtype.kind in 'biuf'
+
 
-    return div, output_file
+def _take_trace_points(trace, indices, count):
+    """
+    Keep only the selected points of a scatter trace, including the per-point attributes (hover text, ids...).
+    :param trace: plotly scatter trace
+    :param indices: indices of the points to keep
+    :param count: number of points of the trace before downsampling
+    """
+
+    for attribute in ('x', 'y', 'text', 'hovertext', 'ids', 'customdata'):
+        values = trace[attribute]
+        if values is not None and not isinstance(values, str) and len(values) == count:
+            trace[attribute] = np.asarray(values)[indices]
+
+
+def _lttb_indices(x, y, npoints: int):
+    """
+    Select the points of a curve using the Largest-Triangle-Three-Buckets algorithm.
+    The first and last points are always kept.
+    :param x: sorted x values of the curve (ndarray)
+    :param y: y values of the curve (ndarray)
+    :param npoints: number of points to select
+    :return: the indices of the selected points (ndarray)
+    """
+
+    n = len(x)
+    if npoints >= n or npoints < 3:
+        return np.arange(n)
+
+    y = np.nan_to_num(y)
+    edges = np.linspace(1, n - 1, npoints - 1).astype(np.int64)
+    edges = np.append(edges, n)
+
+    result = np.empty(npoints, dtype=np.int64)
+    result[0] = 0
+    result[-1] = n - 1
+
+    a = 0
+    for i in range(npoints - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Average point of the next bucket (the last point for the last bucket)
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Keep the point of the bucket with the largest triangle area
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        result[i + 1] = a
+
+    return result
 
 
 def _over_time_graph(data_series,
@@ -466,8 +658,8 @@ def _over_time_graph(data_series,
         fig.update_yaxes(type="log")
 
     table_html = None
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
 def _barcode_boxplot_graph(graph_name, df, barcode_selection, pass_color, fail_color, yaxis_title, legend_title,
@@ -530,8 +722,8 @@ def _barcode_boxplot_graph(graph_name, df, barcode_selection, pass_color, fail_c
     # table_html = _dataFrame_to_html(dataframe)
 
     table_html = None
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
 def _pie_chart_graph(graph_name, count_sorted, color_palette, one_d_square, result_directory):
@@ -625,12 +817,12 @@ def _pie_chart_graph(graph_name, count_sorted, color_palette, one_d_square, resu
     barcode_table[count_col_name] = barcode_table[count_col_name].astype(int).apply(lambda x: _format_int(x))
     table_html = _dataFrame_to_html(barcode_table)
 
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
 def _read_length_distribution(graph_name, all_reads, pass_reads, fail_reads, all_color, pass_color, fail_color,
-                              xaxis_title, result_directory):
+                              xaxis_title, result_directory, read_weight=1):
     npoints, sigma = interpolation_points(all_reads, 'read_length_distribution')
     min_all_reads = min(all_reads)
     max_all_reads = max(all_reads)
@@ -658,7 +850,8 @@ def _read_length_distribution(graph_name, all_reads, pass_reads, fail_reads, all
     # Find 50 percentile for zoomed range on x axis
     max_x_range = np.percentile(all_reads, 99)
 
-    coef = max_all_reads / npoints
+    # Each read represents read_weight reads when the reads are a sample
+    coef = max_all_reads / npoints / read_weight
 
     max_y = max(max(count_y1), max(count_y2), max(count_y3)) / coef
     max_sum_y = max(max(sum_y1), max(sum_y2), max(sum_y3)) / coef
@@ -812,8 +1005,8 @@ def _read_length_distribution(graph_name, all_reads, pass_reads, fail_reads, all
                          keys=['All reads', 'Pass reads', 'Fail reads'])
     table_html = _dataFrame_to_html(_make_describe_dataframe(table_df))
 
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
 def _phred_score_density(graph_name, dataframe, prefix, all_color, pass_color, fail_color, result_directory):
@@ -855,7 +1048,7 @@ def _phred_score_density(graph_name, dataframe, prefix, all_color, pass_color, f
                              ))
 
     # Threshold
-    for p in [25, 50, 75]:
+    for p in ([25, 50, 75] if len(pass_series) > 0 else []):
         x0 = np.percentile(pass_series, p)
         if p == 50:
             t = 'median'
@@ -884,8 +1077,8 @@ def _phred_score_density(graph_name, dataframe, prefix, all_color, pass_color, f
     )
 
     table_html = None
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
 def _quality_multiboxplot(graph_name, result_directory, df, onedsquare=False):
@@ -897,10 +1090,11 @@ def _quality_multiboxplot(graph_name, result_directory, df, onedsquare=False):
     # If more than 10.000 reads, interpolate data
     npoints = interpolation_points(df[prefix], 'phred_violin')[0]
     if len(df[prefix]) != npoints:
+        # Pass or fail reads may be less than npoints, shorter columns are padded with NaN
         violin_df = pd.DataFrame({
-            prefix: _interpolate(df[prefix], npoints),
-            prefix + " pass": _interpolate(df[prefix + " pass"], npoints),
-            prefix + " fail": _interpolate(df[prefix + " fail"], npoints)
+            prefix: pd.Series(_interpolate(df[prefix], npoints)),
+            prefix + " pass": pd.Series(_interpolate(df[prefix + " pass"], npoints)),
+            prefix + " fail": pd.Series(_interpolate(df[prefix + " fail"], npoints))
         })
     else:
         violin_df = df
@@ -983,8 +1177,8 @@ def _quality_multiboxplot(graph_name, result_directory, df, onedsquare=False):
     df.columns = ["All reads", "Pass reads", "Fail reads"]
     table_html = _dataFrame_to_html(_make_describe_dataframe(df))
 
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
 def _scatterplot(graph_name, dataframe_dict, result_directory, onedsquare=False):
@@ -997,9 +1191,10 @@ def _scatterplot(graph_name, dataframe_dict, result_directory, onedsquare=False)
     npoints, sigma = interpolation_points(read_pass_length, 'scatterplot')
     if (len(read_pass_length) + len(read_fail_length)) > npoints:
         pass_ratio = len(read_pass_length) / (len(read_pass_length) + len(read_fail_length))
-        pass_data = _interpolate(read_pass_length, int(npoints * pass_ratio), y=read_pass_qscore, interp_type="nearest")
+        pass_data = _interpolate(read_pass_length, int(npoints * pass_ratio), y=read_pass_qscore, interp_type="nearest") \
+            if len(read_pass_length) > 0 else [read_pass_length, read_pass_qscore]
         fail_data = _interpolate(read_fail_length, int(npoints * (1 - pass_ratio)), y=read_fail_qscore,
-                                 interp_type="nearest")
+                                 interp_type="nearest") if len(read_fail_length) > 0 else [read_fail_length, read_fail_qscore]
     else:
         pass_data = [read_pass_length, read_pass_qscore]
         fail_data = [read_fail_length, read_fail_qscore]
@@ -1028,13 +1223,13 @@ def _scatterplot(graph_name, dataframe_dict, result_directory, onedsquare=False)
         **_yaxis('PHRED score', dict(fixedrange=False)),
     )
     # Trim x axis to avoid negative values
-    max_val = max(max(read_fail_length), max(read_pass_length))
+    max_val = max(max(read_fail_length, default=0), max(read_pass_length, default=0))
 
     fig.update_xaxes(range=[0, max_val])
 
     table_html = None
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
 def interpolation_points(series, graph_name):
@@ -26,10 +26,11 @@ import pandas as pd
 import plotly.graph_objs as go
 
 from toulligqc.plotly_graph_common import _barcode_boxplot_graph
-from toulligqc.plotly_graph_common import _create_and_save_div
+from toulligqc.plotly_graph_common import _prepare_figure
 from toulligqc.plotly_graph_common import _dataFrame_to_html
 from toulligqc.plotly_graph_common import _format_float
 from toulligqc.plotly_graph_common import _format_int
+from toulligqc.plotly_graph_common import _format_percent
 from toulligqc.plotly_graph_common import _legend
 from toulligqc.plotly_graph_common import _over_time_graph
 from toulligqc.plotly_graph_common import _phred_score_density
@@ -42,6 +43,8 @@ from toulligqc.plotly_graph_common import _title
 from toulligqc.plotly_graph_common import _transparent_colors
 from toulligqc.plotly_graph_common import _xaxis
 from toulligqc.plotly_graph_common import _yaxis
+from toulligqc.plotly_graph_common import axis_font_size
+from toulligqc.plotly_graph_common import axis_title_font_size
 from toulligqc.plotly_graph_common import default_graph_layout
 from toulligqc.plotly_graph_common import interpolation_points
 from toulligqc.plotly_graph_common import line_width
@@ -147,11 +150,11 @@ def read_count_histogram(result_dict, result_directory):
     dataframe.iloc[1:] = dataframe.iloc[1:].applymap(_format_float)
     table_html = _dataFrame_to_html(dataframe)
 
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
-def read_length_scatterplot(dataframe_dict, result_directory):
+def read_length_scatterplot(dataframe_dict, result_directory, read_weight=1):
     graph_name = "Distribution of read lengths"
 
     return _read_length_distribution(graph_name=graph_name,
@@ -162,12 +165,14 @@ def read_length_scatterplot(dataframe_dict, result_directory):
                                      pass_color=toulligqc_colors['pass'],
                                      fail_color=toulligqc_colors['fail'],
                                      xaxis_title='Read length (bp)',
-                                     result_directory=result_directory)
+                                     result_directory=result_directory,
+                                     read_weight=read_weight)
 
 
-def yield_plot(df, result_directory, oneDsquare=False):
+def yield_plot(df, result_directory, oneDsquare=False, read_weight=1):
     """
     Plots the different reads (1D, 1D pass, 1D fail) produced along the run against the time(in hour)
+    :param read_weight: number of reads represented by each read of the dataframe when the dataframe is a sample
     """
 
     graph_name = "Yield plot through time"
@@ -208,6 +213,10 @@ def yield_plot(df, result_directory, oneDsquare=False):
                                                                  data=d[0][start_time_column],
                                                                  weights=d[0]['sequence_length'])
 
+                if read_weight != 1:
+                    count_y = count_y * read_weight
+                    cum_count_y = cum_count_y * read_weight
+
                 smooth_data_dict[d[1]] = (count_x, count_y, cum_count_y)
 
             count_x, count_y, cum_count_y = smooth_data_dict[d[1]]
@@ -324,8 +333,8 @@ def yield_plot(df, result_directory, oneDsquare=False):
         ]
     )
     table_html = None
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
 def read_quality_multiboxplot(dataframe_dict, result_directory):
@@ -425,13 +434,22 @@ def _compute_channel_count(df, channel_map):
 
     # count pass reads per channel...
     #counts = df[df['passes_filtering']] \
-    counts = df \
-        .groupby('channel') \
-        .size().to_frame('reads') \
-        .reset_index()
+    if 'read_count' in df.columns:
+        # Reads already counted by channel
+        counts = df.groupby('channel')['read_count'].sum().to_frame('reads').reset_index()
+    else:
+        counts = df \
+            .groupby('channel') \
+            .size().to_frame('reads') \
+            .reset_index()
+
+    return _channel_count_matrix(counts, channel_map)
 
-    # ...and merge with the channel map
-    counts = counts.merge(channel_map, on='channel', how='outer').fillna(0)
+
+def _channel_count_matrix(counts, channel_map):
+
+    # Merge the read counts per channel with the channel map
+    counts = counts.merge(channel_map, on='channel', how='outer').fillna(0)[['channel', 'reads', 'row', 'column']]
 
     max_row = counts['row'].max()
     max_col = counts['column'].max()
@@ -459,6 +477,8 @@ def plot_performance(df, result_directory):
     """
     Plots the channels occupancy by the reads
     @:param pore_measure: reads number per pore
+    :param df: a dataframe with the channel and passes_filtering columns of the reads, or with the number of reads
+    of each channel and status in a read_count column
     """
 
     graph_name = "Channel occupancy of the flowcell"
@@ -588,8 +608,178 @@ def plot_performance(df, result_directory):
     )
 
     table_html = None
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
+
+
+def channel_activity_over_time(channel_activity, result_directory):
+    """
+    Plots the number of active channels and the percentage of time spent by the active channels sequencing reads
+    along the run
+    :param channel_activity: a ChannelActivity object
+    :param result_directory: the result directory
+    """
+
+    graph_name = "Active channels over time"
+
+    x = channel_activity.time_bins()
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=x,
+                             y=channel_activity.active_channels(),
+                             name='Active channels',
+                             mode='lines',
+                             fill='tozeroy',
+                             line=dict(color=toulligqc_colors['channel_activity'], width=line_width)))
+
+    if channel_activity.has_duration:
+        fig.add_trace(go.Scatter(x=x,
+                                 y=channel_activity.sequencing_time_percent(),
+                                 name='Time sequencing (%)',
+                                 mode='lines',
+                                 yaxis='y2',
+                                 line=dict(color='black', width=int(line_width / 2), dash='dot')))
+
+    fig.update_layout(
+        **_title(graph_name),
+        **_legend(args=dict(x=1.1)),
+        **default_graph_layout,
+        hovermode='x',
+        **_xaxis('Experiment time (hours)'),
+        **_yaxis('Channels with reads', dict(rangemode='tozero')),
+        yaxis2=dict(title='<b>Time sequencing (%)</b>', titlefont_size=axis_title_font_size,
+                    tickfont_size=axis_font_size, overlaying='y', side='right', range=[0, 100], showgrid=False,
+                    fixedrange=True)
+    )
+
+    table_html = None
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
+
+
+def channel_throughput_over_time(channel_activity, result_directory):
+    """
+    Plots the quartiles of the throughput of the active channels along the run
+    :param channel_activity: a ChannelActivity object
+    :param result_directory: the result directory
+    """
+
+    graph_name = "Channel throughput over time"
+
+    x = channel_activity.time_bins()
+    q1, median, q3 = channel_activity.channel_throughput_quantiles((25, 50, 75))
+    color = toulligqc_colors['channel_throughput']
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=x, y=q1, name="25% quartile", mode='lines', fill="none",
+                             line=dict(color=color, width=line_width)))
+    fig.add_trace(go.Scatter(x=x, y=q3, name="75% quartile", mode='lines', fill="tonexty",
+                             line=dict(color=color, width=line_width)))
+    fig.add_trace(go.Scatter(x=x, y=median, name="Median", mode='lines',
+                             line=dict(color="black", width=line_width)))
+
+    fig.update_layout(
+        **_title(graph_name),
+        **_legend(),
+        **default_graph_layout,
+        hovermode='x',
+        **_xaxis('Experiment time (hours)'),
+        **_yaxis('Bases per hour per active channel', dict(rangemode='tozero')),
+    )
+
+    table_html = None
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
+
+
+def channel_survival(channel_activity, result_directory):
+    """
+    Plots the percentage of the channels (and of the pores of each mux when the mux of the reads is known) that
+    are still active along the run. A channel or a pore is active until its last read
+    :param channel_activity: a ChannelActivity object
+    :param result_directory: the result directory
+    """
+
+    graph_name = "Channel survival"
+
+    x = channel_activity.time_bins()
+    colors = [toulligqc_colors['channel_activity']] + toulligqc_colors['pie_chart_palette']
+
+    fig = go.Figure()
+    for i, (name, y) in enumerate(channel_activity.survival().items()):
+        fig.add_trace(go.Scatter(x=x,
+                                 y=y,
+                                 name=name,
+                                 mode='lines',
+                                 line=dict(color=colors[i % len(colors)], width=line_width, shape='hv')))
+
+    fig.update_layout(
+        **_title(graph_name),
+        **_legend(),
+        **default_graph_layout,
+        hovermode='x',
+        **_xaxis('Experiment time (hours)'),
+        **_yaxis('Still active (%)', dict(range=[0, 105])),
+    )
+
+    table_html = None
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
+
+
+def time_window_metrics(time_windows, result_directory):
+    """
+    Plots the yield and the ratio of pass reads of each time window of the run, with a table of the metrics of the
+    windows
+    :param time_windows: a TimeWindowStatistics object
+    :param result_directory: the result directory
+    """
+
+    graph_name = "Run metrics over time"
+
+    metrics = time_windows.metrics()
+    x = (metrics['start'] + metrics['end']) / 2
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=x,
+                         y=metrics['yield'],
+                         width=time_windows.window_duration / 3600,
+                         name='Yield',
+                         hovertemplate='%{y:,} bases<extra></extra>',
+                         marker_color=_transparent_colors([toulligqc_colors['all']], plotly_background_color, .5)[0],
+                         marker_line_color=toulligqc_colors['all'],
+                         marker_line_width=line_width))
+    fig.add_trace(go.Scatter(x=x,
+                             y=metrics['pass.ratio'] * 100,
+                             name='Pass reads (%)',
+                             mode='lines+markers',
+                             yaxis='y2',
+                             line=dict(color=toulligqc_colors['pass'], width=line_width)))
+
+    fig.update_layout(
+        **_title(graph_name),
+        **_legend(args=dict(x=1.1)),
+        **default_graph_layout,
+        hovermode='x',
+        **_xaxis('Experiment time (hours)'),
+        **_yaxis('Yield (bases)', dict(rangemode='tozero')),
+        yaxis2=dict(title='<b>Pass reads (%)</b>', titlefont_size=axis_title_font_size,
+                    tickfont_size=axis_font_size, overlaying='y', side='right', range=[0, 100], showgrid=False,
+                    fixedrange=True)
+    )
+
+    # HTML table
+    dataframe = pd.DataFrame({'Read count': metrics['read.count'].apply(_format_int),
+                              'Yield': metrics['yield'].apply(_format_int),
+                              'Pass reads': (metrics['pass.ratio'] * 100).apply(
+                                  lambda f: 'NaN' if np.isnan(f) else _format_percent(f)),
+                              'N50': metrics['n50'].apply(lambda f: 'NaN' if np.isnan(f) else _format_int(int(f))),
+                              'Median Qscore': metrics['median.qscore'].apply(_format_float)})
+    dataframe.index = ['{:g}-{:g}h'.format(start, end) for start, end in zip(metrics['start'], metrics['end'])]
+    table_html = _dataFrame_to_html(dataframe)
+
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
 #
@@ -668,6 +858,77 @@ def barcoded_phred_score_frequency(dataframe_dict, result_directory):
                                   result_directory=result_directory)
 
 
+def barcode_yield_over_time(barcode_activity, result_directory):
+    """
+    Plots the cumulative yield of each barcode along the run
+    :param barcode_activity: a BarcodeActivity object
+    :param result_directory: the result directory
+    """
+
+    graph_name = "Yield of barcodes through time"
+
+    x = np.concatenate([[0], barcode_activity.time_bins()])
+    cumulative_yield = barcode_activity.cumulative_yield()
+
+    fig = go.Figure()
+    for i in barcode_activity.active_barcodes():
+        fig.add_trace(go.Scatter(x=x,
+                                 y=np.concatenate([[0], cumulative_yield[i]]),
+                                 name=barcode_activity.barcodes[i],
+                                 mode='lines',
+                                 hovertemplate='%{y:,.0f} bases<extra>' + barcode_activity.barcodes[i] + '</extra>',
+                                 line=dict(width=line_width)))
+
+    fig.update_layout(
+        **_title(graph_name),
+        **_legend('Barcodes'),
+        **default_graph_layout,
+        hovermode='x',
+        **_xaxis('Experiment time (hours)'),
+        **_yaxis('Cumulative yield (bases)', dict(rangemode='tozero')),
+    )
+
+    table_html = None
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
+
+
+def barcode_throughput_over_time(barcode_activity, result_directory):
+    """
+    Plots the throughput of each barcode along the run, stacked to show the throughput of the run
+    :param barcode_activity: a BarcodeActivity object
+    :param result_directory: the result directory
+    """
+
+    graph_name = "Throughput of barcodes over time"
+
+    x = barcode_activity.time_bins() - barcode_activity.bin_duration / 3600 / 2
+    throughput = barcode_activity.throughput()
+
+    fig = go.Figure()
+    for i in barcode_activity.active_barcodes():
+        fig.add_trace(go.Scatter(x=x,
+                                 y=throughput[i],
+                                 name=barcode_activity.barcodes[i],
+                                 mode='lines',
+                                 stackgroup='barcodes',
+                                 hovertemplate='%{y:,.0f} bases/h<extra>' + barcode_activity.barcodes[i] + '</extra>',
+                                 line=dict(width=0)))
+
+    fig.update_layout(
+        **_title(graph_name),
+        **_legend('Barcodes'),
+        **default_graph_layout,
+        hovermode='x',
+        **_xaxis('Experiment time (hours)'),
+        **_yaxis('Bases per hour', dict(rangemode='tozero')),
+    )
+
+    table_html = None
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
+
+
 def sequence_length_over_time(dataframe_dict, result_directory):
     graph_name = "Read length over time"
 
@@ -718,3 +979,160 @@ def speed_over_time(dataframe_dict, result_directory):
                             yaxis_title='Speed (bases per second)',
                             green_zone_starts_at=300,
                             green_zone_color=toulligqc_colors['green_zone_color'])
+
+
+#
+# Raw data (FAST5 and POD5) plots
+#
+
+
+def raw_data_channel_occupancy(channel_counts, result_directory, file_type):
+    """
+    Plots the channels occupancy by the reads found in the raw data files
+    :param channel_counts: a Pandas Series with the number of reads indexed by channel
+    :param result_directory: the result directory
+    :param file_type: type of the raw data files (e.g. Fast5 or POD5)
+    """
+
+    graph_name = "Channel occupancy of the flowcell ({} files)".format(file_type)
+
+    counts = channel_counts.rename_axis('channel').to_frame('reads').reset_index()
+    channel_map = _compute_channel_map(counts)
+    max_row, max_col, max_value, counts, z, ids = _channel_count_matrix(counts, channel_map)
+
+    fig = go.Figure()
+    fig.add_trace(go.Heatmap(x=list(range(1, max_col + 1)),
+                             y=list(range(1, max_row + 1)),
+                             z=z,
+                             zmax=max_value,
+                             zmin=0,
+                             name='All reads',
+                             colorbar=dict(title='Reads', len=0.6, yanchor='middle'),
+                             hovertemplate='<b>Channel ID:</b> %{text}<br>'
+                                           '<b>Row:</b> %{y}<br>'
+                                           '<b>Column:</b> %{x}<br>'
+                                           '<b>Reads:</b> %{z}<br>',
+                             text=ids,
+                             hoverongaps=False))
+
+    graph_layout = dict(default_graph_layout)
+    graph_layout['plot_bgcolor'] = 'rgba(0,0,0,0)'
+
+    fig.update_layout(
+        **_title(graph_name),
+        **graph_layout,
+        hovermode='x',
+        **_xaxis('Columns', dict(fixedrange=True)),
+        **_yaxis('Rows', dict(fixedrange=True))
+    )
+
+    table_html = None
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
+
+
+def raw_data_median_before_over_time(df, result_directory, file_type):
+    graph_name = "Open pore current over time ({} files)".format(file_type)
+
+    return _over_time_graph(data_series=df['median_before'],
+                            time_series=df['start_time'],
+                            result_directory=result_directory,
+                            graph_name=graph_name,
+                            color=toulligqc_colors['median_before_over_time'],
+                            yaxis_title='Median current before read (pA)')
+
+
+#
+# Alignment plots
+#
+
+
+def alignment_identity_distribution(identity_distribution, result_dict, result_directory):
+    """
+    Plots the distribution of the identities of the primary alignments of the reads
+    :param identity_distribution: a Pandas Series with the read counts indexed by identity (in percent)
+    :param result_dict: the result dictionary
+    :param result_directory: the result directory
+    """
+
+    graph_name = "Distribution of alignment identities"
+    return _alignment_distribution(graph_name, identity_distribution, 'Identity (%)', result_directory,
+                                   _alignment_statistics_table(result_dict))
+
+
+def alignment_accuracy_distribution(accuracy_distribution, result_directory):
+    """
+    Plots the distribution of the accuracies (Phred scale) of the primary alignments of the reads
+    :param accuracy_distribution: a Pandas Series with the read counts indexed by accuracy
+    :param result_directory: the result directory
+    """
+
+    graph_name = "Distribution of alignment accuracies"
+    return _alignment_distribution(graph_name, accuracy_distribution, 'Accuracy (PHRED score)', result_directory)
+
+
+def alignment_barcode_mapping_rate(mapping_rates, result_directory):
+    """
+    Plots the percent of mapped reads of each barcode
+    :param mapping_rates: a Pandas Series with the percent of mapped reads indexed by barcode
+    :param result_directory: the result directory
+    """
+
+    graph_name = "Mapping rate for barcodes"
+    color = toulligqc_colors['alignment']
+
+    fig = go.Figure(data=go.Bar(x=list(mapping_rates.index), y=mapping_rates.values,
+                                hovertemplate='<b>%{x}</b><br>%{y:.2f}%<extra></extra>',
+                                marker_color=_transparent_colors([color], plotly_background_color, .5)[0],
+                                marker_line_color=color,
+                                marker_line_width=line_width))
+
+    fig.update_layout(
+        **_title(graph_name),
+        **default_graph_layout,
+        hovermode='x',
+        **_xaxis('Barcodes', dict(fixedrange=True)),
+        **_yaxis('Mapped reads (%)', dict(range=[0, 100], fixedrange=True))
+    )
+
+    table_html = None
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
+
+
+def _alignment_distribution(graph_name, distribution, xaxis_title, result_directory, table_html=None):
+    color = toulligqc_colors['alignment']
+
+    # Only plot the range of the non empty bins
+    non_empty = np.flatnonzero(distribution.values)
+    distribution = distribution.iloc[non_empty[0]:non_empty[-1] + 1]
+
+    fig = go.Figure(data=go.Scatter(x=distribution.index, y=distribution.values,
+                                    name='Mapped reads',
+                                    fill='tozeroy',
+                                    line_shape='hv',
+                                    hovertemplate='%{x:.1f}<br>%{y:,} reads<extra></extra>',
+                                    marker_color=color))
+
+    fig.update_layout(
+        **_title(graph_name),
+        **default_graph_layout,
+        hovermode='x',
+        **_xaxis(xaxis_title),
+        **_yaxis('Read count', dict(rangemode="tozero"))
+    )
+
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
+
+
+def _alignment_statistics_table(result_dict):
+    prefix = 'alignment.extractor.'
+
+    dataframe = pd.DataFrame({'Mapped reads': [_format_int(result_dict[prefix + 'mapped.read.count'])],
+                              'Mapping rate': [_format_percent(result_dict[prefix + 'mapped.read.frequency'])],
+                              'Aligned yield': [_format_int(result_dict[prefix + 'aligned.yield'])],
+                              'Median identity': [_format_percent(result_dict[prefix + 'identity.50%'] * 100)],
+                              'Median accuracy': [_format_float(result_dict[prefix + 'accuracy.qscore.50%'])]},
+                             index=['value'])
+    return _dataFrame_to_html(dataframe)
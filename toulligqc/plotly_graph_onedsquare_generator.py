@@ -25,7 +25,7 @@ import pandas as pd
 import plotly.graph_objs as go
 
 from toulligqc.plotly_graph_common import _barcode_boxplot_graph
-from toulligqc.plotly_graph_common import _create_and_save_div
+from toulligqc.plotly_graph_common import _prepare_figure
 from toulligqc.plotly_graph_common import _dataFrame_to_html
 from toulligqc.plotly_graph_common import _format_float
 from toulligqc.plotly_graph_common import _format_int
@@ -151,8 +151,8 @@ def dsqr_read_count_histogram(result_dict, result_directory):
     dataframe.iloc[0] = dataframe.iloc[0].astype(int).apply(lambda x: _format_int(x))
     dataframe.iloc[1:] = dataframe.iloc[1:].applymap(_format_float)
     table_html = _dataFrame_to_html(dataframe)
-    div, output_file = _create_and_save_div(fig, result_directory, graph_name)
-    return graph_name, output_file, table_html, div
+    output_file = _prepare_figure(fig, result_directory, graph_name)
+    return graph_name, output_file, table_html, fig
 
 
 def dsqr_read_length_scatterplot(dataframe_dict_1dsqr, result_directory):
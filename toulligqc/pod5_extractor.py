@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# For more information on the ToulligQC project and its aims,
+# visit the home page at:
+#
+#      https://github.com/GenomicParisCentre/toulligQC
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# Extraction of the information about the POD5 files
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from toulligqc.fast5_extractor import set_tracking_id_values
+from toulligqc.partition_statistics import PartitionStatistics
+from toulligqc.sampling import ReservoirSampler
+from toulligqc.sequencing_summary_common import add_image_to_result
+from toulligqc.sequencing_summary_common import log_task
+from toulligqc.sequencing_summary_common import set_result_value
+
+# Number of reads kept to plot the reads over time in deep scan mode
+pod5_read_sample_size = 100000
+
+# Number of histogram bins per unit of the read durations (in seconds) and of the open pore currents (in pA)
+pod5_statistics_resolution = 1000
+
+# Per read values kept in the sample of the reads
+pod5_read_sample_dtype = np.dtype([('start_time', np.float64),
+                                   ('duration', np.float32),
+                                   ('median_before', np.float32)])
+
+
+class Pod5Extractor:
+    """
+    Extraction of the run information and of the per read metadata of POD5 files.
+    In deep scan mode, the reads are read by batches using the Arrow tables of the POD5 files and only
+    aggregated statistics and a fixed size sample of the reads are kept in memory.
+    """
+
+    def __init__(self, config_dictionary):
+        self.config_file_dictionary = config_dictionary
+        self.pod5_source = config_dictionary['pod5_source']
+        self.report_name = config_dictionary['report_name']
+        self.deep_scan = config_dictionary.get('pod5_deep_scan', 'False').lower() == 'true'
+        self.thread_count = int(config_dictionary.get('threads', '1'))
+        self.quiet = config_dictionary.get('quiet', 'False').lower() == 'true'
+        self.images_directory = config_dictionary.get('images_directory', None)
+        self.pod5_files = []
+        self.read_statistics = None
+
+    def check_conf(self):
+        """
+        Configuration checking
+        :return:
+        """
+
+        try:
+            import pod5
+        except ImportError:
+            return False, 'The pod5 Python package is required to read POD5 files (pip install pod5)'
+
+        if not os.path.exists(self.pod5_source):
+            return False, 'The input file or directory for POD5 files does not exists: ' + self.pod5_source
+
+        self.pod5_files = _find_pod5_files(self.pod5_source)
+        if len(self.pod5_files) == 0:
+            return False, 'No POD5 file found in: ' + self.pod5_source
+
+        return True, ""
+
+    def init(self):
+        """
+        Scan all the reads of the POD5 files in deep scan mode
+        """
+        if not self.deep_scan:
+            return
+
+        start_time = time.time()
+        self.read_statistics = scan_pod5_files(self.pod5_files, self.thread_count)
+        log_task(self.quiet,
+                 'Scan {:,d} reads in {:,d} POD5 files'.format(self.read_statistics.read_count, len(self.pod5_files)),
+                 start_time,
+                 time.time())
+
+    @staticmethod
+    def get_name():
+        """
+        Get the name of the extractor.
+        :return: the name of the extractor
+        """
+        return 'POD5'
+
+    @staticmethod
+    def get_report_data_file_id():
+        """
+        Get the report.data id of the extractor
+        :return: the report.data id
+        """
+        return 'pod5.extractor'
+
+    def extract(self, result_dict):
+        """
+        Extraction of the different information about the POD5 files
+        :param result_dict: Dictionary which gathers all the extracted
+        information that will be reported in the report.data file
+        :return: result_dict filled
+        """
+
+        if self.deep_scan:
+            self._extract_reads_statistics(result_dict)
+
+        run_info = _read_run_info(self.pod5_files[0])
+        if run_info is None:
+            return
+
+        set_tracking_id_values(result_dict, self.pod5_source, dict(run_info['tracking_id']))
+        if run_info['sequencing_kit']:
+            result_dict['sequencing.telemetry.extractor.sequencing.kit.version'] = run_info['sequencing_kit']
+
+    def _extract_reads_statistics(self, result_dict):
+        """
+        Put statistics about the reads found in deep scan mode in the result_dict.
+        Quartiles of read durations and open pore currents are estimated on the sample of the reads.
+        :param result_dict: Dictionary which gathers all the extracted
+        information that will be reported in the report.data file
+        """
+        stats = self.read_statistics
+
+        set_result_value(self, result_dict, 'file.count', len(self.pod5_files))
+        set_result_value(self, result_dict, 'read.count', stats.read_count)
+
+        if stats.read_count == 0:
+            return
+
+        channel_counts = stats.channel_occupancy()
+        set_result_value(self, result_dict, 'channel.count', len(channel_counts))
+        set_result_value(self, result_dict, 'sampling.rate', stats.sampling_rate)
+        set_result_value(self, result_dict, 'run.time', stats.run_time)
+
+        for index, value in channel_counts.describe().items():
+            set_result_value(self, result_dict, 'channel.occupancy.statistics.' + index, float(value))
+
+        for column, key in (('duration', 'read.duration'), ('median_before', 'median.before')):
+            statistics = stats.statistics[column].describe()
+            for index in ('mean', 'std', 'min', '25%', '50%', '75%', 'max'):
+                set_result_value(self, result_dict, key + '.' + index, statistics[index])
+
+    def graph_generation(self, result_dict):
+        """
+        Graph generation
+        :return: images array containing the title and the path toward the images
+        """
+        images = []
+
+        if not self.deep_scan or self.read_statistics is None or self.read_statistics.read_count == 0:
+            return images
+
+        from toulligqc import plotly_graph_generator as pgg
+
+        add_image_to_result(self.quiet, images, time.time(),
+                            pgg.raw_data_channel_occupancy(self.read_statistics.channel_occupancy(),
+                                                           self.images_directory, 'POD5'))
+        add_image_to_result(self.quiet, images, time.time(),
+                            pgg.raw_data_median_before_over_time(pd.DataFrame(self.read_statistics.sample()),
+                                                                 self.images_directory, 'POD5'))
+        return images
+
+    def clean(self, result_dict):
+        """
+        Removing the read statistics
+        :param result_dict: dictionary which gathers all the extracted
+        information that will be reported in the report.data file
+        :return:
+        """
+        self.read_statistics = None
+
+
+class Pod5ReadStatistics:
+    """
+    Statistics on the reads of POD5 files, updated by batches of reads. The memory used does not depend
+    on the number of reads: only the read count per channel, the statistics of the read durations and of the
+    open pore currents and a uniform sample of the reads are kept.
+    """
+
+    def __init__(self, sample_size=pod5_read_sample_size):
+        self.read_count = 0
+        self.sampling_rate = 0.0
+        self.run_time = 0.0
+        self.channel_counts = np.zeros(0, dtype=np.int64)
+        self.statistics = {'duration': PartitionStatistics(resolution=pod5_statistics_resolution),
+                           'median_before': PartitionStatistics(resolution=pod5_statistics_resolution)}
+        self._sampler = ReservoirSampler(sample_size, pod5_read_sample_dtype)
+
+    def update(self, channel, start_time, duration, median_before, sampling_rate):
+        """
+        Add a batch of reads.
+        :param channel: channels of the reads (ndarray)
+        :param start_time: start times of the reads in seconds (ndarray)
+        :param duration: durations of the reads in seconds (ndarray)
+        :param median_before: open pore currents before the reads (ndarray)
+        :param sampling_rate: sampling rates of the reads (ndarray)
+        """
+        if len(channel) == 0:
+            return
+
+        self.read_count += len(channel)
+        self.sampling_rate = max(self.sampling_rate, float(sampling_rate.max()))
+        self.run_time = max(self.run_time, float((start_time + duration).max()))
+        self._add_channel_counts(np.bincount(channel))
+        self.statistics['duration'].update(duration)
+        self.statistics['median_before'].update(median_before)
+
+        reads = np.empty(len(channel), dtype=pod5_read_sample_dtype)
+        reads['start_time'] = start_time
+        reads['duration'] = duration
+        reads['median_before'] = median_before
+        self._sampler.update(reads)
+
+    def merge(self, other):
+        """
+        Merge the statistics of another set of reads.
+        :param other: the other Pod5ReadStatistics object
+        """
+        self.read_count += other.read_count
+        self.sampling_rate = max(self.sampling_rate, other.sampling_rate)
+        self.run_time = max(self.run_time, other.run_time)
+        self._add_channel_counts(other.channel_counts)
+        for column, statistics in self.statistics.items():
+            statistics.merge(other.statistics[column])
+        self._sampler.merge(other._sampler)
+
+    def channel_occupancy(self):
+        """
+        Get the number of reads of the channels with at least one read.
+        :return: a Pandas Series with the read counts indexed by channel
+        """
+        channels = np.flatnonzero(self.channel_counts)
+        return pd.Series(self.channel_counts[channels], index=channels, name='reads')
+
+    def sample(self):
+        """
+        Get the uniform sample of the reads.
+        :return: a structured ndarray with the fields of pod5_read_sample_dtype
+        """
+        return self._sampler.sample()
+
+    def _add_channel_counts(self, counts):
+        if len(counts) > len(self.channel_counts):
+            self.channel_counts = np.pad(self.channel_counts, (0, len(counts) - len(self.channel_counts)))
+        self.channel_counts[:len(counts)] += counts
+
+
+def scan_pod5_files(paths, thread_count=1):
+    """
+    Compute the statistics of the reads of a list of POD5 files.
+    Files are read in parallel, each thread having its own file handle, and the statistics
+    of the files are merged in the order of the paths. The number of files pending merge is bounded
+    to keep the memory usage independent of the number of files.
+    :param paths: list of the paths of the POD5 files
+    :param thread_count: number of threads to use
+    :return: a Pod5ReadStatistics object
+    """
+
+    result = Pod5ReadStatistics()
+    thread_count = max(1, thread_count)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        for path in paths:
+            pending.append(executor.submit(_scan_pod5_file, path))
+            if len(pending) > 2 * thread_count:
+                result.merge(pending.popleft().result())
+
+        while pending:
+            result.merge(pending.popleft().result())
+
+    return result
+
+
+def _scan_pod5_file(path):
+    """
+    Compute the statistics of the reads of a POD5 file. Reads are processed by record batches,
+    the signal of the reads is never loaded. Start time and duration are converted from samples to seconds.
+    :param path: path of the POD5 file
+    :return: a Pod5ReadStatistics object
+    """
+    import pod5
+
+    stats = Pod5ReadStatistics()
+
+    with pod5.Reader(path) as reader:
+        run_info_table = reader.run_info_table.read_all()
+        sample_rates = dict(zip(run_info_table.column('acquisition_id').to_pylist(),
+                                run_info_table.column('sample_rate').to_pylist()))
+
+        for batch in reader.read_batches():
+            columns = batch.columns
+
+            # The run info column is dictionary encoded
+            run_info = columns.run_info
+            sampling_rate = np.array([sample_rates[acquisition_id]
+                                      for acquisition_id in run_info.dictionary.to_pylist()],
+                                     dtype=np.float64)[run_info.indices.to_numpy(zero_copy_only=False)]
+
+            stats.update(channel=columns.channel.to_numpy(zero_copy_only=False),
+                         start_time=columns.start.to_numpy(zero_copy_only=False) / sampling_rate,
+                         duration=columns.num_samples.to_numpy(zero_copy_only=False) / sampling_rate,
+                         median_before=columns.median_before.to_numpy(zero_copy_only=False),
+                         sampling_rate=sampling_rate)
+
+    return stats
+
+
+def _read_run_info(path):
+    """
+    Read the first run information of a POD5 file.
+    :param path: path of the POD5 file
+    :return: a dictionary with the run information or None if the file does not contain any run information
+    """
+    import pod5
+
+    with pod5.Reader(path) as reader:
+        run_info = reader.run_info_table.read_all().to_pylist()
+
+    return run_info[0] if len(run_info) > 0 else None
+
+
+def _find_pod5_files(source):
+    """
+    Find all the POD5 files of the source (file or directory, subdirectories included).
+    :param source: a POD5 file or a directory
+    :return: a sorted list with the paths of the POD5 files
+    """
+
+    if not os.path.isdir(source):
+        return [source] if source.endswith('.pod5') else []
+
+    result = []
+    for root, dirs, files in os.walk(source):
+        for f in files:
+            if f.endswith('.pod5'):
+                result.append(os.path.join(root, f))
+
+    return sorted(result)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains deterministic sampling methods used to reduce the size of the data to plot.
+
+import numpy as np
+
+default_random_state = 1
+
+
+def quantile_sample(values, npoints: int):
+    """
+    Get a sample of values that preserves the distribution of the data: the values returned are the order statistics
+    at evenly spaced ranks (i.e. the empirical quantiles). The whole data is not sorted, only the selected ranks
+    are placed with a partial sort. NaN values are ignored.
+    :param values: array-like data to sample
+    :param npoints: number of values to return
+    :return: a sorted ndarray with the sampled values
+    """
+
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    n = len(values)
+
+    if n <= npoints:
+        return np.sort(values)
+
+    if npoints == 1:
+        ranks = np.array([n // 2])
+    else:
+        ranks = np.unique(np.round(np.linspace(0, n - 1, npoints)).astype(np.int64))
+
+    return np.partition(values, ranks)[ranks]
+
+
+def random_sample_indices(n: int, npoints: int, random_state=default_random_state):
+    """
+    Draw uniformly the indices of a sample without replacement. The result is reproducible for a given random state.
+    :param n: size of the population
+    :param npoints: size of the sample
+    :param random_state: seed of the random generator
+    :return: a sorted ndarray with the sampled indices
+    """
+
+    if n <= npoints:
+        return np.arange(n)
+
+    rng = np.random.default_rng(random_state)
+    return np.sort(rng.choice(n, size=npoints, replace=False))
+
+
+def stratified_sample_indices(values, npoints: int, random_state=default_random_state):
+    """
+    Select a stratified sample of values: values are split in npoints strata of equal size
+    by order of value and one value is drawn in each stratum. The whole data is not sorted, only the bounds of the
+    strata are placed with a partial sort.
+    :param values: values to sample (ndarray)
+    :param npoints: number of points to select
+    :param random_state: seed of the random generator
+    :return: the indices of the selected values (ndarray)
+    """
+
+    n = len(values)
+    if n <= npoints:
+        return np.arange(n)
+
+    bounds = (np.arange(npoints + 1) * n) // npoints
+    order = np.argpartition(values, bounds[1:-1])
+    offsets = np.random.default_rng(random_state).integers(0, np.diff(bounds))
+
+    return order[bounds[:-1] + offsets]
+
+
+class ReservoirSampler:
+    """
+    Uniform sampling without replacement of a stream of values (Algorithm R).
+    Data is added by chunks, and the memory used only depends on the size of the sample.
+    """
+
+    def __init__(self, npoints: int, dtype=np.float64, random_state=default_random_state):
+        """
+        Constructor.
+        :param npoints: size of the sample
+        :param dtype: type of the values to sample
+        :param random_state: seed of the random generator
+        """
+        self._reservoir = np.empty(npoints, dtype=dtype)
+        self._npoints = npoints
+        self._seen = 0
+        self._rng = np.random.default_rng(random_state)
+
+    def update(self, chunk):
+        """
+        Add a chunk of values to the sampler.
+        :param chunk: array-like values
+        """
+
+        chunk = np.asarray(chunk)
+        n = len(chunk)
+        if n == 0:
+            return
+
+        # Fill the reservoir
+        free = min(self._npoints - min(self._seen, self._npoints), n)
+        if free > 0:
+            self._reservoir[self._seen:self._seen + free] = chunk[:free]
+
+        # Value of rank i replaces a random value of the reservoir with probability npoints / (i + 1)
+        remaining = chunk[free:]
+        if len(remaining) > 0:
+            ranks = np.arange(self._seen + free, self._seen + n) + 1
+            slots = (self._rng.random(len(remaining)) * ranks).astype(np.int64)
+            accepted = slots < self._npoints
+            self._reservoir[slots[accepted]] = remaining[accepted]
+
+        self._seen += n
+
+    def merge(self, other):
+        """
+        Merge the sample of another sampler of the same size. The merged sample is a uniform sample
+        of all the values seen by the two samplers.
+        :param other: the other sampler
+        """
+
+        total = self._seen + other._seen
+        size = min(self._npoints, total)
+        mine = self.sample()
+        theirs = other.sample()
+
+        # The number of values coming from each sampler follows a hypergeometric distribution
+        from_mine = self._rng.hypergeometric(self._seen, other._seen, size) if size > 0 else 0
+        self._reservoir[:from_mine] = mine[self._rng.choice(len(mine), from_mine, replace=False)]
+        self._reservoir[from_mine:size] = theirs[self._rng.choice(len(theirs), size - from_mine, replace=False)]
+
+        self._seen = total
+
+    def apply(self, function):
+        """
+        Replace the sampled values by the result of a function, e.g. to convert them.
+        :param function: a function taking and returning an array of values of the type of the sampler
+        """
+        size = min(self._seen, self._npoints)
+        self._reservoir[:size] = function(self._reservoir[:size])
+
+    def count(self) -> int:
+        """
+        Get the number of values seen by the sampler.
+        :return: the number of values added
+        """
+        return self._seen
+
+    def sample(self):
+        """
+        Get the current sample.
+        :return: a ndarray with the sampled values
+        """
+        return self._reservoir[:min(self._seen, self._npoints)].copy()
@@ -20,12 +20,179 @@
 
 # This module contains common methods for sequencing summary modules.
 
+import collections
+import io
+import os
 import sys
 import gzip
 import bz2
 import time
+import threading
+import numpy as np
 import pandas as pd
 from toulligqc import common
+from toulligqc.decompression import detect_compression
+from toulligqc.decompression import zstd_max_window_size
+from toulligqc.partition_statistics import barcode_codes
+from toulligqc.partition_statistics import read_types
+
+# Minimal mean Phred score of the pass reads when the pass/fail status of the reads is not provided
+default_min_pass_qscore = 7
+
+# Canonical columns of the summary files and their known names in the files written by the basecallers
+# (Albacore, Guppy, MinKNOW and Dorado), in order of preference
+summary_column_aliases = {
+    'read_id': ('read_id',),
+    'channel': ('channel',),
+    'mux': ('mux',),
+    'start_time': ('start_time',),
+    'duration': ('duration',),
+    'passes_filtering': ('passes_filtering',),
+    'sequence_length': ('sequence_length_template', 'sequence_length'),
+    'mean_qscore': ('mean_qscore_template', 'mean_qscore'),
+    'barcode_arrangement': ('barcode_arrangement', 'barcode'),
+}
+
+# Canonical columns required to use a file as a sequencing summary file
+sequencing_summary_required_columns = ('channel', 'start_time', 'duration', 'sequence_length', 'mean_qscore')
+
+# Metrics of the balance of the read counts of the barcodes
+barcode_balance_keys = ('cv', 'min.max.ratio', 'gini')
+
+# Types of summary files
+sequencing_summary_type = 'sequencing_summary'
+sequencing_summary_with_barcodes_type = 'sequencing_summary_with_barcodes'
+barcoding_summary_type = 'barcoding_summary'
+
+
+class SummarySchema:
+    """
+    Schema of a summary file: the type of the file and the names of the canonical columns in the file,
+    deduced from the header of the file.
+    """
+
+    def __init__(self, header_columns):
+        """
+        Constructor.
+        :param header_columns: list of the names of the columns of the file
+        """
+        self.columns = {}
+        for column, aliases in summary_column_aliases.items():
+            for alias in aliases:
+                if alias in header_columns:
+                    self.columns[column] = alias
+                    break
+
+        if all(c in self.columns for c in sequencing_summary_required_columns):
+            self.file_type = sequencing_summary_with_barcodes_type if 'barcode_arrangement' in self.columns \
+                else sequencing_summary_type
+        elif 'read_id' in self.columns and 'barcode_arrangement' in self.columns:
+            self.file_type = barcoding_summary_type
+        else:
+            self.file_type = None
+
+    def usecols(self, columns):
+        """
+        Get the names in the file of the canonical columns to load. Columns missing in the file are ignored.
+        :param columns: list of canonical column names
+        :return: a list of column names of the file
+        """
+        return [self.columns[c] for c in columns if c in self.columns]
+
+    def dtypes(self, datatypes):
+        """
+        Get the types of the columns to load.
+        :param datatypes: dictionary of the types of the canonical columns
+        :return: a dictionary of the types of the columns of the file
+        """
+        return {self.columns[c]: t for c, t in datatypes.items() if c in self.columns}
+
+    def canonical_names(self):
+        """
+        Get the mapping between the names of the columns of the file and the canonical names.
+        :return: a dictionary
+        """
+        return {v: k for k, v in self.columns.items()}
+
+
+class SummaryFileInfo:
+    """
+    Information about a summary file obtained by opening the file once: size, compression, header and schema.
+    """
+
+    def __init__(self, filename, size, compression, header):
+        self.filename = filename
+        self.size = size
+        self.compression = compression
+        self.header = header
+        self.schema = SummarySchema(header.rstrip('\r\n').split('\t'))
+
+
+# Maximal number of SummaryFileInfo objects kept in the cache
+summary_file_info_cache_size = 256
+
+# Cache of the SummaryFileInfo objects, indexed by path, the least recently used entries first. Entries are checked
+# against the size and the modification time of the files
+_summary_file_info_cache = collections.OrderedDict()
+
+# Lock of the cache, summary files can be probed by several threads (e.g. QCs run at the same time with the API)
+_summary_file_info_lock = threading.Lock()
+
+
+def probe_summary_file(filename):
+    """
+    Get the information about a summary file. The file is opened and its header is read only the first time,
+    the result is then cached as long as the file is not modified. Only the summary_file_info_cache_size most
+    recently probed files are kept in the cache. The compression is detected from the content of the file and not
+    from its extension.
+    :param filename: path of the file, can be compressed with gzip, bzip2 or zstd
+    :return: a SummaryFileInfo object
+    """
+
+    try:
+        stat = os.stat(filename)
+        key = os.path.abspath(filename)
+        with _summary_file_info_lock:
+            cached = _summary_file_info_cache.get(key)
+            if cached is not None and cached[0] == (stat.st_size, stat.st_mtime_ns):
+                _summary_file_info_cache.move_to_end(key)
+                return cached[1]
+
+        with open(filename, 'rb') as f:
+            compression = detect_compression(f.read(4))
+            f.seek(0)
+            if compression == 'gzip':
+                stream = gzip.GzipFile(fileobj=f)
+            elif compression == 'bz2':
+                stream = bz2.BZ2File(f)
+            elif compression == 'zstd':
+                import zstandard
+                stream = io.BufferedReader(zstandard.ZstdDecompressor(max_window_size=zstd_max_window_size)
+                                           .stream_reader(f))
+            else:
+                stream = f
+            header = stream.readline().decode('utf-8', errors='replace')
+
+    except IOError as e:
+        raise FileNotFoundError('Summary file not found: ' + filename) from e
+
+    info = SummaryFileInfo(filename, stat.st_size, compression, header)
+    with _summary_file_info_lock:
+        _summary_file_info_cache[key] = ((stat.st_size, stat.st_mtime_ns), info)
+        _summary_file_info_cache.move_to_end(key)
+        while len(_summary_file_info_cache) > summary_file_info_cache_size:
+            _summary_file_info_cache.popitem(last=False)
+
+    return info
+
+
+def read_summary_schema(filename):
+    """
+    Get the schema of a summary file.
+    :param filename: path of the file, can be compressed with gzip or bzip2
+    :return: a SummarySchema object
+    """
+    return probe_summary_file(filename).schema
 
 
 def set_result_value(extractor, result_dict, key: str, value):
@@ -66,25 +233,16 @@ def _check_result_key_value(key, value):
         raise TypeError("Invalid type for the value of the key {}: {} ".format(key, type(value)))
 
 
-def describe_dict(extractor, result_dict: dict, function, entry: str):
+def describe_dict(extractor, result_dict: dict, statistics: dict, entry: str):
     """
     Set statistics for a key like mean, min, max, median and percentiles (without the count value) filled in the _set_result_value dictionary
     :param result_dict:
-    :param function: function returning the values to describe
+    :param statistics: dictionary of statistics returned by PartitionStatistics.describe()
     :param entry: entry to put in result_dict completed with the statistics
     """
-    stats = pd.Series.describe(function).drop("count")
-    for key, value in stats.iteritems():
-        set_result_value(extractor, result_dict, entry + '.' + key, value)
-
-
-def count_boolean_elements(dataframe, column_name, boolean: bool) -> int:
-    """
-    Returns the number of values of a column filtered by a boolean
-    :param colum_name: name of the dafatrame column
-    :boolean: bool to filter
-    """
-    return len(dataframe.loc[dataframe[column_name] == bool(boolean)])
+    for key, value in statistics.items():
+        if key != 'count':
+            set_result_value(extractor, result_dict, entry + '.' + key, value)
 
 
 def series_cols_boolean_elements(dataframe, column_name1: str, column_name2: str, boolean: bool) -> pd.Series:
@@ -111,9 +269,10 @@ def sorted_series_boolean_elements_divided(dataframe, column_name1: str, column_
     return (dataframe[column_name1].loc[dataframe[column_name2] == bool(boolean)] / denominator).sort_values()
 
 
-def extract_barcode_info(extractor, result_dict, barcode_selection, dataframe_dict, df):
+def extract_barcode_info(extractor, result_dict, barcode_selection, dataframe_dict, df, read_statistics):
     """
     :param result_dict:
+    :param read_statistics: ReadStatistics object of the reads computed with the barcode selection
     Gather all barcode info for graphs : reads pass/fail and frequency per barcodes
     """
     # Add values unclassified and other to barcode list
@@ -131,19 +290,11 @@ def extract_barcode_info(extractor, result_dict, barcode_selection, dataframe_di
             sys.stderr.write("Warning: The barcode {} doesn't exist in input data\n".format(element))
 
     # Get barcodes frequency by read type
-    series_read_pass_barcode = series_cols_boolean_elements(df, "barcode_arrangement",
-                                                            "passes_filtering", True)
+    dataframe_dict["read.pass.barcoded"] = _barcode_frequency(extractor, result_dict, "read.pass.barcoded",
+                                                              read_statistics.barcode_counts('pass'))
 
-    dataframe_dict["read.pass.barcoded"] = _barcode_frequency(extractor, barcode_selection, result_dict,
-                                                              "read.pass.barcoded",
-                                                              series_read_pass_barcode)
-
-    series_read_fail_barcode = series_cols_boolean_elements(df, "barcode_arrangement",
-                                                            "passes_filtering", False)
-
-    dataframe_dict["read.fail.barcoded"] = _barcode_frequency(extractor, barcode_selection, result_dict,
-                                                              "read.fail.barcoded",
-                                                              series_read_fail_barcode)
+    dataframe_dict["read.fail.barcoded"] = _barcode_frequency(extractor, result_dict, "read.fail.barcoded",
+                                                              read_statistics.barcode_counts('fail'))
 
     read_pass_barcoded_count = get_result_value(extractor, result_dict, 'read.pass.barcoded.count')
     read_fail_barcoded_count = get_result_value(extractor, result_dict, 'read.fail.barcoded.count')
@@ -157,51 +308,52 @@ def extract_barcode_info(extractor, result_dict, barcode_selection, dataframe_di
     set_result_value(extractor, result_dict, "read.fail.barcoded.frequency",
                      (read_fail_barcoded_count / total_reads) * 100)
 
-    # Replaces all rows with unused barcodes (ie not in barcode_selection) in column barcode_arrangement with the 'other' value
-    df.loc[~df['barcode_arrangement'].isin(
-        barcode_selection), 'barcode_arrangement'] = 'other barcodes'
+    # Balance of the read counts of the selected barcodes
+    selected_barcodes = [b for b in barcode_selection if b not in ('unclassified', 'other barcodes')]
+    for entry, read_type in (('read.barcoded', 'all'), ('read.pass.barcoded', 'pass'), ('read.fail.barcoded', 'fail')):
+        balance = barcode_balance(read_statistics.barcode_counts(read_type)[selected_barcodes].values)
+        for key, value in balance.items():
+            set_result_value(extractor, result_dict, entry + '.' + key, value)
 
     if 'other barcodes' not in barcode_selection:
         barcode_selection.append('other barcodes')
 
-    # Create dataframes filtered by barcodes and read quality
-    for index_barcode, barcode in enumerate(barcode_selection):
-        barcode_all_reads_df = df[df['barcode_arrangement'] == barcode]
-        barcode_pass_reads_df = barcode_all_reads_df.loc[df['passes_filtering'] == bool(True)]
-        barcode_fail_reads_df = barcode_all_reads_df.loc[df['passes_filtering'] == bool(False)]
+    # Unused barcodes (ie not in barcode_selection) are grouped in the 'other barcodes' value with a lookup table of
+    # the codes of the categories of the barcode_arrangement column. The dataframe of the reads is left unchanged
+    barcode_groups = pd.Categorical.from_codes(barcode_codes(df['barcode_arrangement'], barcode_selection),
+                                               categories=barcode_selection)
 
-        # Add all barcode statistics to result_dict based on values of selected dataframes
-        _barcode_stats(extractor,
-                       result_dict,
-                       barcode_all_reads_df,
-                       barcode_pass_reads_df,
-                       barcode_fail_reads_df,
-                       barcode)
+    # Add all barcode statistics to result_dict
+    for barcode in barcode_selection:
+        _barcode_stats(extractor, result_dict, read_statistics, barcode)
 
     # Add filtered dataframes (all info by barcode and by length or qscore) to dataframe_dict
-    _barcode_selection_dataframe(dataframe_dict, df, "sequence_length",
+    _barcode_selection_dataframe(dataframe_dict, df, barcode_groups, "sequence_length",
                                  "barcode_selection_sequence_length_dataframe",
                                  "length")
-    _barcode_selection_dataframe(dataframe_dict, df, "mean_qscore",
+    _barcode_selection_dataframe(dataframe_dict, df, barcode_groups, "mean_qscore",
                                  "barcode_selection_sequence_phred_dataframe",
                                  "qscore")
 
 
-def _barcode_selection_dataframe(dataframe_dict, df, df_column_name: str, df_key_name: str,
+def _barcode_selection_dataframe(dataframe_dict, df, barcode_groups, df_column_name: str, df_key_name: str,
                                  melted_column_name: str):
     """
     Create custom dataframes by grouping all reads per barcodes and per read type (pass/fail) for read length or phred score info
     Reshape the dataframes from wide to long format to display barcode, read type and read length or phred score per read
     These dataframes are used for sequence length and qscore boxplots
     :param key: string name to put in dataframe_dict
+    :param barcode_groups: Categorical object with the barcode of each read of df, or 'other barcodes' for the reads
+    of the barcodes not selected
     :param df_column_name: name of the dataframe_1d column used for the new barcode_selection_dataframes
     :param melted_column_name: value (qscore or length) to use for renaming column of melted dataframe
     """
     # Count total number of rows
     nrows = df.shape[0]
     # Create a new dataframe with 3 columns : 'passes_filtering', 'barcode_arrangement' and the column name parameter
-    filtered_df = df.filter(
-        items=['passes_filtering', df_column_name, 'barcode_arrangement'])
+    filtered_df = pd.DataFrame({'passes_filtering': df['passes_filtering'].values,
+                                df_column_name: df[df_column_name].values,
+                                'barcode_arrangement': barcode_groups})
 
     # Reshape dataframe with new MultiIndex : numbered index of df length + passes filtering index and then shape data by barcode
     barcode_selection_dataframe = filtered_df.set_index([pd.RangeIndex(start=0, stop=nrows), 'passes_filtering'],
@@ -222,78 +374,80 @@ def _barcode_selection_dataframe(dataframe_dict, df, df_column_name: str, df_key
     dataframe_dict[df_key_name] = barcode_selection_dataframe
 
 
-def _barcode_stats(extractor, result_dict, barcode_selected_dataframe, barcode_selected_read_pass_dataframe,
-                   barcode_selected_read_fail_dataframe, barcode_name):
+def _barcode_stats(extractor, result_dict, read_statistics, barcode_name):
     """
     :param result_dict:
-    :param prefix: report.data id of the extractor (string)
-    :param barcode_selected: barcode filtered dataframes
-    Put statistics (with describe method) about barcode length and qscore in result_dict for each selected dataframe : all.read/read.pass and read.fail
+    :param read_statistics: ReadStatistics object of the reads
+    :param barcode_name: name of the barcode
+    Put statistics (like the describe method) about barcode length and qscore in result_dict for each read type : all.read/read.pass and read.fail
     N.b. does not include count statistic for qscore
     """
-    df_dict = {'all.read.': barcode_selected_dataframe,
-               'read.pass.': barcode_selected_read_pass_dataframe,
-               'read.fail.': barcode_selected_read_fail_dataframe}
+    for read_type, prefix in zip(read_types, ('all.read.', 'read.pass.', 'read.fail.')):
+        partitions = read_statistics.partitions(read_type, barcode_name)
 
-    for df_name, df in df_dict.items():  # df_dict.items = all.read/read.pass/read.fail
-        for stats_index, stats_value in df['sequence_length'].describe().items():
-            key_to_result_dict = df_name + barcode_name.replace(' ', '.') + '.length.' + stats_index
+        for stats_index, stats_value in read_statistics.length.describe(partitions).items():
+            key_to_result_dict = prefix + barcode_name.replace(' ', '.') + '.length.' + stats_index
             set_result_value(extractor,
                              result_dict, key_to_result_dict, stats_value)
 
-        for stats_index, stats_value in df['mean_qscore'].describe().drop('count').items():
-            key_to_result_dict = df_name + barcode_name + '.qscore.' + stats_index
-            set_result_value(extractor,
-                             result_dict, key_to_result_dict, stats_value)
+        describe_dict(extractor, result_dict, read_statistics.qscore.describe(partitions),
+                      prefix + barcode_name + '.qscore')
 
 
-def _barcode_frequency(extractor, barcode_selection, result_dict, entry: str, df_filtered) -> pd.Series:
+def _barcode_frequency(extractor, result_dict, entry: str, barcode_counts) -> pd.Series:
     """
-    Count reads by values of barcode_selection, computes sum of counts by barcode_selection, and sum of unclassified counts.
+    Computes sum of counts by barcode_selection, and sum of unclassified counts.
     Regroup all non used barcodes in index "other"
     Compute all frequency values for each number of barcoded reads
     :param result_dict: result dictionary with statistics
     :param entry: entry about barcoded counts
-    :param prefix: key prefix
+    :param barcode_counts: Series with the read counts of the barcode groups (see ReadStatistics.barcode_counts())
     :return: Series with all barcodes (used, non used, and unclassified) frequencies
     """
-    # Regroup all barcoded read in Series
-    all_barcode_count = df_filtered.value_counts()
-
-    # Retain only existing barcodes from barcode_selection list
-    barcodes_found = set(df_filtered.unique())
-    barcode_selection_existing = [x for x in barcode_selection if x in barcodes_found]
-
-    # Sort by list of barcode_selection
-    count_sorted = all_barcode_count.sort_index()[barcode_selection_existing]
-    # Replace all NaN values to zero
-    count_sorted.fillna(0, downcast='int16', inplace=True)
+    # Retain only existing barcodes from barcode_selection list, the 'other barcodes' count is always kept
+    other_barcode_count = int(barcode_counts['other barcodes'])
+    is_other = barcode_counts.index == 'other barcodes'
+    count_sorted = barcode_counts[(barcode_counts > 0) | is_other].sort_index()
 
     # Compute sum of all used barcodes without barcode 'unclassified'
-    set_result_value(extractor, result_dict, entry + '.count', sum(count_sorted.drop("unclassified")))
+    set_result_value(extractor, result_dict, entry + '.count',
+                     int(barcode_counts[~is_other & (barcode_counts.index != 'unclassified')].sum()))
 
     # Replace entry name ie read.pass/fail.barcode with read.pass/fail.non.used.barcodes.count
     non_used_barcodes_count_key = entry.replace(".barcoded", ".non.used.barcodes.count")
 
-    # Compute all reads of barcodes that are not in the barcode_selection list
-    other_barcode_count = sum(all_barcode_count) - sum(count_sorted)
+    # Reads of barcodes that are not in the barcode_selection list
     set_result_value(extractor, result_dict, non_used_barcodes_count_key, other_barcode_count)
 
-    # Create Series for all non-used barcode counts and rename index array with "other"
-    other_all_barcode_count = pd.Series(other_barcode_count, index=['other barcodes'])
-
-    # Append Series of non-used barcode counts to the Series of barcode_selection counts
-    count_sorted = count_sorted.append(other_all_barcode_count).sort_index()
-
     # Compute frequency for all barcode counts and save into dataframe_dict
-    for barcode in count_sorted.to_dict():
-        frequency_value = count_sorted[barcode] * 100 / sum(count_sorted)
+    frequencies = count_sorted * 100 / count_sorted.sum()
+    for barcode, frequency in frequencies.items():
         set_result_value(extractor, result_dict, entry.replace(".barcoded", ".") + barcode + ".frequency",
-                         frequency_value)
+                         float(frequency))
 
     return count_sorted
 
 
+def barcode_balance(read_counts) -> dict:
+    """
+    Compute the metrics of the balance of the read counts of barcodes: the coefficient of variation, the ratio
+    between the lowest and the highest read counts and the Gini coefficient (0 when all the barcodes have the same
+    number of reads, close to 1 when a barcode has all the reads)
+    :param read_counts: array of the read counts of the barcodes
+    :return: dictionary with the keys of barcode_balance_keys, values are NaN if there is no read
+    """
+    counts = np.sort(np.asarray(read_counts, dtype=np.float64))
+    total = counts.sum()
+    if total == 0:
+        return dict.fromkeys(barcode_balance_keys, np.nan)
+
+    n = len(counts)
+    mean = total / n
+    return {'cv': float(counts.std() / mean),
+            'min.max.ratio': float(counts[0] / counts[-1]),
+            'gini': float(2 * np.sum(np.arange(1, n + 1) * counts) / (n * total) - (n + 1) / n)}
+
+
 def log_task(quiet, msg, start_time, end_time):
     if not quiet:
         delta = end_time - start_time
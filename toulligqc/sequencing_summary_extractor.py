@@ -25,15 +25,17 @@
 
 # Extraction of statistics from sequencing_summary.txt file (1D chemistry)
 
+import io
 import sys
+import tempfile
 import time
 
 import numpy as np
 import pandas as pd
 
 from toulligqc import plotly_graph_generator as pgg
+from toulligqc.channel_activity import ChannelActivity
 from toulligqc.sequencing_summary_common import check_result_values
-from toulligqc.sequencing_summary_common import count_boolean_elements
 from toulligqc.sequencing_summary_common import describe_dict
 from toulligqc.sequencing_summary_common import extract_barcode_info
 from toulligqc.sequencing_summary_common import get_result_value
@@ -41,8 +43,69 @@ from toulligqc.sequencing_summary_common import series_cols_boolean_elements
 from toulligqc.sequencing_summary_common import set_result_value
 from toulligqc.sequencing_summary_common import log_task
 from toulligqc.sequencing_summary_common import add_image_to_result
-from toulligqc.sequencing_summary_common import read_first_line_file
+from toulligqc.sequencing_summary_common import probe_summary_file
+from toulligqc.sequencing_summary_common import read_summary_schema
+from toulligqc.sequencing_summary_common import default_min_pass_qscore
+from toulligqc.sequencing_summary_common import barcoding_summary_type
+from toulligqc.sequencing_summary_common import sequencing_summary_type
+from toulligqc.sequencing_summary_common import sequencing_summary_with_barcodes_type
 from toulligqc.common import is_numpy_1_24
+from toulligqc.decompression import open_decompressed
+from toulligqc.execution_plan import chunked_mode
+from toulligqc.execution_plan import memory_budget
+from toulligqc.execution_plan import out_of_core_mode
+from toulligqc.execution_plan import plan_execution
+from toulligqc.execution_plan import sharded_mode
+from toulligqc.out_of_core import PartialResults
+from toulligqc.out_of_core import SpillFiles
+from toulligqc.out_of_core import chunk_line_count
+from toulligqc.out_of_core import out_of_core_memory_factor
+from toulligqc.out_of_core import out_of_core_sample_size
+from toulligqc.out_of_core import partition_groups
+from toulligqc.out_of_core import read_id_hashes
+from toulligqc.partition_statistics import PartitionStatistics
+from toulligqc.sharding import create_executor
+from toulligqc.sharding import summary_shards
+
+sequencing_summary_columns = ('channel', 'mux', 'start_time', 'passes_filtering', 'sequence_length', 'mean_qscore',
+                              'duration')
+
+sequencing_summary_datatypes = {
+    'channel': np.int16,
+    'mux': np.uint8,
+    'start_time': np.float64,
+    'passes_filtering': np.bool_ if is_numpy_1_24 else np.bool,
+    'sequence_length': np.uint32,
+    'mean_qscore': np.float32,
+    'duration': np.float32}
+
+# Records of the spilled barcodes of the barcoding summary files
+barcode_record_type = [('read_id_hash1', np.uint64), ('read_id_hash2', np.uint64), ('barcode_arrangement', np.int32)]
+
+
+class SummaryLayout:
+    """
+    Summary files of the extractor and columns to load. The columns are the columns found in all the sequencing
+    summary files, so the chunks, the shards and the spill files of all the files have the same columns.
+    """
+
+    def __init__(self, files, is_barcode):
+        """
+        Constructor.
+        :param files: list of the paths of the summary files
+        :param is_barcode: True if the reads have barcodes
+        """
+        infos = [probe_summary_file(f) for f in files]
+        self.summary_infos = [info for info in infos if info.schema.file_type in (sequencing_summary_type,
+                                                                                  sequencing_summary_with_barcodes_type)]
+        self.barcoding_infos = [info for info in infos if info.schema.file_type == barcoding_summary_type]
+
+        # Barcodes of the barcoding summary files are used instead of the barcodes of the sequencing summaries
+        self.join = is_barcode and len(self.barcoding_infos) > 0
+
+        self.columns = [c for c in sequencing_summary_columns
+                        if c == 'passes_filtering' or all(c in info.schema.columns for info in self.summary_infos)]
+
 
 class SequencingSummaryExtractor:
     """
@@ -58,18 +121,42 @@ class SequencingSummaryExtractor:
         :param config_dictionary: dictionary containing all files or directories paths for sequencing_summary.txt and barcoding files
         """
         self.config_dictionary = config_dictionary
-        self.sequencing_summary_source = config_dictionary['sequencing_summary_source']
         self.images_directory = config_dictionary['images_directory']
-        self.sequencing_summary_files = self.sequencing_summary_source.split('\t')
+        self.thread_count = int(config_dictionary.get('threads', '1'))
+        self.out_of_core = config_dictionary.get('out_of_core', 'False').lower() == 'true'
+        self.max_memory = memory_budget(config_dictionary.get('max_memory', None))
+        self.worker_count = int(config_dictionary.get('workers', '1'))
+        self.execution_plan = None
+        self.partial_results = None
+        self._layout = None
+
+        # Sequencing summary files always have the channel, the start time and the duration of the reads
+        self.has_channel = True
+        self.has_start_time = True
+        self.has_duration = True
+
+        # Executor of the shards of the sequencing summary files, local worker processes are used if None
+        self.executor = None
         if 'quiet' not in config_dictionary or config_dictionary['quiet'].lower() != 'true':
             self.quiet = False
         else:
             self.quiet = True
 
+        self._init_sources(config_dictionary)
+
+    def _init_sources(self, config_dictionary):
+        """
+        Set the input files of the extractor and check if their reads have barcodes. Extractors of other per read
+        files override this method.
+        :param config_dictionary: dictionary containing all files or directories paths for sequencing_summary.txt and barcoding files
+        """
+        self.sequencing_summary_source = config_dictionary['sequencing_summary_source']
+        self.sequencing_summary_files = self.sequencing_summary_source.split('\t')
+
         self.is_barcode = False
         if config_dictionary['barcoding'] == 'True':
             for f in self.sequencing_summary_files:
-                if self._is_barcode_file(f) or self._is_sequencing_summary_with_barcodes(f):
+                if read_summary_schema(f).file_type in (barcoding_summary_type, sequencing_summary_with_barcodes_type):
                     self.is_barcode = True
 
     def check_conf(self):
@@ -85,7 +172,7 @@ class SequencingSummaryExtractor:
         while not found:
             for f in self.sequencing_summary_files:
                 try:
-                    if self._is_sequencing_summary_file(f) or self._is_sequencing_summary_with_barcodes(f):
+                    if read_summary_schema(f).file_type in (sequencing_summary_type, sequencing_summary_with_barcodes_type):
                         found = True
                 except FileNotFoundError:
                     return False, "No such file or directory " + f
@@ -103,14 +190,26 @@ class SequencingSummaryExtractor:
 
         start_time = time.time()
 
-        self.dataframe_1d = self._load_sequencing_summary_data()
+        if self.is_barcode:
+            self.barcode_selection = self.config_dictionary['barcode_selection']
+
+        self.execution_plan = self._plan_execution()
+
+        # Only a sample of the reads is kept in memory for the graphs when the files are not loaded in memory
+        if self.execution_plan.mode == sharded_mode:
+            self.partial_results = self._load_shards()
+            self.dataframe_1d = self.partial_results.sample_dataframe()
+        elif self.execution_plan.mode == out_of_core_mode:
+            self.partial_results = self._load_out_of_core()
+            self.dataframe_1d = self.partial_results.sample_dataframe()
+        elif self.execution_plan.mode == chunked_mode:
+            self.partial_results = self._load_chunks()
+            self.dataframe_1d = self.partial_results.sample_dataframe()
+        else:
+            self.dataframe_1d = self._load_sequencing_summary_data()
         if self.dataframe_1d.empty:
             raise pd.errors.EmptyDataError("Dataframe is empty")
 
-        # Rename 'sequence_length_template' and 'mean_qscore_template'
-        self.dataframe_1d.rename(columns={'sequence_length_template': 'sequence_length',
-                                          'mean_qscore_template': 'mean_qscore'}, inplace=True)
-
         # Add missing categories
         if 'barcode_arrangement' in self.dataframe_1d.columns:
             self.dataframe_1d['barcode_arrangement'].cat.add_categories([0, 'other barcodes', 'passes_filtering'],
@@ -122,9 +221,6 @@ class SequencingSummaryExtractor:
         # Dictionary for storing all pd.Series and pd.Dataframe entries
         self.dataframe_dict = {}
 
-        if self.is_barcode:
-            self.barcode_selection = self.config_dictionary['barcode_selection']
-
         log_task(self.quiet,
                  'Load sequencing summary file ({:,.2f} MB used)'.format(self.dataframe_1d.memory_usage(deep=True).sum()/1024/1024),
                  start_time,
@@ -160,16 +256,33 @@ class SequencingSummaryExtractor:
 
         self._fill_series_dict(self.dataframe_dict, self.dataframe_1d)
 
+        # Statistics of the length and of the qscore of the pass and fail reads of each barcode, computed while
+        # loading the reads in out-of-core mode
+        if self.partial_results is None:
+            self.partial_results = PartialResults(self.barcode_selection if self.is_barcode else None,
+                                                  with_channel_activity=False)
+            self.partial_results.update(self.dataframe_1d)
+        read_statistics = self.partial_results.read_statistics
+
+        # Loading mode of the sequencing summary files
+        if self.execution_plan is not None:
+            set_result_value(self, result_dict, "execution.plan", self.execution_plan.mode)
+            set_result_value(self, result_dict, "execution.plan.max.memory", self.execution_plan.max_memory)
+            set_result_value(self, result_dict, "execution.plan.estimated.read.count",
+                             self.execution_plan.estimated_read_count)
+            set_result_value(self, result_dict, "execution.plan.estimated.memory",
+                             self.execution_plan.estimated_memory)
+
         # Read count
-        set_result_value(self, result_dict, "read.count", len(self.dataframe_1d))
+        set_result_value(self, result_dict, "read.count", read_statistics.length.count())
 
         # 1D pass information : count, length, qscore values and sorted Series
         set_result_value(self, result_dict, "read.pass.count",
-                         count_boolean_elements(self.dataframe_1d, 'passes_filtering', True))
+                         read_statistics.length.count(read_statistics.partitions('pass')))
 
         # 1D fail information : count, length, qscore values and sorted Series
         set_result_value(self, result_dict, "read.fail.count",
-                         count_boolean_elements(self.dataframe_1d, 'passes_filtering', False))
+                         read_statistics.length.count(read_statistics.partitions('fail')))
 
         total_reads = get_result_value(self, result_dict, "read.count")
 
@@ -193,12 +306,23 @@ class SequencingSummaryExtractor:
                          result_dict, "read.fail.frequency", read_fail_frequency)
 
         # Yield, n50, run time
-        set_result_value(self, result_dict, "yield", sum(self.dataframe_dict["all.reads.sequence.length"]))
+        set_result_value(self, result_dict, "yield", int(read_statistics.length.sum()))
+
+        n50, l50 = read_statistics.length.nxx(50)
+        set_result_value(self, result_dict, "n50", n50)
+        set_result_value(self, result_dict, "l50", l50)
 
-        set_result_value(self, result_dict, "n50", self._compute_NXX(50))
-        set_result_value(self, result_dict, "l50", self._compute_LXX(50))
+        set_result_value(self, result_dict, "run.time", self.partial_results.run_time)
 
-        set_result_value(self, result_dict, "run.time", max(self.dataframe_1d['start_time']))
+        # Metrics of the time windows of the run, the metrics of the reads are only set for non empty windows
+        if self.has_start_time:
+            time_windows = self.partial_results.time_windows
+            set_result_value(self, result_dict, "time.window.duration", time_windows.window_duration)
+            set_result_value(self, result_dict, "time.window.count", time_windows.window_count)
+            for window, metrics in enumerate(time_windows.metrics().to_dict('records')):
+                for key, value in metrics.items():
+                    if metrics['read.count'] > 0 or key in ('start', 'end', 'read.count', 'yield'):
+                        set_result_value(self, result_dict, "time.window.{}.{}".format(window, key), value)
 
         # Get channel occupancy statistics and store each value into result_dict
         for index, value in self._occupancy_channel().items():
@@ -206,35 +330,31 @@ class SequencingSummaryExtractor:
                              result_dict, "channel.occupancy.statistics." + index, value)
 
         # Get statistics about all reads length and store each value into result_dict
-        sequence_length_statistics = self.dataframe_dict["all.reads.sequence.length"].describe()
-
-        for index, value in sequence_length_statistics.items():
+        for index, value in read_statistics.length.describe().items():
             set_result_value(self,
                              result_dict, "all.read.length." + index, value)
 
         # Add statistics (without count) about read pass/fail length in the result_dict
-        describe_dict(self, result_dict, self.dataframe_dict["pass.reads.sequence.length"],
+        describe_dict(self, result_dict, read_statistics.length.describe(read_statistics.partitions('pass')),
                       "pass.reads.sequence.length")
-        describe_dict(self, result_dict, self.dataframe_dict["fail.reads.sequence.length"],
+        describe_dict(self, result_dict, read_statistics.length.describe(read_statistics.partitions('fail')),
                       "fail.reads.sequence.length")
 
         # Get Qscore statistics without count value and store them into result_dict
-        qscore_statistics = self.dataframe_1d['mean_qscore'].describe().drop(
-            "count")
-
-        for index, value in qscore_statistics.items():
-            set_result_value(self,
-                             result_dict, "all.read.qscore." + index, value)
+        describe_dict(self, result_dict, read_statistics.qscore.describe(), "all.read.qscore")
 
         # Add statistics (without count) about read pass/fail qscore in the result_dict
-        describe_dict(self, result_dict, self.dataframe_dict["pass.reads.mean.qscore"], "pass.reads.mean.qscore")
-        describe_dict(self, result_dict, self.dataframe_dict["fail.reads.mean.qscore"], "fail.reads.mean.qscore")
+        describe_dict(self, result_dict, read_statistics.qscore.describe(read_statistics.partitions('pass')),
+                      "pass.reads.mean.qscore")
+        describe_dict(self, result_dict, read_statistics.qscore.describe(read_statistics.partitions('fail')),
+                      "fail.reads.mean.qscore")
 
         if self.is_barcode:
             extract_barcode_info(self, result_dict,
                                  self.barcode_selection,
                                  self.dataframe_dict,
-                                 self.dataframe_1d)
+                                 self.dataframe_1d,
+                                 read_statistics)
 
         log_task(self.quiet, 'Extract info from sequencing summary file', start_time, time.time())
 
@@ -269,22 +389,42 @@ class SequencingSummaryExtractor:
 
     def graph_generation(self, result_dict):
         """
-        Generation of the different graphs containing in the plotly_graph_generator module
+        Generation of the different graphs containing in the plotly_graph_generator module. The graphs that require
+        the channel, the start time or the duration of the reads are only generated when the reads have these values.
         :return: images array containing the title and the path toward the images
         """
         images = list()
 
+        # Number of reads represented by each read of the dataframe, the dataframe is a sample in out-of-core mode
+        read_weight = self.partial_results.read_statistics.length.count() / len(self.dataframe_1d)
+
         add_image_to_result(self.quiet, images, time.time(), pgg.read_count_histogram(result_dict, self.images_directory))
-        add_image_to_result(self.quiet, images, time.time(), pgg.read_length_scatterplot(self.dataframe_dict, self.images_directory))
-        add_image_to_result(self.quiet, images, time.time(), pgg.yield_plot(self.dataframe_1d, self.images_directory))
+        add_image_to_result(self.quiet, images, time.time(), pgg.read_length_scatterplot(self.dataframe_dict, self.images_directory,
+                                                                                         read_weight))
+        if self.has_start_time:
+            add_image_to_result(self.quiet, images, time.time(), pgg.yield_plot(self.dataframe_1d, self.images_directory,
+                                                                                 read_weight=read_weight))
         add_image_to_result(self.quiet, images, time.time(), pgg.read_quality_multiboxplot(self.dataframe_dict, self.images_directory))
         add_image_to_result(self.quiet, images, time.time(), pgg.allphred_score_frequency(self.dataframe_dict, self.images_directory))
-        add_image_to_result(self.quiet, images, time.time(), pgg.plot_performance(self.dataframe_1d, self.images_directory))
+        if self.has_channel:
+            add_image_to_result(self.quiet, images, time.time(), pgg.plot_performance(self._channel_read_count_dataframe(),
+                                                                                      self.images_directory))
+
+        if self.has_channel and self.has_start_time:
+            channel_activity = self._channel_activity_over_time()
+            add_image_to_result(self.quiet, images, time.time(), pgg.channel_activity_over_time(channel_activity, self.images_directory))
+            add_image_to_result(self.quiet, images, time.time(), pgg.channel_throughput_over_time(channel_activity, self.images_directory))
+            add_image_to_result(self.quiet, images, time.time(), pgg.channel_survival(channel_activity, self.images_directory))
+        if self.has_start_time:
+            add_image_to_result(self.quiet, images, time.time(), pgg.time_window_metrics(self.partial_results.time_windows,
+                                                                                         self.images_directory))
 
         add_image_to_result(self.quiet, images, time.time(), pgg.all_scatterplot(self.dataframe_dict, self.images_directory))
-        add_image_to_result(self.quiet, images, time.time(), pgg.sequence_length_over_time(self.dataframe_dict, self.images_directory))
-        add_image_to_result(self.quiet, images, time.time(), pgg.phred_score_over_time(self.dataframe_dict, result_dict, self.images_directory))
-        add_image_to_result(self.quiet, images, time.time(), pgg.speed_over_time(self.dataframe_dict, self.images_directory))
+        if self.has_start_time:
+            add_image_to_result(self.quiet, images, time.time(), pgg.sequence_length_over_time(self.dataframe_dict, self.images_directory))
+            add_image_to_result(self.quiet, images, time.time(), pgg.phred_score_over_time(self.dataframe_dict, result_dict, self.images_directory))
+        if self.has_start_time and self.has_duration:
+            add_image_to_result(self.quiet, images, time.time(), pgg.speed_over_time(self.dataframe_dict, self.images_directory))
 
         if self.is_barcode:
             add_image_to_result(self.quiet, images, time.time(), pgg.barcode_percentage_pie_chart_pass(self.dataframe_dict,
@@ -300,8 +440,31 @@ class SequencingSummaryExtractor:
 
             add_image_to_result(self.quiet, images, time.time(), pgg.barcoded_phred_score_frequency(self.dataframe_dict,
                                                                                                     self.images_directory))
+
+            if self.has_start_time:
+                add_image_to_result(self.quiet, images, time.time(), pgg.barcode_yield_over_time(self.partial_results.barcode_activity,
+                                                                                                 self.images_directory))
+                add_image_to_result(self.quiet, images, time.time(), pgg.barcode_throughput_over_time(self.partial_results.barcode_activity,
+                                                                                                      self.images_directory))
         return images
 
+    def _channel_read_count_dataframe(self):
+        """
+        Get the number of pass and fail reads of the channels for the channel occupancy graph.
+        :return: a Pandas Dataframe with the channel, passes_filtering and read_count columns
+        """
+        return self.partial_results.channel_read_count_dataframe()
+
+    def _channel_activity_over_time(self):
+        """
+        Get the reads aggregated by channel and time bin for the graphs of the channels over time.
+        :return: a ChannelActivity object
+        """
+        channel_activity = self.partial_results.channel_activity
+        if channel_activity is None:
+            channel_activity = self._channel_activity(self.dataframe_1d)
+        return channel_activity
+
     def clean(self, result_dict):
         """
         Removing dictionary entries that will not be kept in the report.data file
@@ -317,38 +480,58 @@ class SequencingSummaryExtractor:
         # Clear DataFrame
         self.dataframe_1d.iloc[0:0]
 
+    @staticmethod
+    def _channel_activity(dataframe):
+        """
+        Aggregate the reads by channel and time bin.
+        :param dataframe: a dataframe with the channel, start_time and sequence_length columns and optionally the
+        duration and mux columns
+        :return: a ChannelActivity object
+        """
+        return ChannelActivity.from_dataframe(dataframe)
+
     def _occupancy_channel(self):
         """
         Statistics about the channels of the flowcell
-        :return: pd.Series object containing statistics about the channel occupancy without count value
+        :return: dictionary containing statistics about the number of reads of the channels
         """
-        total_reads_per_channel = pd.value_counts(self.dataframe_1d["channel"])
-        return pd.DataFrame.describe(total_reads_per_channel)
+        return self._read_count_statistics(self.partial_results.channel_read_counts.sum(axis=1))
+
+    @staticmethod
+    def _channel_read_count_statistics(channels):
+        """
+        Statistics about the number of reads of the channels with at least one read.
+        :param channels: array of the channels of the reads
+        :return: dictionary of statistics like pandas.Series.describe()
+        """
+        return SequencingSummaryExtractor._read_count_statistics(np.bincount(channels.astype(np.int64)))
+
+    @staticmethod
+    def _read_count_statistics(read_counts):
+        """
+        Statistics about the number of reads of the channels with at least one read.
+        :param read_counts: array of the number of reads of each channel
+        :return: dictionary of statistics like pandas.Series.describe()
+        """
+        statistics = PartitionStatistics()
+        statistics.update(read_counts[read_counts > 0])
+        return statistics.describe()
 
     def _load_sequencing_summary_data(self):
         """
-        Load sequencing summary dataframe with or without barcodes
+        Load sequencing summary dataframe with or without barcodes. The header of each file is read once to
+        get its schema: only the required columns are loaded and they are renamed with their canonical names
         :return: a Pandas Dataframe object
         """
         # Initialization
         files = self.sequencing_summary_files
+        infos = [probe_summary_file(f) for f in files]
 
         summary_dataframe = None
         barcode_dataframe = None
 
-        sequencing_summary_columns = ['channel', 'start_time',
-                                      'passes_filtering',
-                                      'sequence_length_template',
-                                      'mean_qscore_template',
-                                      'duration']
-
-        sequencing_summary_datatypes = {
-            'channel': np.int16,
-            'start_time': np.float64,
-            'passes_filtering': np.bool_ if is_numpy_1_24 else np.bool,
-            'sequence_length_template': np.uint32,
-            'mean_qscore_template': np.float32,
-            'duration': np.float32}
+        summary_columns = list(sequencing_summary_columns)
+        summary_datatypes = dict(sequencing_summary_datatypes)
 
         # If barcoding files are provided, merging of dataframes must be done on read_id column
         barcoding_summary_columns = ['read_id', 'barcode_arrangement']
@@ -360,26 +543,29 @@ class SequencingSummaryExtractor:
 
         try:
             # If 1 file and it's a sequencing_summary.txt
-            if len(files) == 1 and self._is_sequencing_summary_file(files[0]):
-                return pd.read_csv(files[0], sep="\t", usecols=sequencing_summary_columns,
-                                   dtype=sequencing_summary_datatypes)
+            if len(files) == 1 and infos[0].schema.file_type == sequencing_summary_type:
+                return self._read_summary_file(infos[0], summary_columns,
+                                               summary_datatypes)
 
             # If 1 file and it's a sequencing_summary.txt with barcode info, load column barcode_arrangement
-            elif len(files) == 1 and self._is_sequencing_summary_with_barcodes(files[0]):
-                sequencing_summary_columns.append('barcode_arrangement')
-                sequencing_summary_datatypes.update(
+            elif len(files) == 1 and infos[0].schema.file_type == sequencing_summary_with_barcodes_type:
+                summary_columns.append('barcode_arrangement')
+                summary_datatypes.update(
                     {'barcode_arrangement': 'category'})
 
-                return pd.read_csv(files[0], sep="\t", usecols=sequencing_summary_columns,
-                                   dtype=sequencing_summary_datatypes)
+                return _normalize_barcode_names(self._read_summary_file(infos[0], summary_columns,
+                                                                        summary_datatypes))
 
             # If multiple files, check if there's a barcoding one and a sequencing one :
-            for f in files:
+            summary_columns.append('read_id')
+            summary_datatypes.update({'read_id': object})
+
+            for info in infos:
 
                 # check for presence of barcoding files
-                if self._is_barcode_file(f):
-                    dataframe = pd.read_csv(
-                        f, sep="\t", usecols=barcoding_summary_columns, dtype=barcoding_summary_datatypes)
+                if info.schema.file_type == barcoding_summary_type:
+                    dataframe = self._read_summary_file(info, barcoding_summary_columns,
+                                                        barcoding_summary_datatypes)
                     if barcode_dataframe is None:
                         barcode_dataframe = dataframe
                     # if a barcoding file has already been read, append the 2 dataframes
@@ -387,25 +573,29 @@ class SequencingSummaryExtractor:
                         barcode_dataframe = barcode_dataframe.append(
                             dataframe, ignore_index=True)
 
-                # check for presence of sequencing_summary file, if True add column read_id for merging with barcode dataframe
-                else:
-                    if self._is_sequencing_summary_file(f):
-                        sequencing_summary_columns.append('read_id')
-                        sequencing_summary_datatypes.update(
-                            {'read_id': object})
-
-                        dataframe = pd.read_csv(f, sep="\t", usecols=sequencing_summary_columns,
-                                                dtype=sequencing_summary_datatypes)
-                        if summary_dataframe is None:
-                            summary_dataframe = dataframe
-                        else:
-                            summary_dataframe = summary_dataframe.append(
-                                dataframe, ignore_index=True)
+                # check for presence of sequencing_summary file, read_id column is loaded for merging with barcode dataframe
+                elif info.schema.file_type in (sequencing_summary_type, sequencing_summary_with_barcodes_type):
+                    dataframe = self._read_summary_file(info,
+                                                        summary_columns + ['barcode_arrangement'],
+                                                        dict(summary_datatypes,
+                                                             barcode_arrangement='category'))
+                    if summary_dataframe is None:
+                        summary_dataframe = dataframe
+                    else:
+                        summary_dataframe = summary_dataframe.append(
+                            dataframe, ignore_index=True)
 
-            if barcode_dataframe is None:
+            if barcode_dataframe is None and 'barcode_arrangement' in summary_dataframe.columns:
+                # Sequencing summary files with barcode info
+                summary_dataframe['barcode_arrangement'] = summary_dataframe['barcode_arrangement'] \
+                    .astype(object).fillna('unclassified').astype('category')
+                return _normalize_barcode_names(summary_dataframe.drop(columns=['read_id']))
+            elif barcode_dataframe is None:
                 # If no barcodes in files, no merged dataframes on column 'read_id'
                 return summary_dataframe.drop(columns=['read_id'])
             else:
+                # Barcodes of the barcoding summary files are used instead of the barcodes of the sequencing summaries
+                summary_dataframe = summary_dataframe.drop(columns=['barcode_arrangement'], errors='ignore')
                 dataframes_merged = pd.merge(
                     summary_dataframe, barcode_dataframe, on='read_id', how='left')
 
@@ -424,65 +614,531 @@ class SequencingSummaryExtractor:
                 # Set 'barcode_arrangement' column type as category
                 dataframes_merged['barcode_arrangement'] = dataframes_merged['barcode_arrangement'].astype('category')
 
-                return dataframes_merged
-
-        except IOError:
-            raise FileNotFoundError("Sequencing summary file not found")
-
-    def _compute_NXX(self, x):
-        """Compute NXX value of total sequence length"""
-        data = self.dataframe_dict["all.reads.sequence.length"].dropna().values
-        data.sort()
-        half_sum = data.sum() * x / 100
-        cum_sum = 0
-        for v in data:
-            cum_sum += v
-            if cum_sum >= half_sum:
-                return int(v)
-
-    def _compute_LXX(self, x):
-        """Compute LXX value of total sequence length"""
-        data = self.dataframe_dict["all.reads.sequence.length"].dropna().values
-        data.sort()
-        half_sum = data.sum() * x / 100
-        cum_sum = 0
-        count = 0
-        for v in data:
-            cum_sum += v
-            count += 1
-            if cum_sum >= half_sum:
-                return count
+                return _normalize_barcode_names(dataframes_merged)
+
+        except IOError as e:
+            raise FileNotFoundError("Sequencing summary file not found: {}".format(
+                e.filename if e.filename else ', '.join(files))) from e
+
+    def _read_summary_file(self, info, columns, datatypes, byte_range=None):
+        """
+        Load the columns of a summary file and rename them with their canonical names.
+        When the file does not contain the pass/fail status of the reads, the status is computed
+        from the mean Phred score of the reads. Compressed files are decompressed by background threads while they
+        are parsed.
+        :param info: the SummaryFileInfo object of the file
+        :param columns: list of the canonical names of the columns to load
+        :param datatypes: dictionary of the types of the canonical columns
+        :param byte_range: (start, end) tuple of the positions of the lines to load in an uncompressed file, all the
+        lines are loaded if None
+        :return: a Pandas Dataframe object
+        """
+        if info.compression is None:
+            if byte_range is None:
+                source = info.filename
+            else:
+                with open(info.filename, 'rb') as f:
+                    header = f.readline()
+                    f.seek(max(byte_range[0], len(header)))
+                    source = io.BytesIO(header + f.read(max(0, byte_range[1] - f.tell())))
+            dataframe = pd.read_csv(source, sep="\t", usecols=info.schema.usecols(columns),
+                                    dtype=info.schema.dtypes(datatypes))
+        else:
+            with open_decompressed(info.filename, info.compression, self.thread_count) as f:
+                dataframe = pd.read_csv(f, sep="\t", usecols=info.schema.usecols(columns),
+                                        dtype=info.schema.dtypes(datatypes))
+
+        return _canonical_dataframe(info, dataframe, columns)
+
+    def _read_summary_file_chunks(self, info, columns, datatypes):
+        """
+        Load the columns of a summary file by chunks of lines, the size of the chunks depends on the memory ceiling.
+        :param info: the SummaryFileInfo object of the file
+        :param columns: list of the canonical names of the columns to load
+        :param datatypes: dictionary of the types of the canonical columns
+        :return: a generator of Pandas Dataframe objects
+        """
+        if info.compression is None:
+            f = open(info.filename, 'rb')
+        else:
+            f = open_decompressed(info.filename, info.compression, self.thread_count)
+
+        with f, pd.read_csv(f, sep="\t", usecols=info.schema.usecols(columns), dtype=info.schema.dtypes(datatypes),
+                            chunksize=chunk_line_count(self.max_memory)) as reader:
+            for dataframe in reader:
+                yield _canonical_dataframe(info, dataframe, columns)
+
+    def _summary_layout(self):
+        """
+        Get the summary files and the columns to load. The files are probed only the first time.
+        :return: a SummaryLayout object
+        """
+        if self._layout is None:
+            self._layout = SummaryLayout(self.sequencing_summary_files, self.is_barcode)
+        return self._layout
+
+    def _plan_execution(self):
+        """
+        Choose the loading mode of the sequencing summary files from their size, their compression and the columns
+        to load, under the memory budget.
+        :return: an ExecutionPlan object
+        """
+        start_time = time.time()
+
+        layout = self._summary_layout()
+        columns = layout.columns + (['barcode_arrangement'] if self.is_barcode else [])
+        plan = plan_execution(layout.summary_infos, columns,
+                              dict(sequencing_summary_datatypes, barcode_arrangement='category'), self.max_memory,
+                              layout.join, self.out_of_core, self.worker_count > 1 or self.executor is not None)
+
+        log_task(self.quiet,
+                 'Plan the loading of the sequencing summary files ({} mode, {:,.2f} MB estimated for {:,d} reads)'
+                 .format(plan.mode, plan.estimated_memory / 1024 / 1024, plan.estimated_read_count),
+                 start_time,
+                 time.time())
+
+        return plan
+
+    def _load_chunks(self):
+        """
+        Load the sequencing summary files by chunks of lines. The partial results of the chunks are accumulated, so
+        only a chunk and a sample of the reads are kept in memory.
+        :return: a PartialResults object with a sample of the reads
+        """
+        layout = self._summary_layout()
+        columns = layout.columns + (['barcode_arrangement'] if self.is_barcode else [])
+        datatypes = dict(sequencing_summary_datatypes, barcode_arrangement='category')
+
+        partial_results = PartialResults(self.barcode_selection if self.is_barcode else None,
+                                         out_of_core_sample_size)
+        for info in layout.summary_infos:
+            for chunk in self._read_summary_file_chunks(info, columns, datatypes):
+                partial_results.update(_fill_missing_values(chunk, self.is_barcode))
+
+        return partial_results
+
+    def _load_shards(self):
+        """
+        Load the sequencing summary files by shards. The files are split by file and by byte range and the shards
+        are processed by worker processes, then the partial results of the shards are merged.
+        :return: a PartialResults object with a sample of the reads
+        """
+        start_time = time.time()
+
+        layout = self._summary_layout()
+        shards = summary_shards(layout.summary_infos, self.worker_count)
+
+        # The configuration is sent to the workers to create their own extractor
+        config_dictionary = dict(self.config_dictionary.items())
+        executor = self.executor if self.executor is not None else create_executor(self.worker_count)
+        try:
+            if layout.join:
+                results = self._join_shards(executor, config_dictionary, shards, layout.barcoding_infos)
+            else:
+                results = list(executor.map(_process_shard, [config_dictionary] * len(shards), shards))
+        finally:
+            if self.executor is None:
+                executor.shutdown()
+
+        partial_results = PartialResults(self.barcode_selection if self.is_barcode else None,
+                                         out_of_core_sample_size)
+        missing_barcodes_count = 0
+        for shard_results, shard_missing_barcodes_count in results:
+            partial_results.merge(shard_results)
+            missing_barcodes_count += shard_missing_barcodes_count
+
+        if missing_barcodes_count > 0:
+            sys.stderr.write('Warning: {} barcodes values are missing in sequencing summary file(s).'
+                             ' They will be marked as "unclassified".\n'.format(missing_barcodes_count))
+
+        log_task(self.quiet,
+                 'Process {} shards of the sequencing summary files with {} workers'.format(len(shards),
+                                                                                         self.worker_count),
+                 start_time,
+                 time.time())
+
+        return partial_results
+
+    def _load_shard(self, shard):
+        """
+        Load a shard of a sequencing summary file and compute its partial results.
+        :param shard: a Shard object
+        :return: a tuple with a PartialResults object and the number of reads without barcode in the barcoding files
+        """
+        info = probe_summary_file(shard.filename)
+        columns = self._summary_layout().columns + (['barcode_arrangement'] if self.is_barcode else [])
+        datatypes = dict(sequencing_summary_datatypes, barcode_arrangement='category')
+        dataframe = self._read_summary_file(info, columns, datatypes, shard.byte_range())
+
+        partial_results = PartialResults(self.barcode_selection if self.is_barcode else None,
+                                         out_of_core_sample_size)
+        partial_results.update(_fill_missing_values(dataframe, self.is_barcode))
+
+        return partial_results, 0
+
+    def _join_shards(self, executor, config_dictionary, shards, barcoding_infos):
+        """
+        Process the shards when the barcodes of the barcoding summary files must be joined with the reads. The
+        barcoding summary files are read once and their barcodes written in spill files partitioned by the hash of
+        the read ids. The workers write the reads of the shards in spill files with the same partitions, then join
+        the reads and the barcodes of groups of partitions.
+        :param executor: the executor of the workers
+        :param config_dictionary: the configuration dictionary sent to the workers
+        :param shards: list of Shard objects
+        :param barcoding_infos: list of the SummaryFileInfo objects of the barcoding summary files
+        :return: a list of tuples with a PartialResults object and the number of reads without barcode in the
+        barcoding files
+        """
+        # Codes of the barcode names, in the order of the codes
+        barcodes = {}
+
+        with tempfile.TemporaryDirectory(prefix='toulligqc-') as directory:
+            barcode_spill = SpillFiles(directory, 'barcoding_summary', barcode_record_type)
+            try:
+                self._spill_barcodes(barcoding_infos, barcode_spill, barcodes)
+            finally:
+                barcode_spill.close()
+
+            # The code of the reads without barcode is the same in all the workers
+            barcodes.setdefault('unclassified', len(barcodes))
+
+            spills = list(executor.map(_spill_shard, [config_dictionary] * len(shards), shards,
+                                       [directory] * len(shards),
+                                       ['sequencing_summary.{}'.format(i) for i in range(len(shards))]))
+
+            # The groups of partitions are spread over the workers
+            sizes = barcode_spill.sizes() + sum(spill.sizes() for spill in spills)
+            groups = partition_groups(sizes, max(1, min(self.max_memory, out_of_core_memory_factor * int(sizes.sum()))
+                                                 // max(1, self.worker_count)))
+
+            return list(executor.map(_join_partitions, [config_dictionary] * len(groups), groups,
+                                     [spills] * len(groups), [barcode_spill] * len(groups),
+                                     [barcodes] * len(groups)))
+
+    def _spill_barcodes(self, barcoding_infos, barcode_spill, barcodes):
+        """
+        Write the barcodes of the barcoding summary files in spill files partitioned by the hash of their read ids.
+        :param barcoding_infos: list of the SummaryFileInfo objects of the barcoding summary files
+        :param barcode_spill: SpillFiles object of the barcodes
+        :param barcodes: dictionary with the codes of the barcode names, updated with the new barcodes
+        """
+        datatypes = dict(read_id=object, barcode_arrangement='category')
+
+        for info in barcoding_infos:
+            for chunk in self._read_summary_file_chunks(info, ['read_id', 'barcode_arrangement'], datatypes):
+                records = np.empty(len(chunk), dtype=barcode_record_type)
+                records['read_id_hash1'], records['read_id_hash2'] = read_id_hashes(chunk['read_id'])
+                records['barcode_arrangement'] = _barcode_codes(chunk['barcode_arrangement'], barcodes)
+                partitions = records['read_id_hash1'] % np.uint64(barcode_spill.partition_count)
+                barcode_spill.append(records, partitions.astype(np.int64))
+
+    def _spill_shard(self, shard, directory, name):
+        """
+        Write the reads of a shard of a sequencing summary file in spill files partitioned by the hash of their read
+        ids.
+        :param shard: a Shard object
+        :param directory: directory of the spill files
+        :param name: prefix of the name of the spill files
+        :return: the closed SpillFiles object
+        """
+        info = probe_summary_file(shard.filename)
+        columns = self._summary_layout().columns
+        datatypes = dict(sequencing_summary_datatypes, read_id=object)
+        record_type = [(c, datatypes[c]) for c in columns] + [('read_id_hash1', np.uint64),
+                                                               ('read_id_hash2', np.uint64)]
+        records = _spill_records(self._read_summary_file(info, columns + ['read_id'], datatypes, shard.byte_range()),
+                                 columns, record_type)
+
+        spill = SpillFiles(directory, name, record_type)
+        try:
+            spill.append(records, (records['read_id_hash1'] % np.uint64(spill.partition_count)).astype(np.int64))
+        finally:
+            spill.close()
+
+        return spill
+
+    def _join_partitions(self, partitions, spills, barcode_spill, barcodes):
+        """
+        Join the spilled reads of partitions with their barcodes and compute their partial results.
+        :param partitions: list of partitions
+        :param spills: list of the SpillFiles objects of the reads of the shards
+        :param barcode_spill: SpillFiles object of the barcodes
+        :param barcodes: dictionary with the codes of the barcode names, with the code of the reads without barcode
+        :return: a tuple with a PartialResults object and the number of reads without barcode in the barcoding files
+        """
+        dataframe, missing_barcodes_count = _spilled_dataframe(np.concatenate([s.read(partitions) for s in spills]),
+                                                               barcode_spill.read(partitions), barcodes)
+
+        partial_results = PartialResults(self.barcode_selection, out_of_core_sample_size)
+        partial_results.update(dataframe)
+
+        return partial_results, missing_barcodes_count
+
+    def _load_out_of_core(self):
+        """
+        Load the sequencing summary files out-of-core. The files are read by chunks and the reads are written in
+        temporary spill files by partition: by channel, or by read id when the barcodes of the barcoding summary files
+        must be joined with the reads. The partitions are then processed by groups that fit under the memory ceiling.
+        :return: a PartialResults object with a sample of the reads
+        """
+        start_time = time.time()
+
+        layout = self._summary_layout()
+        join = layout.join
+        columns = layout.columns
+        datatypes = dict(sequencing_summary_datatypes, read_id=object, barcode_arrangement='category')
+        record_type = [(c, datatypes[c]) for c in columns]
+        if self.is_barcode and not join:
+            record_type.append(('barcode_arrangement', np.int32))
+        if join:
+            record_type += [('read_id_hash1', np.uint64), ('read_id_hash2', np.uint64)]
+
+        # Codes of the barcode names, in the order of the codes
+        barcodes = {}
+
+        with tempfile.TemporaryDirectory(prefix='toulligqc-') as directory:
+            spill = SpillFiles(directory, 'sequencing_summary', record_type)
+            barcode_spill = SpillFiles(directory, 'barcoding_summary', barcode_record_type) if join else None
+
+            try:
+                for info in layout.summary_infos:
+                    file_columns = columns + (['read_id'] if join else []) \
+                        + (['barcode_arrangement'] if self.is_barcode and not join else [])
+                    for chunk in self._read_summary_file_chunks(info, file_columns, datatypes):
+                        records = _spill_records(chunk, columns, record_type)
+                        if self.is_barcode and not join:
+                            records['barcode_arrangement'] = _barcode_codes(chunk['barcode_arrangement'], barcodes) \
+                                if 'barcode_arrangement' in chunk.columns else -1
+                        if join:
+                            partitions = records['read_id_hash1'] % np.uint64(spill.partition_count)
+                        else:
+                            partitions = records['channel'] % spill.partition_count
+                        spill.append(records, partitions.astype(np.int64))
+
+                if join:
+                    self._spill_barcodes(layout.barcoding_infos, barcode_spill, barcodes)
+            finally:
+                spill.close()
+                if join:
+                    barcode_spill.close()
+
+            sizes = spill.sizes() + (barcode_spill.sizes() if join else 0)
+            log_task(self.quiet,
+                     'Spill sequencing summary files ({:,.2f} MB written)'.format(sizes.sum() / 1024 / 1024),
+                     start_time,
+                     time.time())
+            start_time = time.time()
+
+            partial_results = PartialResults(self.barcode_selection if self.is_barcode else None,
+                                             out_of_core_sample_size)
+            missing_barcodes_count = 0
+            groups = partition_groups(sizes, self.max_memory)
+            for group in groups:
+                dataframe, group_missing_barcodes_count = _spilled_dataframe(
+                    spill.read(group), barcode_spill.read(group) if join else None,
+                    barcodes if self.is_barcode else None)
+                missing_barcodes_count += group_missing_barcodes_count
+                partial_results.update(dataframe)
+
+        if missing_barcodes_count > 0:
+            sys.stderr.write('Warning: {} barcodes values are missing in sequencing summary file(s).'
+                             ' They will be marked as "unclassified".\n'.format(missing_barcodes_count))
+
+        log_task(self.quiet,
+                 'Process {} groups of partitions of the sequencing summary files'.format(len(groups)),
+                 start_time,
+                 time.time())
+
+        return partial_results
 
     @staticmethod
     def _is_barcode_file(filename):
         """
-        Check if input is a barcoding summary file i.e. has the column barcode_arrangement
+        Check if input is a barcoding summary file i.e. has the columns read_id and barcode_arrangement
+        and no read length column
         :param filename: path of the file to test
         :return: True if the filename is a barcoding summary file
         """
-        header = read_first_line_file(filename)
-        return header.startswith('read_id') and 'barcode_arrangement' in header
+        return read_summary_schema(filename).file_type == barcoding_summary_type
 
     @staticmethod
     def _is_sequencing_summary_file(filename):
         """
-        Check if input is a sequencing summary file i.e. first word is "filename" and does not have column 'barcode_arrangement'
+        Check if input is a sequencing summary file i.e. has the channel, start time, duration, read length and
+        mean qscore columns and does not have a barcode column
         :param filename: path of the file to test
         :return: True if the file is indeed a sequencing summary file
         """
-        header = read_first_line_file(filename)
-        return header.startswith('filename') and not 'barcode_arrangement' in header
+        return read_summary_schema(filename).file_type == sequencing_summary_type
 
     @staticmethod
     def _is_sequencing_summary_with_barcodes(filename):
         """
-        Check if the sequencing summary has also barcode information :
-        - check for presence of columns "filename" and "barcode_arrangement"
+        Check if the sequencing summary has also barcode information
         :param filename: path of the file to test
         :return: True if the filename is a sequencing summary file with barcodes
         """
-        header = read_first_line_file(filename)
-        return header.startswith('filename') and 'barcode_arrangement' in header
+        return read_summary_schema(filename).file_type == sequencing_summary_with_barcodes_type
+
+
+def _process_shard(config_dictionary, shard):
+    """
+    Compute the partial results of a shard of the sequencing summary files in a worker.
+    :param config_dictionary: the configuration dictionary
+    :param shard: a Shard object
+    :return: a tuple with a PartialResults object and the number of reads without barcode in the barcoding files
+    """
+    extractor = SequencingSummaryExtractor(config_dictionary)
+    if extractor.is_barcode:
+        extractor.barcode_selection = config_dictionary['barcode_selection']
+
+    return extractor._load_shard(shard)
+
+
+def _spill_shard(config_dictionary, shard, directory, name):
+    """
+    Write the reads of a shard of the sequencing summary files in spill files in a worker.
+    :param config_dictionary: the configuration dictionary
+    :param shard: a Shard object
+    :param directory: directory of the spill files
+    :param name: prefix of the name of the spill files
+    :return: the closed SpillFiles object
+    """
+    return SequencingSummaryExtractor(config_dictionary)._spill_shard(shard, directory, name)
+
+
+def _join_partitions(config_dictionary, partitions, spills, barcode_spill, barcodes):
+    """
+    Join the spilled reads of partitions with their barcodes and compute their partial results in a worker.
+    :param config_dictionary: the configuration dictionary
+    :param partitions: list of partitions
+    :param spills: list of the SpillFiles objects of the reads of the shards
+    :param barcode_spill: SpillFiles object of the barcodes
+    :param barcodes: dictionary with the codes of the barcode names
+    :return: a tuple with a PartialResults object and the number of reads without barcode in the barcoding files
+    """
+    extractor = SequencingSummaryExtractor(config_dictionary)
+    extractor.barcode_selection = config_dictionary['barcode_selection']
+
+    return extractor._join_partitions(partitions, spills, barcode_spill, barcodes)
+
+
+def _spill_records(chunk, columns, record_type):
+    """
+    Convert a chunk of reads in records of spill files. Missing values are replaced by 0 and the read ids are
+    replaced by their hashes when the records have hash fields.
+    :param chunk: a dataframe of reads
+    :param columns: the columns of the records read from the chunk
+    :param record_type: numpy structured type of the records
+    :return: a structured array of records
+    """
+    records = np.empty(len(chunk), dtype=record_type)
+    for c in columns:
+        records[c] = chunk[c].fillna(0).values
+    if 'read_id_hash1' in records.dtype.names:
+        records['read_id_hash1'], records['read_id_hash2'] = read_id_hashes(chunk['read_id'])
+
+    return records
+
+
+def _spilled_dataframe(records, barcode_records=None, barcodes=None):
+    """
+    Create the dataframe of spilled reads. When spilled barcodes are provided, they are joined with the reads on the
+    hashes of the read ids. Reads without barcode are marked as 'unclassified'.
+    :param records: structured array of spilled reads
+    :param barcode_records: structured array of spilled barcodes, None if the reads have their own barcodes
+    :param barcodes: dictionary with the codes of the barcode names, None if the reads have no barcode
+    :return: a tuple with the dataframe and the number of reads without barcode in the spilled barcodes
+    """
+    dataframe = pd.DataFrame(records)
+    missing_barcodes_count = 0
+    if barcode_records is not None:
+        dataframe = pd.merge(dataframe, pd.DataFrame(barcode_records), on=['read_id_hash1', 'read_id_hash2'],
+                             how='left')
+        missing_barcodes_count = int(dataframe['barcode_arrangement'].isna().sum())
+        dataframe['barcode_arrangement'] = dataframe['barcode_arrangement'].fillna(-1).astype(np.int32)
+        dataframe.drop(columns=['read_id_hash1', 'read_id_hash2'], inplace=True)
+
+    if barcodes is not None:
+        codes = dataframe['barcode_arrangement'].values
+        if (codes < 0).any():
+            codes[codes < 0] = barcodes.setdefault('unclassified', len(barcodes))
+        dataframe['barcode_arrangement'] = pd.Categorical.from_codes(codes, categories=list(barcodes))
+
+    return dataframe, missing_barcodes_count
 
 
+def _fill_missing_values(dataframe, is_barcode):
+    """
+    Replace the missing values of a dataframe of reads: missing barcodes are marked as 'unclassified' and missing
+    numeric values are replaced by 0.
+    :param dataframe: a dataframe with the columns of the sequencing summary
+    :param is_barcode: True if the reads have barcodes
+    :return: the dataframe
+    """
+    if is_barcode:
+        if 'barcode_arrangement' not in dataframe.columns:
+            dataframe['barcode_arrangement'] = np.nan
+        dataframe['barcode_arrangement'] = dataframe['barcode_arrangement'].astype(object).fillna('unclassified') \
+            .astype('category')
+        dataframe = _normalize_barcode_names(dataframe)
+
+    numeric_columns = [c for c in sequencing_summary_columns if c in dataframe.columns]
+    dataframe[numeric_columns] = dataframe[numeric_columns].fillna(0)
+
+    return dataframe
+
+
+def _canonical_dataframe(info, dataframe, columns):
+    """
+    Rename the columns of a summary file with their canonical names and compute the pass/fail status of the reads
+    from their mean Phred score when the file does not contain it.
+    :param info: the SummaryFileInfo object of the file
+    :param dataframe: a dataframe with the columns of the file
+    :param columns: list of the canonical names of the columns loaded
+    :return: the dataframe
+    """
+    dataframe.rename(columns=info.schema.canonical_names(), inplace=True)
+
+    if 'passes_filtering' in columns and 'passes_filtering' not in dataframe.columns:
+        dataframe['passes_filtering'] = dataframe['mean_qscore'] >= default_min_pass_qscore
+
+    return dataframe
+
+
+def _barcode_category_names(categories):
+    """
+    Remove the kit name of barcode names (e.g. SQK-NBD114-24_barcode01 for Dorado).
+    :param categories: a Pandas Index with barcode names
+    :return: a Pandas Index with the barcode names without kit name
+    """
+    return categories.str.replace(r'^.*_(barcode\d+|unclassified)$', r'\1', regex=True)
+
+
+def _barcode_codes(series, barcodes):
+    """
+    Get the codes of the barcodes of reads. The barcode names not found in the codes are added to the codes.
+    :param series: a categorical Pandas Series with the barcodes of the reads
+    :param barcodes: dictionary with the codes of the barcode names, in the order of the codes
+    :return: an array with the code of the barcode of each read, -1 for missing barcodes
+    """
+    names = _barcode_category_names(series.cat.categories.astype(str))
+    # Missing barcodes have the code -1 and use the last element of the lookup table
+    lookup = np.array([barcodes.setdefault(n, len(barcodes)) for n in names] + [-1], dtype=np.int32)
+    return lookup[series.cat.codes.values]
+
+
+def _normalize_barcode_names(dataframe):
+    """
+    Remove the kit name of the barcode names (e.g. SQK-NBD114-24_barcode01 for Dorado).
+    :param dataframe: a dataframe with a categorical barcode_arrangement column
+    :return: the dataframe
+    """
+    categories = dataframe['barcode_arrangement'].cat.categories
+    names = _barcode_category_names(categories)
+
+    if not names.equals(categories):
+        dataframe['barcode_arrangement'] = dataframe['barcode_arrangement'].map(dict(zip(categories, names))) \
+            .astype('category')
 
+    return dataframe
@@ -34,7 +34,6 @@ import pandas as pd
 from toulligqc import plotly_graph_generator as pgg
 from toulligqc import plotly_graph_onedsquare_generator as pgg2
 from toulligqc.sequencing_summary_common import check_result_values
-from toulligqc.sequencing_summary_common import count_boolean_elements
 from toulligqc.sequencing_summary_common import describe_dict
 from toulligqc.sequencing_summary_common import extract_barcode_info
 from toulligqc.sequencing_summary_common import get_result_value
@@ -42,7 +41,8 @@ from toulligqc.sequencing_summary_common import series_cols_boolean_elements
 from toulligqc.sequencing_summary_common import set_result_value
 from toulligqc.sequencing_summary_common import log_task
 from toulligqc.sequencing_summary_common import add_image_to_result
-from toulligqc.sequencing_summary_common import read_first_line_file
+from toulligqc.sequencing_summary_common import probe_summary_file
+from toulligqc.partition_statistics import ReadStatistics
 from toulligqc.sequencing_summary_extractor import SequencingSummaryExtractor as SSE
 from toulligqc.common import is_numpy_1_24
 
@@ -59,8 +59,12 @@ class OneDSquareSequencingSummaryExtractor(SSE):
         the others cases are managed in check_conf and _load_sequencing_summary_1dsqr_data
         :param config_dictionary: dictionary containing all files or directories paths for sequencing_summary, sequencing_1dsq_summary.txt and barcoding files
         """
-        super().__init__(config_dictionary)
+        # The 1D data is extracted by a 1D extractor. The configuration, the 1D dataframe and the results of the 1D
+        # extractor are shared through properties instead of being read a second time by the constructor of the
+        # parent class
         self.sse = SSE(config_dictionary)
+        self.config_dictionary = config_dictionary
+
         self.sequencing_summary_1dsqr_source = self.config_dictionary[
             'sequencing_summary_1dsqr_source']
         self.sequencing_summary_1dsqr_files = self.sequencing_summary_1dsqr_source.split(
@@ -75,6 +79,52 @@ class OneDSquareSequencingSummaryExtractor(SSE):
                     f):
                     self.is_barcode = True
 
+    @property
+    def quiet(self):
+        """
+        Quiet mode of the 1D extractor.
+        """
+        return self.sse.quiet
+
+    @property
+    def images_directory(self):
+        """
+        Directory of the images of the 1D extractor.
+        """
+        return self.sse.images_directory
+
+    @property
+    def dataframe_1d(self):
+        """
+        Dataframe of the 1D reads (or of the sample of the 1D reads) of the 1D extractor.
+        """
+        return self.sse.dataframe_1d
+
+    @property
+    def dataframe_dict(self):
+        """
+        Series of the 1D reads of the 1D extractor.
+        """
+        return self.sse.dataframe_dict
+
+    @property
+    def partial_results(self):
+        """
+        Statistics of all the 1D reads of the 1D extractor.
+        """
+        return self.sse.partial_results
+
+    @property
+    def executor(self):
+        """
+        Executor of the shards of the sequencing summary files of the 1D extractor.
+        """
+        return self.sse.executor
+
+    @executor.setter
+    def executor(self, executor):
+        self.sse.executor = executor
+
     def check_conf(self):
         """
         Check if the sequencing summary 1dsqr source contains a 1dsqr sequencing summary file
@@ -110,14 +160,7 @@ class OneDSquareSequencingSummaryExtractor(SSE):
 
         self.sse.init()
 
-        # Load dataframe_1d and remove duplicate columns that are also present in dataframe_1dsqr
-        self.dataframe_1d = self.sse.dataframe_1d
-
-        # Copy dataframe to avoid changing original df when dropping columns
-        dataframe_1d_copy = self.dataframe_1d.copy(deep=True)
-        dataframe_1d_copy.drop(columns=["sequence_length", "mean_qscore", "passes_filtering"], inplace=True)
-
-        # Load dataframe_1dsqr df from 1D² files
+        # Load dataframe_1dsqr df from 1D² files, the 1D dataframe is the dataframe of the 1D extractor
         self.dataframe_1dsqr = self._load_sequencing_summary_1dsqr_data()
 
         # Create duration column in dataframe_1dsqr
@@ -125,19 +168,11 @@ class OneDSquareSequencingSummaryExtractor(SSE):
             'trimmed_duration2']  # duration of the 2 strands sequenced
         self.dataframe_1dsqr.drop(columns=['trimmed_duration1', 'trimmed_duration2'], inplace=True)
 
-        # dataframe_dicts
-        self.dataframe_dict_1dsqr = {}
-        self.dataframe_dict = self.sse.dataframe_dict
-
-        if self.is_barcode:
-            self.barcode_selection = self.config_dictionary[
-                'barcode_selection']
-
         if self.dataframe_1d.empty or self.dataframe_1dsqr.empty:
             raise pd.errors.EmptyDataError("Dataframe is empty")
 
-        # Dictionary for storing all pd.Series and pd.Dataframe entries
-        self.dataframe_dict = {}
+        # dataframe_dicts
+        self.dataframe_dict_1dsqr = {}
 
         if self.is_barcode:
             self.barcode_selection = self.config_dictionary[
@@ -179,7 +214,6 @@ class OneDSquareSequencingSummaryExtractor(SSE):
 
         # Call to extract parent method to get all keys, values from 1D extractor
         self.sse.extract(result_dict)
-        self.dataframe_dict = self.sse.dataframe_dict
 
         #
         # Extract info from 1D²
@@ -187,16 +221,20 @@ class OneDSquareSequencingSummaryExtractor(SSE):
 
         self._fill_series_dict(self.dataframe_dict_1dsqr, self.dataframe_1dsqr)
 
+        # Statistics of the length and of the qscore of the pass and fail reads of each barcode
+        read_statistics = ReadStatistics(self.barcode_selection if self.is_barcode else None)
+        read_statistics.update(self.dataframe_1dsqr)
+
         # Read count
-        set_result_value(self, result_dict, "read.count", len(self.dataframe_1dsqr))
+        set_result_value(self, result_dict, "read.count", read_statistics.length.count())
 
         # 1D² pass information : count, length and qscore values
         set_result_value(self, result_dict, "read.pass.count",
-                         count_boolean_elements(self.dataframe_1dsqr, 'passes_filtering', True))
+                         read_statistics.length.count(read_statistics.partitions('pass')))
 
         # 1D² fail information : count, length and qscore values
         set_result_value(self, result_dict, "read.fail.count",
-                         count_boolean_elements(self.dataframe_1dsqr, 'passes_filtering', False))
+                         read_statistics.length.count(read_statistics.partitions('fail')))
 
         # Ratios & frequencies
         set_result_value(self, result_dict, "read.count.frequency", 100)
@@ -213,36 +251,32 @@ class OneDSquareSequencingSummaryExtractor(SSE):
         set_result_value(self, result_dict, "read.fail.frequency", read_fail_frequency)
 
         # Get statistics about all reads length and store each value into result_dict
-        sequence_length_statistics = self.dataframe_1dsqr['sequence_length'].describe()
-
-        for index, value in sequence_length_statistics.items():
+        for index, value in read_statistics.length.describe().items():
             set_result_value(self,
                              result_dict, "all.read.length." + index, value)
 
         # Add statistics (without count) about read pass/fail length in the result_dict
-        describe_dict(self, result_dict, self.dataframe_dict_1dsqr["pass.reads.sequence.length"],
+        describe_dict(self, result_dict, read_statistics.length.describe(read_statistics.partitions('pass')),
                       "pass.reads.sequence.length")
-        describe_dict(self, result_dict, self.dataframe_dict_1dsqr["fail.reads.sequence.length"],
+        describe_dict(self, result_dict, read_statistics.length.describe(read_statistics.partitions('fail')),
                       "fail.reads.sequence.length")
 
         # Get Qscore statistics without count value and store them into result_dict
-        qscore_statistics = self.dataframe_1dsqr['mean_qscore'].describe().drop(
-            "count")
-
-        for index, value in qscore_statistics.items():
-            set_result_value(self,
-                             result_dict, "all.reads.mean.qscore." + index, value)
+        describe_dict(self, result_dict, read_statistics.qscore.describe(), "all.reads.mean.qscore")
 
         # Add statistics (without count) about read pass/fail qscore in the result_dict
-        describe_dict(self, result_dict, self.dataframe_dict_1dsqr["pass.reads.mean.qscore"], "pass.reads.mean.qscore")
-        describe_dict(self, result_dict, self.dataframe_dict_1dsqr["fail.reads.mean.qscore"], "fail.reads.mean.qscore")
+        describe_dict(self, result_dict, read_statistics.qscore.describe(read_statistics.partitions('pass')),
+                      "pass.reads.mean.qscore")
+        describe_dict(self, result_dict, read_statistics.qscore.describe(read_statistics.partitions('fail')),
+                      "fail.reads.mean.qscore")
 
         if self.is_barcode:
             extract_barcode_info(self,
                                  result_dict,
                                  self.barcode_selection,
                                  self.dataframe_dict_1dsqr,
-                                 self.dataframe_1dsqr)
+                                 self.dataframe_1dsqr,
+                                 read_statistics)
 
     def _fill_series_dict(self, df_dict, df):
 
@@ -279,7 +313,12 @@ class OneDSquareSequencingSummaryExtractor(SSE):
 
         add_image_to_result(self.quiet, images, time.time(), pgg.read_count_histogram(result_dict, self.images_directory))
         add_image_to_result(self.quiet, images, time.time(), pgg2.dsqr_read_count_histogram(result_dict, self.images_directory))
-        add_image_to_result(self.quiet, images, time.time(), pgg.read_length_scatterplot(self.dataframe_dict, self.images_directory))
+        # Number of reads represented by each read of the 1D dataframe, the dataframe is a sample in out-of-core mode
+        partial_results = self.partial_results
+        read_weight = partial_results.read_statistics.length.count() / len(self.dataframe_1d)
+
+        add_image_to_result(self.quiet, images, time.time(), pgg.read_length_scatterplot(self.dataframe_dict, self.images_directory,
+                                                                                         read_weight))
         add_image_to_result(self.quiet, images, time.time(), pgg2.dsqr_read_length_scatterplot(self.dataframe_dict_1dsqr, self.images_directory))
         add_image_to_result(self.quiet, images, time.time(), pgg.yield_plot(self.dataframe_1dsqr, self.images_directory, oneDsquare=True))
         add_image_to_result(self.quiet, images, time.time(), pgg.read_quality_multiboxplot(self.dataframe_dict, self.images_directory, ))
@@ -288,7 +327,14 @@ class OneDSquareSequencingSummaryExtractor(SSE):
         add_image_to_result(self.quiet, images, time.time(), pgg2.dsqr_allphred_score_frequency(result_dict, self.dataframe_dict_1dsqr, self.images_directory))
         add_image_to_result(self.quiet, images, time.time(), pgg.all_scatterplot(self.dataframe_dict, self.images_directory))
         add_image_to_result(self.quiet, images, time.time(), pgg2.scatterplot_1dsqr(self.dataframe_dict_1dsqr, self.images_directory))
-        add_image_to_result(self.quiet, images, time.time(), pgg.plot_performance(self.sse.dataframe_1d, self.images_directory))
+        add_image_to_result(self.quiet, images, time.time(), pgg.plot_performance(self.sse._channel_read_count_dataframe(),
+                                                                                  self.images_directory))
+        channel_activity = self.sse._channel_activity_over_time()
+        add_image_to_result(self.quiet, images, time.time(), pgg.channel_activity_over_time(channel_activity, self.images_directory))
+        add_image_to_result(self.quiet, images, time.time(), pgg.channel_throughput_over_time(channel_activity, self.images_directory))
+        add_image_to_result(self.quiet, images, time.time(), pgg.channel_survival(channel_activity, self.images_directory))
+        add_image_to_result(self.quiet, images, time.time(), pgg.time_window_metrics(partial_results.time_windows,
+                                                                                     self.images_directory))
         add_image_to_result(self.quiet, images, time.time(), pgg2.sequence_length_over_time_dsqr(self.dataframe_dict_1dsqr, self.images_directory))
         add_image_to_result(self.quiet, images, time.time(), pgg2.phred_score_over_time_dsqr(result_dict, self.dataframe_dict_1dsqr, self.images_directory))
         add_image_to_result(self.quiet, images, time.time(), pgg2.speed_over_time_dsqr(self.dataframe_dict_1dsqr, self.images_directory))
@@ -307,6 +353,12 @@ class OneDSquareSequencingSummaryExtractor(SSE):
 
             add_image_to_result(self.quiet, images, time.time(), pgg2.barcoded_phred_score_frequency_1dsqr(self.dataframe_dict_1dsqr,
                                                                  self.images_directory))
+
+            if partial_results.barcode_activity is not None:
+                add_image_to_result(self.quiet, images, time.time(), pgg.barcode_yield_over_time(partial_results.barcode_activity,
+                                                                                                 self.images_directory))
+                add_image_to_result(self.quiet, images, time.time(), pgg.barcode_throughput_over_time(partial_results.barcode_activity,
+                                                                                                      self.images_directory))
         return images
 
     def clean(self, result_dict):
@@ -450,18 +502,9 @@ class OneDSquareSequencingSummaryExtractor(SSE):
 
                 return dataframes_merged
 
-        except IOError:
-            raise FileNotFoundError("Sequencing summary file not found")
-
-    @staticmethod
-    def _is_barcode_file(filename):
-        """
-        Check if input is a barcoding summary file i.e. has the column barcode_arrangement
-        :param filename: path of the file to test
-        :return: True if the filename is a barcoding summary file
-        """
-        header = read_first_line_file(filename)
-        return header.startswith('read_id') and 'barcode_arrangement' in header
+        except IOError as e:
+            raise FileNotFoundError("Sequencing summary file not found: {}".format(
+                e.filename if e.filename else ', '.join(files))) from e
 
     @staticmethod
     def _is_sequencing_summary_1dsqr_file(filename):
@@ -470,7 +513,7 @@ class OneDSquareSequencingSummaryExtractor(SSE):
         :param filename: path of the file to test
         :return: True if the file is indeed a sequencing summary file
         """
-        header = read_first_line_file(filename)
+        header = probe_summary_file(filename).header
         return header.startswith('filename1') and not 'barcode_arrangement' in header
 
     @staticmethod
@@ -0,0 +1,523 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains a local QC server. QC jobs are submitted with HTTP requests, on a TCP port or on a Unix socket,
+# and are run with the run_qc() function by a pool of worker processes. The heavy libraries are imported by the
+# workers when the server starts, so a job does not pay the startup of the interpreter. The jobs wait in a queue
+# until a worker is free, and their progress messages are streamed as JSON lines.
+#
+# HTTP API:
+#   POST /jobs                 submit a job: {"inputs": {"sequencing_summary": [...]}, "options": {...}}
+#   GET  /jobs                 list the jobs
+#   GET  /jobs/<id>            status of a job, with its results once it is done
+#   GET  /jobs/<id>/events     progress events of a job, streamed until the end of the job
+
+import argparse
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from toulligqc import version
+
+# Default number of jobs run at the same time
+default_worker_count = 2
+
+# Default maximal number of jobs waiting for a worker
+default_max_queued_jobs = 100
+
+# Number of finished jobs kept by the server
+max_finished_jobs = 1000
+
+# Modules imported by the workers when they start
+warm_modules = ('numpy', 'pandas', 'scipy.stats', 'plotly.graph_objs', 'plotly.offline',
+                'toulligqc.sequencing_summary_extractor', 'toulligqc.sequencing_telemetry_extractor',
+                'toulligqc.fastq_extractor', 'toulligqc.plotly_graph_generator')
+
+# Queue of the events sent by the jobs of a worker process
+_worker_events = None
+
+
+class Job:
+    """
+    A QC job submitted to the server.
+    """
+
+    def __init__(self, job_id, inputs, options, figures):
+        """
+        Constructor.
+        :param job_id: identifier of the job
+        :param inputs: dictionary of the input sources of the QC
+        :param options: dictionary of the options of the QC
+        :param figures: True to return the graphs with the results
+        """
+        self.id = job_id
+        self.inputs = inputs
+        self.options = options
+        self.figures = figures
+        self.status = 'queued'
+        self.submit_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self.events = [{'job': job_id, 'status': 'queued'}]
+        self.result = None
+        self.error = None
+
+    def finished(self):
+        """
+        Test if the job is finished.
+        :return: True if the job is done or has failed
+        """
+        return self.status in ('done', 'failed')
+
+    def to_dict(self, with_result=False):
+        """
+        Get the description of the job.
+        :param with_result: True to add the results of the job
+        :return: a dictionary
+        """
+        result = {'id': self.id, 'status': self.status, 'submit_time': self.submit_time,
+                  'start_time': self.start_time, 'end_time': self.end_time}
+        if self.error is not None:
+            result['error'] = self.error
+        if with_result and self.result is not None:
+            result['result'] = self.result
+
+        return result
+
+
+class JobQueue:
+    """
+    Queue of the QC jobs run by a pool of warm worker processes.
+    """
+
+    def __init__(self, worker_count=default_worker_count, max_queued_jobs=default_max_queued_jobs):
+        """
+        Constructor.
+        :param worker_count: number of jobs run at the same time
+        :param max_queued_jobs: maximal number of jobs waiting for a worker
+        """
+        self.worker_count = worker_count
+        self.max_queued_jobs = max_queued_jobs
+        self.jobs = OrderedDict()
+        self.condition = threading.Condition()
+        self._ids = itertools.count(1)
+        self._futures = {}
+
+        # The workers are spawned as the server runs several threads. The events are written synchronously, so the
+        # events of a job are read before the end of the job
+        self._context = multiprocessing.get_context('spawn')
+        self._events = self._context.SimpleQueue()
+        self._executor = None
+        self._start_executor()
+
+        self._event_thread = threading.Thread(target=self._read_events, daemon=True)
+        self._event_thread.start()
+
+    def _start_executor(self):
+        """
+        Start the worker processes and import the heavy modules in all the workers.
+        """
+        self._executor = ProcessPoolExecutor(max_workers=self.worker_count, mp_context=self._context,
+                                             initializer=_init_worker, initargs=(self._events,))
+        warm_ups = [self._executor.submit(time.sleep, 0.1) for _ in range(self.worker_count)]
+        for future in warm_ups:
+            future.result()
+
+    def submit(self, inputs, options=None, figures=False):
+        """
+        Add a job to the queue.
+        :param inputs: dictionary of the input sources of the QC
+        :param options: dictionary of the options of the QC
+        :param figures: True to return the graphs with the results
+        :return: the Job object or None if the queue is full
+        """
+        with self.condition:
+            if sum(1 for job in self.jobs.values() if job.status == 'queued') >= self.max_queued_jobs:
+                return None
+
+            job = Job(str(next(self._ids)), inputs, dict(options or {}), figures)
+            self.jobs[job.id] = job
+            self._remove_finished_jobs()
+
+            try:
+                future = self._executor.submit(_run_job, job.id, job.inputs, job.options, job.figures)
+            except RuntimeError:
+                # The pool is broken when a worker has been killed, e.g. by the OOM killer
+                self._executor.shutdown(wait=False)
+                self._start_executor()
+                future = self._executor.submit(_run_job, job.id, job.inputs, job.options, job.figures)
+            self._futures[job.id] = future
+
+        future.add_done_callback(lambda f: self._events.put({'job': job.id, 'finished': True}))
+        return job
+
+    def get(self, job_id):
+        """
+        Get a job.
+        :param job_id: identifier of the job
+        :return: a Job object or None if the job does not exist
+        """
+        with self.condition:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        """
+        Get the jobs.
+        :return: a list of Job objects
+        """
+        with self.condition:
+            return list(self.jobs.values())
+
+    def events(self, job, timeout=None):
+        """
+        Iterate over the events of a job until the end of the job.
+        :param job: the Job object
+        :param timeout: maximal time to wait for a new event in seconds, None to wait forever
+        :return: a generator of dictionaries
+        """
+        index = 0
+        while True:
+            with self.condition:
+                if index == len(job.events) and not job.finished():
+                    self.condition.wait(timeout)
+                events = job.events[index:]
+                finished = job.finished()
+            index += len(events)
+
+            yield from events
+            if finished and not events:
+                return
+
+    def shutdown(self):
+        """
+        Stop the worker processes.
+        """
+        if sys.version_info >= (3, 9):
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        else:
+            self._executor.shutdown(wait=True)
+        self._events.put(None)
+        self._event_thread.join()
+
+    def _add_event(self, job, event):
+        """
+        Add an event to a job and wake up the threads waiting for the events.
+        :param job: the Job object
+        :param event: the event dictionary
+        """
+        with self.condition:
+            job.events.append(event)
+            self.condition.notify_all()
+
+    def _read_events(self):
+        """
+        Read the events sent by the worker processes.
+        """
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+
+            job = self.get(event['job'])
+            if job is None:
+                continue
+            if event.get('finished'):
+                with self.condition:
+                    future = self._futures.pop(job.id)
+                self._job_done(job, future)
+                continue
+            if event.get('status') == 'running':
+                with self.condition:
+                    job.status = 'running'
+                    job.start_time = event['time']
+            self._add_event(job, event)
+
+    def _job_done(self, job, future):
+        """
+        Store the results of a job.
+        :param job: the Job object
+        :param future: the future of the job
+        """
+        with self.condition:
+            job.end_time = time.time()
+            if future.cancelled():
+                job.status = 'failed'
+                job.error = 'Job cancelled'
+            elif future.exception() is not None:
+                job.status = 'failed'
+                job.error = '{}: {}'.format(type(future.exception()).__name__, future.exception())
+            else:
+                job.status = 'done'
+                job.result = future.result()
+
+            event = {'job': job.id, 'status': job.status, 'time': job.end_time}
+            if job.error is not None:
+                event['error'] = job.error
+            job.events.append(event)
+            self.condition.notify_all()
+
+    def _remove_finished_jobs(self):
+        """
+        Remove the oldest finished jobs when there are too many of them.
+        """
+        finished = [job.id for job in self.jobs.values() if job.finished()]
+        for job_id in finished[:max(0, len(finished) - max_finished_jobs)]:
+            del self.jobs[job_id]
+
+
+class _EventWriter:
+    """
+    File object sending the lines written by a job as events.
+    """
+
+    def __init__(self, job_id, kind):
+        self._job_id = job_id
+        self._kind = kind
+        self._buffer = ''
+
+    def write(self, text):
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                _worker_events.put({'job': self._job_id, self._kind: line.strip(), 'time': time.time()})
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def _init_worker(events):
+    """
+    Initialize a worker process: store the event queue, ignore the warnings like the command line and import the
+    heavy modules.
+    :param events: the multiprocessing queue of the events
+    """
+    global _worker_events
+    _worker_events = events
+
+    warnings.simplefilter('ignore')
+
+    import importlib
+    for name in warm_modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def _run_job(job_id, inputs, options, figures):
+    """
+    Run a QC job in a worker process. The messages of the QC are sent as events.
+    :param job_id: identifier of the job
+    :param inputs: dictionary of the input sources of the QC
+    :param options: dictionary of the options of the QC
+    :param figures: True to return the graphs
+    :return: a dictionary with the results of the QC and optionally the graphs
+    """
+    from toulligqc.api import run_qc
+
+    _worker_events.put({'job': job_id, 'status': 'running', 'time': time.time()})
+
+    options = dict(options, quiet='False')
+    with contextlib.redirect_stdout(_EventWriter(job_id, 'message')), \
+            contextlib.redirect_stderr(_EventWriter(job_id, 'warning')):
+        result_dict, graphs = run_qc(inputs, options, figures)
+
+    # The results are converted in JSON values in the worker
+    unwritten_keys = set(result_dict.get('unwritten.keys', []))
+    result = {'report': json.loads(json.dumps({k: v for k, v in result_dict.items() if k not in unwritten_keys},
+                                              default=_json_value))}
+    if figures:
+        result['graphs'] = [{'name': name, 'table': table, 'div': div} for name, _, table, div in graphs]
+
+    return result
+
+
+def _json_value(value):
+    """
+    Convert a value that is not supported by the JSON encoder.
+    :param value: the value
+    :return: a value supported by the JSON encoder
+    """
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+
+    return str(value)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the HTTP requests of the server.
+    """
+
+    server_version = 'ToulligQC/' + version.__version__
+
+    def do_GET(self):
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        queue = self.server.job_queue
+
+        if parts == ['jobs']:
+            self._send_json(200, {'jobs': [job.to_dict() for job in queue.list()]})
+            return
+
+        job = queue.get(parts[1]) if len(parts) in (2, 3) and parts[0] == 'jobs' else None
+        if job is None:
+            self._send_json(404, {'error': 'Not found: ' + self.path})
+        elif len(parts) == 2:
+            self._send_json(200, job.to_dict(with_result=True))
+        elif parts[2] == 'events':
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            for event in queue.events(job):
+                self.wfile.write((json.dumps(event) + '\n').encode('utf-8'))
+                self.wfile.flush()
+        else:
+            self._send_json(404, {'error': 'Not found: ' + self.path})
+
+    def do_POST(self):
+        if [p for p in self.path.split('/') if p] != ['jobs']:
+            self._send_json(404, {'error': 'Not found: ' + self.path})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            inputs = request['inputs']
+            options = request.get('options', {})
+            if not isinstance(inputs, dict) or not isinstance(options, dict):
+                raise ValueError('inputs and options must be JSON objects')
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': 'Invalid job: {}'.format(e)})
+            return
+
+        job = self.server.job_queue.submit(inputs, options, bool(request.get('figures', False)))
+        if job is None:
+            self._send_json(503, {'error': 'Too many queued jobs'})
+        else:
+            self._send_json(202, job.to_dict())
+
+    def _send_json(self, code, value):
+        body = json.dumps(value).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Clients of Unix sockets have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class QCServer(ThreadingHTTPServer):
+    """
+    HTTP server of the QC jobs, on a TCP port or on a Unix socket.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, job_queue, address, unix_socket=False, quiet=False):
+        """
+        Constructor.
+        :param job_queue: the JobQueue object running the jobs
+        :param address: a (host, port) tuple or the path of the Unix socket
+        :param unix_socket: True to listen on a Unix socket
+        :param quiet: True to not log the requests
+        """
+        self.job_queue = job_queue
+        self.quiet = quiet
+        if unix_socket:
+            self.address_family = socket.AF_UNIX
+        super().__init__(address, _RequestHandler)
+
+    def server_bind(self):
+        if self.address_family == socket.AF_UNIX:
+            if os.path.exists(self.server_address):
+                os.remove(self.server_address)
+            socketserver.TCPServer.server_bind(self)
+            self.server_name = 'localhost'
+            self.server_port = 0
+        else:
+            super().server_bind()
+
+
+def main():
+    """
+    Start the QC server.
+    """
+    parser = argparse.ArgumentParser(prog='ToulligQC server V{0}'.format(version.__version__))
+    parser.add_argument('--host', action='store', dest='host', default='127.0.0.1',
+                        help='Address of the server (default: 127.0.0.1)')
+    parser.add_argument('--port', action='store', dest='port', type=int, default=8080,
+                        help='Port of the server (default: 8080)')
+    parser.add_argument('--socket', action='store', dest='socket',
+                        help='Path of a Unix socket to listen on instead of a TCP port')
+    parser.add_argument('--workers', action='store', dest='workers', type=int, default=default_worker_count,
+                        help='Number of QC jobs run at the same time (default: {})'.format(default_worker_count))
+    parser.add_argument('--max-queued-jobs', action='store', dest='max_queued_jobs', type=int,
+                        default=default_max_queued_jobs,
+                        help='Maximal number of jobs waiting for a worker (default: {})'.format(default_max_queued_jobs))
+    parser.add_argument('--quiet', action='store_true', dest='is_quiet', help='Quiet mode', default=False)
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.max_queued_jobs < 1:
+        sys.exit('ERROR: The number of workers and of queued jobs must be positive')
+
+    job_queue = JobQueue(args.workers, args.max_queued_jobs)
+    if args.socket:
+        server = QCServer(job_queue, args.socket, unix_socket=True, quiet=args.is_quiet)
+        address = args.socket
+    else:
+        server = QCServer(job_queue, (args.host, args.port), quiet=args.is_quiet)
+        address = 'http://{}:{}'.format(*server.server_address[:2])
+
+    if not args.is_quiet:
+        print('ToulligQC server listening on {} with {} workers'.format(address, args.workers))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        job_queue.shutdown()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains the splitting of the summary files in shards processed by worker processes. Uncompressed files
+# are split in byte ranges of complete lines, compressed files cannot be read from an arbitrary position and are
+# processed as a single shard. Shards are dispatched with a concurrent.futures executor: a pool of local processes by
+# default, or any executor that dispatches the tasks to several nodes (e.g. mpi4py.futures.MPIPoolExecutor).
+
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+
+# Minimal size of the shards of uncompressed files
+min_shard_size = 16 * 1024 * 1024
+
+# Maximal size of the shards of uncompressed files
+max_shard_size = 512 * 1024 * 1024
+
+# Number of shards per worker, several shards per worker balance the load of the workers
+shards_per_worker = 4
+
+
+class Shard:
+    """
+    A part of a summary file: a range of complete lines of an uncompressed file or a whole file.
+    """
+
+    def __init__(self, filename, start=None, end=None):
+        """
+        Constructor.
+        :param filename: path of the file
+        :param start: position of the first line of the shard, None for a whole file
+        :param end: position of the end of the last line of the shard, None for a whole file
+        """
+        self.filename = filename
+        self.start = start
+        self.end = end
+
+    def byte_range(self):
+        """
+        Get the byte range of the shard.
+        :return: a (start, end) tuple or None for a whole file
+        """
+        return None if self.start is None else (self.start, self.end)
+
+    def __repr__(self):
+        return 'Shard({!r}, {!r}, {!r})'.format(self.filename, self.start, self.end)
+
+
+class SequentialExecutor(Executor):
+    """
+    Executor that runs the tasks in the current process when they are submitted. This executor is used when there is
+    a single worker.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def create_executor(worker_count):
+    """
+    Create an executor with local worker processes.
+    :param worker_count: number of worker processes
+    :return: a concurrent.futures Executor object
+    """
+    if worker_count <= 1:
+        return SequentialExecutor()
+
+    return ProcessPoolExecutor(max_workers=worker_count)
+
+
+def summary_shards(infos, worker_count):
+    """
+    Split summary files in shards.
+    :param infos: list of the SummaryFileInfo objects of the files
+    :param worker_count: number of workers
+    :return: a list of Shard objects
+    """
+    total_size = sum(info.size for info in infos if info.compression is None)
+    shard_size = min(max_shard_size, max(min_shard_size, total_size // max(1, worker_count * shards_per_worker)))
+
+    shards = []
+    for info in infos:
+        if info.compression is not None or info.size <= shard_size:
+            shards.append(Shard(info.filename))
+            continue
+
+        with open(info.filename, 'rb') as f:
+            bounds = [0]
+            while bounds[-1] < info.size:
+                bounds.append(_next_line_start(f, bounds[-1] + shard_size, info.size))
+
+        shards.extend(Shard(info.filename, start, end) for start, end in zip(bounds[:-1], bounds[1:]))
+
+    return shards
+
+
+def _next_line_start(f, position, size):
+    """
+    Get the position of the start of the line following a position.
+    :param f: file object opened in binary mode
+    :param position: a position in the file
+    :param size: size of the file
+    :return: the position after the next newline or the size of the file
+    """
+    if position >= size:
+        return size
+
+    f.seek(position)
+    f.readline()
+    return min(f.tell(), size)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+#                  ToulligQC development code
+#
+# This code may be freely distributed and modified under the
+# terms of the GNU General Public License version 3 or later
+# and CeCILL. This should be distributed with the code. If you
+# do not have a copy, see:
+#
+#      http://www.gnu.org/licenses/gpl-3.0-standalone.html
+#      http://www.cecill.info/licences/Licence_CeCILL_V2-en.html
+#
+# Copyright for this code is held jointly by the Genomic platform
+# of the Institut de Biologie de l'École Normale Supérieure and
+# the individual authors.
+#
+# First author: Laurent Jourdren
+# Maintainer: Laurent Jourdren
+# Since version 2.3
+
+# This module contains the computation of the metrics of the run for each time window (one hour by default). The
+# reads are bucketed once by their start time and the statistics of the length and of the qscore of the reads are
+# computed with a partition for each window, so the metrics of the windows can be followed along the run (e.g. the
+# degradation of the flowcell) and are merged chunk by chunk like the other statistics of the reads.
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+from toulligqc.partition_statistics import PartitionStatistics
+from toulligqc.partition_statistics import qscore_histogram_resolution
+
+# Duration of the time windows in seconds
+time_window_duration = 3600
+
+# Columns of the metrics of the time windows
+time_window_columns = ('start', 'end', 'read.count', 'yield', 'pass.ratio', 'n50', 'median.qscore')
+
+
+class TimeWindowStatistics:
+    """
+    Number of reads, number of pass reads, statistics of the length and of the qscore of the reads for each time
+    window of the run. Windows are added as reads with later start times are found.
+    """
+
+    def __init__(self, window_duration=time_window_duration):
+        """
+        Constructor.
+        :param window_duration: duration of the time windows in seconds
+        """
+        self.window_duration = window_duration
+        self.pass_counts = np.zeros(0, dtype=np.int64)
+        self.length = PartitionStatistics(0)
+        self.qscore = PartitionStatistics(0, qscore_histogram_resolution)
+
+    @property
+    def window_count(self):
+        """
+        Get the number of time windows.
+        :return: an integer
+        """
+        return len(self.pass_counts)
+
+    def update(self, dataframe):
+        """
+        Add a chunk of reads.
+        :param dataframe: a dataframe with the start_time, passes_filtering, sequence_length and mean_qscore columns
+        """
+        if len(dataframe) == 0:
+            return
+
+        windows = np.clip(dataframe['start_time'].values // self.window_duration, 0, None).astype(np.int64)
+        self._add_windows(int(windows.max()) + 1)
+
+        self.pass_counts += np.bincount(windows, weights=dataframe['passes_filtering'].values,
+                                        minlength=self.window_count).astype(np.int64)
+        self.length.update(dataframe['sequence_length'].values, windows)
+        self.qscore.update(dataframe['mean_qscore'].values, windows)
+
+    def merge(self, other):
+        """
+        Merge the statistics of another chunk of reads.
+        :param other: the other TimeWindowStatistics object, with the same window duration
+        """
+        if other.window_duration != self.window_duration:
+            raise ValueError('Cannot merge time windows with different durations')
+
+        # The statistics of both chunks must have the same windows
+        if other.window_count < self.window_count:
+            other = copy.deepcopy(other)
+            other._add_windows(self.window_count)
+        self._add_windows(other.window_count)
+        self.pass_counts += other.pass_counts
+        self.length.merge(other.length)
+        self.qscore.merge(other.qscore)
+
+    def _add_windows(self, window_count):
+        """
+        Add empty windows at the end of the run.
+        :param window_count: the new number of windows, lower numbers are ignored
+        """
+        if window_count <= self.window_count:
+            return
+
+        self.pass_counts = np.concatenate([self.pass_counts,
+                                           np.zeros(window_count - self.window_count, dtype=np.int64)])
+        self.length.add_partitions(window_count)
+        self.qscore.add_partitions(window_count)
+
+    def metrics(self):
+        """
+        Get the metrics of each time window: start and end in hours, read count, yield, ratio of pass reads, N50 and
+        median qscore of the reads. The ratio, the N50 and the median qscore of empty windows are NaN.
+        :return: a Pandas Dataframe with the columns of time_window_columns
+        """
+        windows = np.arange(self.window_count)
+        read_counts = self.length.counts
+        n50s = [self.length.nxx(50, [w])[0] for w in windows]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pass_ratios = self.pass_counts / read_counts
+
+        return pd.DataFrame({'start': windows * self.window_duration / 3600,
+                             'end': (windows + 1) * self.window_duration / 3600,
+                             'read.count': read_counts,
+                             'yield': self.length.sums.astype(np.int64),
+                             'pass.ratio': pass_ratios,
+                             'n50': [np.nan if n50 is None else n50 for n50 in n50s],
+                             'median.qscore': [self.qscore.describe([w])['50%'] for w in windows]},
+                            columns=list(time_window_columns))
+
@@ -32,28 +32,23 @@
 # 4. In the case of barcoded sequencing, it searches all barcodes from the command line argument --barcodes
 # 5. It uses all the information collected to generate a qc in the form of a htl-report and a report.data file
 
-import matplotlib
-
-matplotlib.use('Agg')
 import shutil
 import sys
-import re
 import argparse
 import os
 import time
 import datetime
 
 import warnings
-from toulligqc import toulligqc_info_extractor
+from toulligqc import api
 from toulligqc import report_data_file_generator
-from toulligqc import html_report_generator
 from toulligqc import version
 from toulligqc import configuration
-from toulligqc import fast5_extractor
-from toulligqc import sequencing_summary_extractor
-from toulligqc import sequencing_summary_onedsquare_extractor
-from toulligqc import sequencing_telemetry_extractor
 from toulligqc import common
+from toulligqc.common import ToulligqcError
+
+# Extractor and report modules depend on heavy libraries (pandas, plotly, scipy, h5py...).
+# They are only imported when required to keep the startup of the application fast.
 
 
 def _parse_args(config_dictionary):
@@ -70,8 +65,7 @@ def _parse_args(config_dictionary):
     required.add_argument('-a', '--sequencing-summary-source', action='append', dest='sequencing_summary_source',
                           help='Basecaller sequencing summary source, ' +
                                'can be compressed with gzip (.gz) or bzip2 (.bz2)',
-                          metavar='SEQUENCING_SUMMARY_SOURCE',
-                          required=True)
+                          metavar='SEQUENCING_SUMMARY_SOURCE')
     required.add_argument('-t', '--telemetry-source', action='store', dest='telemetry_source',
                           help='Basecaller telemetry file source, ' +
                                'can be compressed with gzip (.gz) or bzip2 (.bz2)',
@@ -79,7 +73,20 @@ def _parse_args(config_dictionary):
 
     required.add_argument('-f', '--fast5-source', action='store', dest='fast5_source',
                           help='Fast5 file source (necessary if no telemetry file), ' +
-                               'can also be in a tar.gz/tar.bz2 archive or a directory')
+                               'can also be in a tar.gz/tar.bz2 archive or a directory, ' +
+                               'all its reads are scanned if there is no basecalled read source')
+    required.add_argument('--fastq-source', action='append', dest='fastq_source',
+                          help='FASTQ file or directory source, used when no sequencing summary file is available, ' +
+                               'can be compressed with gzip (.gz) or bzip2 (.bz2)')
+    required.add_argument('--bam-source', action='append', dest='bam_source',
+                          help='Basecaller unaligned or aligned BAM file or directory source, ' +
+                               'used when no sequencing summary file is available')
+    required.add_argument('--alignment-source', action='append', dest='alignment_source',
+                          help='Aligned BAM file (sorted or not), PAF file or directory source, ' +
+                               'used to compute mapping statistics')
+    required.add_argument('-p', '--pod5-source', action='store', dest='pod5_source',
+                          help='POD5 file source (necessary if no telemetry file), can also be a directory, ' +
+                               'all its reads are scanned if there is no basecalled read source')
 
     # Add all optional arguments
     optional.add_argument("-n", "--report-name", action='store', dest="report_name", help="Report name", type=str)
@@ -91,10 +98,28 @@ def _parse_args(config_dictionary):
     optional.add_argument('-d', '--sequencing-summary-1dsqr-source', action='append',
                           dest='sequencing_summary_1dsqr_source',
                           help='Basecaller 1dsq summary source')
+    optional.add_argument('--fast5-deep-scan', action='store_true', dest='fast5_deep_scan',
+                          help='Read the metadata of all the reads of all the Fast5 files of the Fast5 source',
+                          default=False)
+    optional.add_argument('--pod5-deep-scan', action='store_true', dest='pod5_deep_scan',
+                          help='Read the metadata of all the reads of all the POD5 files of the POD5 source',
+                          default=False)
     optional.add_argument("-b", "--barcoding", action='store_true', dest='is_barcode', help="Option for barcode usage",
                           default=False)
     optional.add_argument('-l', '--barcodes', action='store', default='', dest='barcodes',
                           help='Coma separated barcode list (e.g. BC05,RB09,NB01,barcode10)')
+    optional.add_argument('--threads', action='store', dest='threads', type=int,
+                          help='Number of threads to use (default: 1)')
+    optional.add_argument('--workers', action='store', dest='workers', type=int,
+                          help='Number of worker processes processing shards of the sequencing summary files '
+                               '(default: 1)')
+    optional.add_argument('--out-of-core', action='store_true', dest='out_of_core',
+                          help='Process the sequencing summary files by partitions written in temporary files, '
+                               'for runs that do not fit in memory',
+                          default=False)
+    optional.add_argument('--max-memory', action='store', dest='max_memory',
+                          help='Memory budget of the loading of the sequencing summary files, larger files are '
+                               'read by chunks or out-of-core (e.g. 8G, default: 80%% of the available memory)')
     optional.add_argument("--quiet", action='store_true', dest='is_quiet', help="Quiet mode",
                           default=False)
     optional.add_argument("--report-only", action='store_true', dest='report_only',
@@ -127,8 +152,18 @@ def _parse_args(config_dictionary):
     # Rewrite the configuration file value if argument option is present
     args_dict = {
         ('fast5_source', args.fast5_source),
+        ('fast5_deep_scan', args.fast5_deep_scan),
+        ('pod5_source', args.pod5_source),
+        ('pod5_deep_scan', args.pod5_deep_scan),
+        ('threads', args.threads),
+        ('workers', args.workers),
+        ('out_of_core', args.out_of_core),
+        ('max_memory', args.max_memory),
         ('sequencing_summary_source', _join_parameter_arguments(args.sequencing_summary_source)),
         ('sequencing_summary_1dsqr_source', _join_parameter_arguments(args.sequencing_summary_1dsqr_source)),
+        ('fastq_source', _join_parameter_arguments(args.fastq_source)),
+        ('bam_source', _join_parameter_arguments(args.bam_source)),
+        ('alignment_source', _join_parameter_arguments(args.alignment_source)),
         ('sequencing_telemetry_source', args.telemetry_source),
         ('result_directory', args.output),
         ('html_report_path', args.html_report_path),
@@ -173,8 +208,10 @@ def _check_conf(config_dictionary):
                 'sequencing_telemetry_source']):
         argparse.ArgumentParser.print_help
 
-    if 'sequencing_summary_source' not in config_dictionary or not config_dictionary['sequencing_summary_source']:
-        sys.exit('ERROR: The sequencing summary file argument is empty')
+    try:
+        api.check_configuration(config_dictionary)
+    except ToulligqcError as e:
+        sys.exit('ERROR: ' + str(e))
 
     if 'html_report_path' not in config_dictionary or not config_dictionary['html_report_path']:
 
@@ -265,28 +302,6 @@ def _join_parameter_arguments(arg):
     return '\t'.join(arg)
 
 
-def _create_extractor_list(config_dictionary):
-    result = []
-
-    if 'sequencing_telemetry_source' in config_dictionary and \
-            config_dictionary['sequencing_telemetry_source']:
-        result.append(sequencing_telemetry_extractor.SequencingTelemetryExtractor(config_dictionary))
-
-    if 'fast5_source' in config_dictionary and config_dictionary['fast5_source']:
-        result.append(fast5_extractor.Fast5Extractor(config_dictionary))
-
-    if 'sequencing_summary_1dsqr_source' in config_dictionary and \
-            config_dictionary['sequencing_summary_1dsqr_source']:
-        result.append(sequencing_summary_onedsquare_extractor.
-                      OneDSquareSequencingSummaryExtractor(config_dictionary))
-    else:
-        result.append(sequencing_summary_extractor.SequencingSummaryExtractor(config_dictionary))
-
-    result.insert(0, toulligqc_info_extractor.ToulligqcInfoExtractor(config_dictionary, result))
-
-    return result
-
-
 def main():
     """
     Main function creating graphs and statistics
@@ -301,23 +316,10 @@ def main():
         sys.exit("ERROR: dico_path is empty")
 
     # Get barcode selection
-    if config_dictionary['barcoding'].lower() == 'true':
-        config_dictionary['barcode_selection'] = []
-
-        if 'barcodes' in config_dictionary:
-            barcode_set = set()
-            for b in config_dictionary['barcodes'].strip().split(','):
-                pattern = re.search(r'(BC|RB|NB|BP|BARCODE)(\d{2})', b.strip().upper())
-                if pattern:
-                    barcode = 'barcode{}'.format(pattern.group(2))
-                    barcode_set.add(barcode)
-            barcode_selection = sorted(barcode_set)
-
-            if len(barcode_selection) == 0:
-                sys.exit("ERROR: No known barcode found in provided list of barcodes")
-            config_dictionary['barcode_selection'] = barcode_selection
-    else:
-        config_dictionary['barcode_selection'] = ''
+    try:
+        api.set_barcode_selection(config_dictionary)
+    except ToulligqcError as e:
+        sys.exit('ERROR: ' + str(e))
 
     # Print welcome message
     _welcome(config_dictionary)
@@ -326,38 +328,19 @@ def main():
     _show(config_dictionary, "* Initialize extractors")
 
     # Create the list of extractors to execute
-    extractors_list = _create_extractor_list(config_dictionary)
+    extractors_list = api.create_extractor_list(config_dictionary)
 
-    # Check extractor configuration
-    for extractor in extractors_list:
-        (check_result, error_message) = extractor.check_conf()
-        if not check_result:
-            sys.exit("ERROR: Error while checking " + extractor.get_name() + " configuration: " + error_message)
-
-    result_dict = {}
-    graphs = []
     qc_start = time.time()
 
     # Information extraction about statistics and generation of the graphs
-    for extractor in extractors_list:
-        _show(config_dictionary, "* Start {0} extractor".format(extractor.get_name()))
-        extractor_start = time.time()
-
-        # Execute extractor
-        extractor.init()
-        extractor.extract(result_dict)
-        graphs.extend(extractor.graph_generation(result_dict))
-        extractor.clean(result_dict)
-
-        extractor_end = time.time()
-        extract_time = extractor_end - extractor_start
-        result_dict['{}.duration'.format(extractor.get_report_data_file_id())] = round(extract_time, 2)
-
-        _show(config_dictionary, "* End of {0} extractor (done in {1})".format(extractor.get_name(),
-                                                                               common.format_duration(extract_time)))
+    try:
+        result_dict, graphs = api.run_extractors(config_dictionary, extractors_list)
+    except ToulligqcError as e:
+        sys.exit('ERROR: ' + str(e))
 
     # HTML report and report.data file generation
     _show(config_dictionary, "* Write HTML report")
+    from toulligqc import html_report_generator
     html_report_generator.html_report(config_dictionary, result_dict, graphs)
 
     qc_end = time.time()